@@ -0,0 +1,104 @@
+import re
+from datetime import datetime, timedelta
+from typing import Tuple, List, Any
+
+from azure.kusto.data import KustoClient, ClientRequestProperties
+from azure.kusto.data.response import KustoResponseDataSetV2
+
+from pykusto import KustoResponse
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _typed_column
+
+
+def mock_kusto_response(columns: List[Tuple[str, str]], rows: List[List[Any]]) -> KustoResponse:
+    """
+    Generate a response the same way the Kusto client does, from the JSON frames of a V2 response.
+
+    :param columns: Name and Kusto type of each column
+    :param rows: Raw row values, as they appear in the JSON response
+    """
+    return KustoResponse(KustoResponseDataSetV2([{
+        'FrameType': 'DataTable',
+        'TableKind': 'PrimaryResult',
+        'TableName': 'PrimaryResult',
+        'Columns': [{'ColumnName': column_name, 'ColumnType': column_type} for column_name, column_type in columns],
+        'Rows': rows,
+    }]))
+
+
+MIXED_COLUMNS = [
+    ('Timestamp', 'datetime'), ('Duration', 'timespan'), ('Region', 'string'), ('Status', 'string'), ('Count', 'long'), ('Latency', 'real'), ('Success', 'bool'),
+    ('Properties', 'dynamic'),
+]
+
+
+def mock_mixed_rows(num_rows: int) -> List[List[Any]]:
+    start = datetime(2020, 1, 1)
+    regions = ('westus', 'eastus', 'westeurope', 'northeurope')
+    statuses = ('OK', 'Error', 'Timeout')
+    return [
+        [
+            (start + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ'), f'00:00:{i % 60:02}', regions[i % len(regions)], statuses[i % len(statuses)], i % 1000,
+            i / 7, i % 2 == 0, {'attempt': i % 3, 'tags': [regions[i % len(regions)]]},
+        ]
+        for i in range(num_rows)
+    ]
+
+
+def _schema_response(column_names: Tuple[str, ...], rows: List[List[str]]) -> KustoResponseDataSetV2:
+    return KustoResponseDataSetV2([{
+        'FrameType': 'DataTable',
+        'TableKind': 'PrimaryResult',
+        'TableName': 'PrimaryResult',
+        'Columns': [{'ColumnName': name, 'ColumnType': 'string'} for name in column_names],
+        'Rows': rows,
+    }])
+
+
+# noinspection PyMissingConstructor
+class MockSchemaKustoClient(KustoClient):
+    """
+    Answers schema queries with a generated schema, in responses built the same way the Kusto client builds them. Used to benchmark schema parsing without a cluster.
+    Counting, limiting and paging of schema queries are supported.
+    """
+    databases_columns: Tuple[str, ...] = ('DatabaseName', 'TableName', 'ColumnName', 'ColumnType')
+    database_columns: Tuple[str, ...] = ('TableName', 'ColumnName', 'ColumnType')
+    databases_rows: List[List[str]]
+    database_rows: List[List[str]]
+    databases_response: KustoResponseDataSetV2
+    database_response: KustoResponseDataSetV2
+
+    def __init__(self, num_databases: int, num_tables: int, num_columns: int) -> None:
+        """
+        :param num_columns: Number of columns in each table
+        """
+        self._query_endpoint = 'https://test_cluster.kusto.windows.net/v2/rest/query'
+        # noinspection PyProtectedMember
+        types = [kusto_type.dot_net_name for kusto_type in _typed_column.registry]
+        # As in real responses, each database and each table also has a row of its own, with no column
+        self.databases_rows = []
+        for d in range(num_databases):
+            self.databases_rows.append([f'db_{d}', '', '', ''])
+            for t in range(num_tables):
+                self.databases_rows.append([f'db_{d}', f'table_{t}', '', ''])
+                self.databases_rows.extend([f'db_{d}', f'table_{t}', f'column_{c}', types[c % len(types)]] for c in range(num_columns))
+        self.database_rows = [row[1:] for row in self.databases_rows if row[0] == 'db_0']
+        self.databases_response = _schema_response(self.databases_columns, self.databases_rows)
+        self.database_response = _schema_response(self.database_columns, self.database_rows)
+
+    def execute(self, database: str, rendered_query: str, properties: ClientRequestProperties = None) -> KustoResponseDataSetV2:
+        databases_query = rendered_query.startswith('.show databases schema')
+        rows = self.databases_rows if databases_query else self.database_rows
+        if rendered_query.endswith(' | count'):
+            return KustoResponseDataSetV2([{
+                'FrameType': 'DataTable', 'TableKind': 'PrimaryResult', 'TableName': 'PrimaryResult', 'Columns': [{'ColumnName': 'Count', 'ColumnType': 'long'}],
+                'Rows': [[len(rows)]],
+            }])
+        columns = self.databases_columns if databases_query else self.database_columns
+        page = re.search(r'between \((\d+) \.\. (\d+)\)', rendered_query)
+        if page is not None:
+            return _schema_response(columns, rows[int(page.group(1)) - 1:int(page.group(2))])
+        limit = re.search(r'\| limit (\d+)$', rendered_query)
+        if limit is not None and int(limit.group(1)) < len(rows):
+            return _schema_response(columns, rows[:int(limit.group(1))])
+        return self.databases_response if databases_query else self.database_response
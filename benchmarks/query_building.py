@@ -0,0 +1,73 @@
+from pykusto import Query, column_generator as col
+# noinspection PyProtectedMember
+from pykusto._src.client import _Table
+# noinspection PyProtectedMember
+from pykusto._src.expressions import _NumberColumn, _StringColumn
+
+
+class WideQueries:
+    """
+    Queries which assign or select many columns
+    """
+    params = [100, 1000]
+    param_names = ['num_columns']
+
+    def setup(self, num_columns):
+        self.columns = [_NumberColumn(f'column_{i}') for i in range(num_columns)]
+        self.assignments = {f'new_column_{i}': column * 2 for i, column in enumerate(self.columns)}
+        self.extend_query = Query().extend(**self.assignments)
+
+    def time_build_extend(self, num_columns):
+        Query().extend(**self.assignments)
+
+    def time_render_extend(self, num_columns):
+        self.extend_query.render()
+
+    def time_project(self, num_columns):
+        Query().project(*self.columns).render()
+
+
+class DeepQueries:
+    """
+    Long chains of query operators, and composition of queries. Queries are linked lists which are copied recursively, so the depth is kept well below the
+    recursion limit.
+    """
+    params = [10, 100, 300]
+    param_names = ['depth']
+
+    def setup(self, depth):
+        self.column = _NumberColumn('foo')
+        self.deep_query = Query()
+        for i in range(depth):
+            self.deep_query = self.deep_query.where(self.column > i)
+        self.parts = [Query().where(self.column > i) for i in range(depth)]
+
+    def time_build_where_chain(self, depth):
+        query = Query()
+        for i in range(depth):
+            query = query.where(self.column > i)
+
+    def time_render_where_chain(self, depth):
+        self.deep_query.render()
+
+    def time_add(self, depth):
+        query = Query()
+        for part in self.parts:
+            query = query + part
+        query.render()
+
+
+class LargeInLists:
+    params = [1000, 100000]
+    param_names = ['num_values']
+
+    def setup(self, num_values):
+        self.numbers = list(range(num_values))
+        self.strings = [f'value_{i}' for i in range(num_values)]
+        self.table = _Table(None, 'mock_table', (_NumberColumn('numField'), _StringColumn('stringField')))
+
+    def time_numbers(self, num_values):
+        Query(self.table).where(col.numField.is_in(self.numbers)).render()
+
+    def time_strings(self, num_values):
+        Query(self.table).where(col.stringField.is_in(self.strings)).render()
@@ -0,0 +1,41 @@
+from .common import mock_kusto_response, MIXED_COLUMNS, mock_mixed_rows
+
+
+class ResultConversion:
+    """
+    Conversion of a 1M-row result with mixed column types to a dataframe
+    """
+    timeout = 600
+
+    def setup_cache(self):
+        return mock_kusto_response(MIXED_COLUMNS, mock_mixed_rows(1000000))
+
+    def time_to_dataframe(self, response):
+        response.to_dataframe()
+
+    def time_to_dataframe_columnar(self, response):
+        response.to_dataframe(columnar=True)
+
+    def time_to_arrow(self, response):
+        response.to_arrow()
+
+    def peakmem_to_dataframe(self, response):
+        response.to_dataframe()
+
+    def peakmem_to_dataframe_columnar(self, response):
+        response.to_dataframe(columnar=True)
+
+    def peakmem_to_arrow(self, response):
+        response.to_arrow()
+
+    def peakmem_to_dataframe_compact(self, response):
+        response.to_dataframe(compact=True, dynamic_as_json=True)
+
+    def track_compact_memory_usage(self, response):
+        """
+        Memory used by the dataframe when using `compact` and `dynamic_as_json`. Reported in bytes rather than as the fraction saved, since asv considers higher values
+        to be worse.
+        """
+        return int(response.to_dataframe(compact=True, dynamic_as_json=True).memory_usage(deep=True).sum())
+
+    track_compact_memory_usage.unit = 'bytes'
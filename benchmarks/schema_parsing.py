@@ -0,0 +1,59 @@
+import gc
+import tracemalloc
+
+from pykusto import PyKustoClient
+from .common import MockSchemaKustoClient
+
+
+class SchemaParsing:
+    """
+    Parsing of the cluster schema (`_internal_get_items`), for a cluster with 100K columns in total
+    """
+    timeout = 300
+    params = [(1, 10, 10000), (10, 100, 100), (100, 1000, 1)]
+    param_names = ['databases, tables, columns']
+
+    def setup(self, shape):
+        self.client = MockSchemaKustoClient(*shape)
+
+    def time_client_refresh(self, shape):
+        PyKustoClient(self.client, fetch_by_default=False).blocking_refresh()
+
+    def peakmem_client_refresh(self, shape):
+        PyKustoClient(self.client, fetch_by_default=False).blocking_refresh()
+
+    def time_database_refresh(self, shape):
+        PyKustoClient(self.client, fetch_by_default=False)['db_0'].blocking_refresh()
+
+    def track_retained_memory(self, shape):
+        gc.collect()
+        tracemalloc.start()
+        client = PyKustoClient(self.client, fetch_by_default=False)
+        client.blocking_refresh()
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return retained
+
+    track_retained_memory.unit = 'bytes'
+
+
+class TableResolution:
+    """
+    Resolution of wildcard table patterns (`_Database.get_table`), in a database with 20K tables
+    """
+    params = ['table_1*', '*_7', 'table_1*7', '*_1*']
+    param_names = ['pattern']
+
+    def setup(self, pattern):
+        self.database = PyKustoClient(MockSchemaKustoClient(1, 20000, 1), fetch_by_default=False)['db_0']
+        self.database.blocking_refresh()
+
+    def time_first_get_table(self, pattern):
+        # Reloading the tables invalidates the index and memoized resolutions
+        # noinspection PyProtectedMember
+        self.database._load_items(self.database._items_snapshot())
+        self.database.get_table(pattern)
+
+    def time_memoized_get_table(self, pattern):
+        self.database.get_table(pattern)
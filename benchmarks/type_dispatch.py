@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+# noinspection PyProtectedMember
+from pykusto._src.expressions import _to_kql
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _kql_converter, _typed_column
+
+
+class TypeRegistrarDispatch:
+    """
+    Lookups in `_TypeRegistrar`, which happen for every literal and column in a query
+    """
+    params = ['str', 'int', 'float', 'bool', 'datetime', 'timedelta', 'list', 'dict']
+    param_names = ['value_type']
+    values = {
+        'str': 'foo', 'int': 1, 'float': 1.5, 'bool': True, 'datetime': datetime(2020, 1, 1), 'timedelta': timedelta(hours=1), 'list': [1, 2], 'dict': {'a': 1},
+    }
+
+    def setup(self, value_type):
+        self.value = self.values[value_type]
+
+    def time_for_obj(self, value_type):
+        for _ in range(1000):
+            _kql_converter.for_obj(self.value)
+
+    def time_to_kql(self, value_type):
+        for _ in range(1000):
+            _to_kql(self.value)
+
+
+class TypedColumnDispatch:
+    def time_registry_lookup(self):
+        for kusto_type in _typed_column.registry:
+            for _ in range(100):
+                _typed_column.registry[kusto_type]('foo')
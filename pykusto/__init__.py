@@ -7,7 +7,12 @@ from ._src.client import *
 from ._src.enums import *
 from ._src.expressions import *
 from ._src.functions import *
+from ._src.hooks import *
 from ._src.query import *
+from ._src.schema_cache import *
+from ._src.schema_fetch_pool import *
+from ._src.shared_schema_store import *
+from ._src.tracing import *
 
 __version__ = 'dev'  # Version number is managed in the 'release' branch
 name = "pykusto"
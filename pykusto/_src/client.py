@@ -1,35 +1,252 @@
+import json
 from collections import defaultdict
-from fnmatch import fnmatch
+from concurrent.futures import Future
+from datetime import timedelta
 from functools import lru_cache
+from itertools import islice, compress
 from threading import Lock
-from typing import Union, List, Tuple, Dict, Generator, Optional, Set
+from typing import Union, List, Tuple, Dict, Generator, Optional, Set, TYPE_CHECKING, Any, Callable
 from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 from azure.kusto.data import KustoClient, KustoConnectionStringBuilder, ClientRequestProperties
 # noinspection PyProtectedMember
-from azure.kusto.data._models import KustoResultRow as _KustoResultRow
+from azure.kusto.data._converters import to_timedelta as _to_timedelta
+# noinspection PyProtectedMember
+from azure.kusto.data._models import KustoResultRow as _KustoResultRow, KustoResultColumn as _KustoResultColumn, KustoResultTable as _KustoResultTable, WellKnownDataSet
 from azure.kusto.data.helpers import dataframe_from_result_table
 from azure.kusto.data.response import KustoResponseDataSet
 # noinspection PyProtectedMember
 from azure.kusto.data.security import _get_azure_cli_auth_token
 
+from .compact_schema import _LazyColumns
 from .expressions import BaseColumn, _AnyTypeColumn
+from .hooks import HookEvent, _has_hooks, _call_with_hooks
 from .item_fetcher import _ItemFetcher
 from .kql_converters import KQL
 from .logger import _logger
-from .type_utils import _INTERNAL_NAME_TO_TYPE, _typed_column, _DOT_NAME_TO_TYPE
+from .name_index import _NameIndex
+from .result_converters import _columnar_dataframe, _arrow_table, _valid_rows_mask, _convert_column, _has_null_fallback_dtype
+from .schema_cache import SchemaCache, _ClusterSchema
+from .schema_fetch_pool import SchemaFetchPool
+from .shared_schema_store import SharedSchemaStore, _SharedSchema
+from .type_utils import _INTERNAL_NAME_TO_TYPE, _DOT_NAME_TO_TYPE, _get_result_column_type, _KustoType
+
+if TYPE_CHECKING:  # pragma: no cover
+    # Optional dependency, used only for type hints
+    import pyarrow
+
+
+class KustoResultView:
+    """
+    A lazy view over a range of rows and a subset of the columns of a result table. Nothing is converted when a view is created: a column is converted to a typed
+    numpy array only when it is accessed, and only for the rows in the view. Views created using :func:`head`, :func:`slice` and :func:`select` share the arrays
+    already converted by the views they were created from, without copying them. The exception is integer and bool columns which were converted with nulls (and are
+    therefore held as floats or objects): those are converted again for the rows of the new view, so that their dtype depends only on these rows.
+    """
+    __table: _KustoResultTable
+    __columns: Dict[str, _KustoResultColumn]
+    __column_indices: Dict[str, int]
+    __start: int
+    __stop: int
+    __parent: Optional['KustoResultView']
+    __arrays: Dict[str, np.ndarray]
+
+    def __init__(
+            self, table: _KustoResultTable, columns: List[_KustoResultColumn] = None, start: int = 0, stop: int = None, parent: 'KustoResultView' = None
+    ) -> None:
+        self.__table = table
+        self.__columns = {column.column_name: column for column in (table.columns if columns is None else columns)}
+        self.__column_indices = {column.column_name: index for index, column in enumerate(table.columns)} if parent is None else parent.__column_indices
+        self.__start = start
+        self.__stop = len(table.rows) if stop is None else stop
+        self.__parent = parent
+        self.__arrays = {}
+
+    def __len__(self) -> int:
+        return self.__stop - self.__start
+
+    def __repr__(self) -> str:
+        return f'KustoResultView({len(self)} rows, {list(self.__columns)})'
+
+    @property
+    def column_names(self) -> List[str]:
+        return list(self.__columns)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        The values of a column as a read-only numpy array, typed according to the column type in the result (see :func:`KustoResponse.to_dataframe`). Datetime values
+        are in UTC.
+        """
+        kusto_type = _get_result_column_type(self.__columns[name].column_type)
+        array = self.__arrays.get(name)
+        if array is None:
+            array = self.__get_converted(name, kusto_type)
+        if array is None:
+            index = self.__column_indices[name]
+            # noinspection PyProtectedMember
+            array = _convert_column([row._hidden_values[index] for row in self.__table.rows[self.__start:self.__stop]], kusto_type)
+            array.flags.writeable = False
+            self.__arrays[name] = array
+        return array
+
+    def __get_converted(self, name: str, kusto_type: Optional[_KustoType]) -> Optional[np.ndarray]:
+        # Look for the column in the closest view this one was created from, which already converted it
+        view = self.__parent
+        while view is not None:
+            array = view.__arrays.get(name)
+            if array is not None:
+                # The dtype of such an array depends on the rows of that view, which might contain nulls while the rows of this view do not
+                return None if _has_null_fallback_dtype(array, kusto_type) else array[self.__start - view.__start:self.__stop - view.__start]
+            view = view.__parent
+        return None
+
+    def head(self, num_rows: int) -> 'KustoResultView':
+        return self.slice(0, num_rows)
+
+    def slice(self, start: int, stop: int = None) -> 'KustoResultView':
+        """
+        A view over a range of the rows in this view. Negative indices count from the end, the same as in Python slices.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return KustoResultView(self.__table, list(self.__columns.values()), self.__start + start, self.__start + max(start, stop), self)
+
+    def select(self, *names: str) -> 'KustoResultView':
+        """
+        A view over a subset of the columns in this view.
+        """
+        return KustoResultView(self.__table, [self.__columns[name] for name in names], self.__start, self.__stop, self)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        arrays = {name: self.column(name) for name in self.__columns}
+        return pd.DataFrame(
+            # Same as in the row-based conversion, datetime columns are timezone-aware
+            {name: pd.DatetimeIndex(array).tz_localize('UTC') if array.dtype.kind == 'M' else array for name, array in arrays.items()},
+            columns=self.column_names,
+        )
+
+
+class QueryStats:
+    """
+    Execution statistics of a query, as reported by the cluster in the "QueryResourceConsumption" event of the QueryCompletionInformation result table.
+    Statistics which are missing from the report are None.
+    """
+    execution_time: Optional[timedelta]
+    cpu_time: Optional[timedelta]
+    memory_peak_per_node: Optional[int]
+    extents_total: Optional[int]
+    extents_scanned: Optional[int]
+    rows_total: Optional[int]
+    rows_scanned: Optional[int]
+    payload: dict
+
+    def __init__(self, payload: dict) -> None:
+        """
+        :param payload: The parsed JSON payload of the "QueryResourceConsumption" event
+        """
+        self.payload = payload
+        execution_time = self.__get(payload, 'ExecutionTime')
+        self.execution_time = None if execution_time is None else timedelta(seconds=execution_time)
+        cpu_time = self.__get(payload, 'resource_usage', 'cpu', 'total cpu')
+        self.cpu_time = None if cpu_time is None else _to_timedelta(cpu_time)
+        self.memory_peak_per_node = self.__get(payload, 'resource_usage', 'memory', 'peak_per_node')
+        self.extents_total = self.__get(payload, 'input_dataset_statistics', 'extents', 'total')
+        self.extents_scanned = self.__get(payload, 'input_dataset_statistics', 'extents', 'scanned')
+        self.rows_total = self.__get(payload, 'input_dataset_statistics', 'rows', 'total')
+        self.rows_scanned = self.__get(payload, 'input_dataset_statistics', 'rows', 'scanned')
+
+    def __repr__(self) -> str:
+        return (
+            f'QueryStats(execution_time={self.execution_time}, cpu_time={self.cpu_time}, memory_peak_per_node={self.memory_peak_per_node}, '
+            f'extents_scanned={self.extents_scanned}/{self.extents_total}, rows_scanned={self.rows_scanned}/{self.rows_total})'
+        )
+
+    @staticmethod
+    def __get(payload: dict, *path: str) -> Any:
+        value = payload
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    @staticmethod
+    def _from_completion_table(table: _KustoResultTable) -> Optional['QueryStats']:
+        for row in table.rows:
+            if row['EventTypeName'] == 'QueryResourceConsumption':
+                return QueryStats(json.loads(row['Payload']))
+        return None
 
 
 class KustoResponse:
     __response: KustoResponseDataSet
+    __valid_rows_mask: Optional[np.ndarray]
+    __view: Optional[KustoResultView]
+    __stats: Optional[QueryStats]
+    __stats_parsed: bool
 
     def __init__(self, response: KustoResponseDataSet):
         self.__response = response
+        self.__valid_rows_mask = None
+        self.__view = None
+        self.__stats = None
+        self.__stats_parsed = False
+
+    def get_tables(self) -> List[_KustoResultTable]:
+        """
+        All the tables in the response: the primary results, and also the tables describing the query execution, such as QueryCompletionInformation.
+        """
+        return list(self.__response.tables)
+
+    def get_table(self, key: Union[int, str]) -> _KustoResultTable:
+        """
+        :param key: The index of the table in the response, or its name
+        """
+        return self.__response[key]
+
+    def get_tables_by_kind(self, kind: WellKnownDataSet) -> List[_KustoResultTable]:
+        return [table for table in self.__response.tables if table.table_kind == kind]
+
+    def get_primary_results(self) -> List[_KustoResultTable]:
+        return list(self.__response.primary_results)
+
+    def get_stats(self) -> Optional[QueryStats]:
+        """
+        The execution statistics reported by the cluster, or None if the response does not include them.
+        """
+        if not self.__stats_parsed:
+            completion_tables = self.get_tables_by_kind(WellKnownDataSet.QueryCompletionInformation)
+            self.__stats = None if len(completion_tables) == 0 else QueryStats._from_completion_table(completion_tables[0])
+            self.__stats_parsed = True
+        return self.__stats
+
+    def view(self) -> KustoResultView:
+        """
+        A lazy view over the primary result, which converts columns only when they are accessed, and caches them. See :class:`KustoResultView`.
+        """
+        if self.__view is None:
+            self.__view = KustoResultView(self.__response.primary_results[0])
+        return self.__view
+
+    def column(self, name: str) -> np.ndarray:
+        return self.view().column(name)
+
+    def head(self, num_rows: int) -> KustoResultView:
+        return self.view().head(num_rows)
+
+    def select(self, *names: str) -> KustoResultView:
+        return self.view().select(*names)
 
     def get_rows(self) -> List[_KustoResultRow]:
         return self.__response.primary_results[0].rows
 
+    def get_row_count(self) -> int:
+        """
+        The total number of rows in the primary results
+        """
+        return sum(len(table.rows) for table in self.__response.primary_results)
+
     @staticmethod
     def is_row_valid(row: _KustoResultRow) -> bool:
         for field in row:
@@ -37,13 +254,127 @@ class KustoResponse:
                 return False
         return True
 
+    def get_valid_rows_mask(self) -> np.ndarray:
+        """
+        A boolean array with an entry for each row in the primary result, which is true if the row is valid (see :func:`is_row_valid`). Computed once, using vectorized
+        operations over entire columns.
+        """
+        if self.__valid_rows_mask is None:
+            self.__valid_rows_mask = _valid_rows_mask(self.__response.primary_results[0])
+        return self.__valid_rows_mask
+
     def get_valid_rows(self) -> Generator[_KustoResultRow, None, None]:
-        for row in self.get_rows():
-            if self.is_row_valid(row):
-                yield row
+        yield from compress(self.get_rows(), self.get_valid_rows_mask())
+
+    def to_dataframe(
+            self, columnar: bool = False, compact: bool = False, dynamic_as_json: bool = False, valid_rows_only: bool = False
+    ) -> pd.DataFrame:
+        """
+        Convert the primary result to a dataframe.
+
+        :param columnar: If true, the dataframe is built one column at a time from typed numpy arrays, according to the column types in the result. This is faster and more
+            memory efficient for large results, and the dtypes reflect the Kusto types (e.g. 'int' becomes int32). Otherwise, the dataframe is built from the result rows
+            and pandas infers the dtypes.
+        :param compact: Reduce memory usage: string columns with few distinct values become categoricals, and numeric columns are downcast to the smallest dtype which can
+            hold their values without loss. Implies `columnar`.
+        :param dynamic_as_json: Re-encode dynamic values as JSON bytes, to be decoded (e.g. using `json.loads`) only when accessed. The values are serialized again
+            from the parsed response, so the JSON might differ from the original text (e.g. in whitespace). Implies `columnar`.
+        :param valid_rows_only: Keep only the valid rows (see :func:`get_valid_rows_mask`)
+        """
+        if _has_hooks(HookEvent.BEFORE_CONVERT, HookEvent.AFTER_CONVERT):
+            return _call_with_hooks(
+                HookEvent.BEFORE_CONVERT, HookEvent.AFTER_CONVERT, {'response': self, 'format': 'dataframe'},
+                lambda: self.__to_dataframe(columnar, compact, dynamic_as_json, valid_rows_only), lambda frame: {'row_count': len(frame)},
+            )
+        return self.__to_dataframe(columnar, compact, dynamic_as_json, valid_rows_only)
+
+    def __to_dataframe(self, columnar: bool, compact: bool, dynamic_as_json: bool, valid_rows_only: bool) -> pd.DataFrame:
+        if columnar or compact or dynamic_as_json:
+            frame = _columnar_dataframe(self.__response.primary_results[0], compact, dynamic_as_json)
+        else:
+            frame = dataframe_from_result_table(self.__response.primary_results[0])
+        if valid_rows_only:
+            frame = frame[self.get_valid_rows_mask()].reset_index(drop=True)
+        return frame
+
+    def to_arrow(self) -> 'pyarrow.Table':
+        """
+        Convert the primary result to an Arrow table, built one column at a time according to the column types in the result. Requires pyarrow to be installed.
+        Dynamic values are converted to JSON strings.
+        """
+        if _has_hooks(HookEvent.BEFORE_CONVERT, HookEvent.AFTER_CONVERT):
+            return _call_with_hooks(
+                HookEvent.BEFORE_CONVERT, HookEvent.AFTER_CONVERT, {'response': self, 'format': 'arrow'},
+                lambda: _arrow_table(self.__response.primary_results[0]), lambda table: {'row_count': table.num_rows},
+            )
+        return _arrow_table(self.__response.primary_results[0])
+
+    def iter_dataframes(self, chunk_size: int) -> Generator[pd.DataFrame, None, None]:
+        """
+        Convert the primary result to consecutive dataframes of at most `chunk_size` rows each. Chunks are converted only when requested, so the memory used for the
+        conversion is bounded by the chunk size rather than by the size of the entire result.
+        """
+        assert chunk_size > 0, "Chunk size must be positive"
+        table = self.__response.primary_results[0]
+        # noinspection PyProtectedMember
+        raw_rows = table._rows
+        while True:
+            chunk = list(islice(raw_rows, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield self.__chunk_to_dataframe(chunk, table.columns)
+
+    @staticmethod
+    def __chunk_to_dataframe(chunk: List[list], columns: List[_KustoResultColumn]) -> pd.DataFrame:
+        # Same as 'dataframe_from_result_table', but for a subset of the rows
+        frame = pd.DataFrame(chunk, columns=[c.column_name for c in columns])
+        for column in columns:
+            if column.column_type == 'bool':
+                frame[column.column_name] = frame[column.column_name].astype(bool)
+        return frame
 
-    def to_dataframe(self) -> pd.DataFrame:
-        return dataframe_from_result_table(self.__response.primary_results[0])
+
+# Schema query results larger than this are fetched in several pages
+_SCHEMA_PAGE_SIZE = 10000
+
+
+def _fetch_schema_rows(fetcher: _ItemFetcher, execute: Callable[[KQL], KustoResponse], query: KQL, columns: str) -> List[_KustoResultRow]:
+    """
+    Fetch all rows of a schema query, regardless of their number. The first page is fetched on its own, so small schemas take a single query. If it is full, the rows
+    are counted, and the remaining pages are fetched in parallel by row number and merged. This relies on the order of the query results being the same in all
+    executions, which holds as long as the schema does not change.
+
+    :param fetcher: The pages are fetched in the schema fetch pool of this fetcher
+    :param execute: Executes a query in the relevant database
+    :param query: The schema query
+    :param columns: The columns to project, separated by commas
+    """
+    first_page = execute(KQL(f'{query} | project {columns} | limit {_SCHEMA_PAGE_SIZE}'))
+    rows = list(first_page.get_valid_rows())
+    # The results include database and table rows with no column, which are filtered out but still count towards the page size
+    if len(first_page.get_rows()) < _SCHEMA_PAGE_SIZE:
+        return rows
+    row_count = next(execute(KQL(f'{query} | count')).get_valid_rows())[0]
+
+    def fetch_page(start: int) -> List[_KustoResultRow]:
+        return list(execute(KQL(
+            f'{query} | serialize _RowNumber = row_number() | where _RowNumber between ({start + 1} .. {start + _SCHEMA_PAGE_SIZE}) | project {columns}'
+        )).get_valid_rows())
+
+    def submit_page(start: int) -> Optional[Future]:
+        try:
+            return fetcher._get_schema_fetch_pool().submit(fetcher._get_schema_fetch_key(), lambda: fetch_page(start))
+        except RuntimeError:
+            # The pool was shut down, so the page is fetched in this thread
+            return None
+
+    page_starts = range(_SCHEMA_PAGE_SIZE, row_count, _SCHEMA_PAGE_SIZE)
+    page_futures = [submit_page(start) for start in page_starts]
+    for start, future in zip(page_starts, page_futures):
+        # This usually runs in a worker of the same pool, so waiting for pages which did not start yet could leave no worker to fetch them. Instead, such pages are
+        # fetched in this thread.
+        rows.extend(fetch_page(start) if future is None or future.cancel() else future.result())
+    return rows
 
 
 class PyKustoClient(_ItemFetcher):
@@ -56,16 +387,42 @@ class PyKustoClient(_ItemFetcher):
     __cluster_name: str
     __first_execution: bool
     __first_execution_lock: Lock
+    __schema_cache: Optional[SchemaCache]
+    __database_versions: Dict[str, str]
+    __lazy_databases: bool
+    __schema_fetch_pool: Optional[SchemaFetchPool]
+    __schema_ttl: Optional[timedelta]
+    __shared_schema_store: Optional[SharedSchemaStore]
+    __shared_schema: Optional[_SharedSchema]
 
-    def __init__(self, client_or_cluster: Union[str, KustoClient], fetch_by_default: bool = True, use_global_cache: bool = False) -> None:
+    def __init__(
+            self, client_or_cluster: Union[str, KustoClient], fetch_by_default: bool = True, use_global_cache: bool = False, schema_cache: SchemaCache = None,
+            lazy_databases: bool = False, schema_fetch_pool: SchemaFetchPool = None, schema_ttl: timedelta = None, shared_schema_store: SharedSchemaStore = None
+    ) -> None:
         """
         Create a new handle to Kusto cluster. The value of "fetch_by_default" is used for current instance, and also passed on to database instances.
 
         :param client_or_cluster: Either a KustoClient instance, or a cluster name. In case a cluster name is provided, a KustoClient is generated using Azure CLI authentication,
             falling back to AAD device authentication if needed.
         :param use_global_cache: If true, share a global client cache between all instances. Provided for convenience during development, not recommended for general use.
+        :param schema_cache: If provided, the cluster schema is loaded from the cache if available, and then refreshed in the background (if "fetch_by_default" is true).
+            Every fetched schema is saved to the cache.
+        :param lazy_databases: If true, only the names of the databases are fetched for the cluster, and the schema of each database is fetched when it is first
+            accessed. Recommended for clusters with many databases, of which only a few are used. The schema cache is not updated in this mode.
+        :param schema_fetch_pool: The pool in which the schemas of the cluster, its databases and its tables are fetched. If not provided, the default pool is used (see
+            :func:`set_default_schema_fetch_pool`).
+        :param schema_ttl: If provided, a schema which was fetched longer than this ago is refreshed in the background when it is next accessed (of the cluster, or of a
+            database or table which fetched its own schema). Meanwhile the current schema is used, without waiting for the refresh.
+        :param shared_schema_store: If provided, the cluster schema is shared with other processes on the host. If the store is a publisher, every fetched schema is
+            published to it (unless "lazy_databases" is true). Otherwise, the schema is read from the store instead of fetched, and the schema of each database is decoded
+            when the database is first accessed.
         """
         super().__init__(None, fetch_by_default)
+        self.__lazy_databases = lazy_databases
+        self.__schema_fetch_pool = schema_fetch_pool
+        self.__schema_ttl = schema_ttl
+        self.__shared_schema_store = shared_schema_store
+        self.__shared_schema = None
         self.__first_execution = True
         self.__first_execution_lock = Lock()
         if isinstance(client_or_cluster, KustoClient):
@@ -77,7 +434,16 @@ class PyKustoClient(_ItemFetcher):
 
             self.__client = (self._cached_get_client_for_cluster if use_global_cache else self._get_client_for_cluster)(client_or_cluster)
             self.__cluster_name = client_or_cluster
-        self._refresh_if_needed()
+        self.__schema_cache = schema_cache
+        # Versions of the databases as of the last incremental refresh
+        self.__database_versions = {}
+        cached_schema = None if schema_cache is None else schema_cache.load(self.__cluster_name)
+        if cached_schema is None:
+            self._refresh_if_needed()
+        else:
+            self._load_items(self.__databases_from_schema(cached_schema))
+            if fetch_by_default:
+                self.refresh()
 
     def __repr__(self) -> str:
         return f'PyKustoClient({self.__cluster_name})'
@@ -93,6 +459,15 @@ class PyKustoClient(_ItemFetcher):
     def get_database(self, name: str) -> '_Database':
         return self[name]
 
+    def _get_schema_fetch_pool(self) -> SchemaFetchPool:
+        return super()._get_schema_fetch_pool() if self.__schema_fetch_pool is None else self.__schema_fetch_pool
+
+    def _get_schema_fetch_key(self) -> str:
+        return self.__cluster_name
+
+    def _get_schema_ttl(self) -> Optional[timedelta]:
+        return self.__schema_ttl
+
     def execute(self, database: str, query: KQL, properties: ClientRequestProperties = None) -> KustoResponse:
         # The first execution usually triggers an authentication flow. We block all subsequent executions to prevent redundant authentications.
         # Remove the below block once this is resolved: https://github.com/Azure/azure-kusto-python/issues/208
@@ -103,6 +478,13 @@ class PyKustoClient(_ItemFetcher):
         return self.__internal_execute(database, query, properties)
 
     def __internal_execute(self, database: str, query: KQL, properties: ClientRequestProperties = None) -> KustoResponse:
+        if _has_hooks(HookEvent.BEFORE_EXECUTE, HookEvent.AFTER_EXECUTE):
+            return _call_with_hooks(
+                HookEvent.BEFORE_EXECUTE, HookEvent.AFTER_EXECUTE,
+                {'client': self, 'database': database, 'query': query, 'properties': properties, 'query_bytes': len(query.encode())},
+                lambda: KustoResponse(self.__client.execute(database, query, properties)),
+                lambda response: {'response': response, 'row_count': response.get_row_count()},
+            )
         return KustoResponse(self.__client.execute(database, query, properties))
 
     def get_databases_names(self) -> Generator[str, None, None]:
@@ -136,28 +518,90 @@ class PyKustoClient(_ItemFetcher):
         return PyKustoClient._get_client_for_cluster(cluster)
 
     def _internal_get_items(self) -> Dict[str, '_Database']:
+        if self.__shared_schema_store is not None and not self.__shared_schema_store.publisher:
+            shared_schema = self.__shared_schema_store.open(self.__cluster_name)
+            if shared_schema is not None:
+                self.__shared_schema = shared_schema
+                return {database_name: self.__new_lazy_database(database_name) for database_name in shared_schema.get_database_names()}
+            _logger.info(f"No shared schema was published for {self}, fetching it from the cluster")
+        if self.__lazy_databases:
+            res: KustoResponse = self.execute('', KQL('.show databases | project DatabaseName, Version'))
+            return {database_name: self.__new_lazy_database(database_name) for database_name, _ in res.get_valid_rows()}
         # Retrieves database names, table names, column names and types for all databases. A database name is required
         # by the "execute" method, but is ignored for this query
-        res: KustoResponse = self.execute(
-            '', KQL('.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 100000')
-        )
-        database_to_table_to_columns = defaultdict(lambda: defaultdict(list))
-        for database_name, table_name, column_name, column_type in res.get_valid_rows():
-            database_to_table_to_columns[database_name][table_name].append(
-                _typed_column.registry[_DOT_NAME_TO_TYPE[column_type]](column_name)
-            )
+        rows = _fetch_schema_rows(self, lambda query: self.execute('', query), KQL('.show databases schema'), 'DatabaseName, TableName, ColumnName, ColumnType')
+        schema: _ClusterSchema = defaultdict(lambda: defaultdict(list))
+        for database_name, table_name, column_name, column_type in rows:
+            schema[database_name][table_name].append((column_name, _DOT_NAME_TO_TYPE[column_type]))
+        if self.__schema_cache is not None:
+            self.__schema_cache.save(self.__cluster_name, schema)
+        if self.__shared_schema_store is not None and self.__shared_schema_store.publisher:
+            self.__shared_schema_store.publish(self.__cluster_name, schema)
+        return self.__databases_from_schema(schema)
+
+    def _internal_update_items(self) -> None:
+        # The version of a database changes whenever its schema changes. Only databases whose version changed since the last incremental refresh are fetched (all
+        # databases are fetched in the first incremental refresh).
+        res: KustoResponse = self.execute('', KQL('.show databases | project DatabaseName, Version'))
+        versions = dict(res.get_valid_rows())
+        databases = self._items_snapshot()
+        updated_databases = {}
+        for database_name, version in versions.items():
+            database = databases.get(database_name)
+            if database is None:
+                if self.__lazy_databases:
+                    updated_databases[database_name] = self.__new_lazy_database(database_name)
+                    continue
+                database = _Database(self, database_name, fetch_by_default=False)
+            elif self.__database_versions.get(database_name) == version or (self.__lazy_databases and not database._items_fetched()):
+                # Lazy databases which were not accessed yet will fetch the current schema once they are
+                updated_databases[database_name] = database
+                continue
+            database._update_items()
+            updated_databases[database_name] = database
+        self.__database_versions = versions
+        self._load_items(updated_databases)
+
+    def _get_shared_tables(self, database_name: str) -> Optional[Dict[str, List[Tuple[str, _KustoType]]]]:
+        """
+        :return: The tables of the database in the shared schema, or None if the schema was not read from a shared schema store
+        """
+        return None if self.__shared_schema is None else self.__shared_schema.get_tables(database_name)
+
+    def __new_lazy_database(self, name: str) -> '_Database':
+        # The "fetch_by_default" behavior is passed on to the tables of the database, once it is fetched
+        return _Database(self, name, fetch_by_default=self._fetch_by_default, fetch_on_access=True)
+
+    def __databases_from_schema(self, schema: _ClusterSchema) -> Dict[str, '_Database']:
         return {
             # Database instances are provided with all table and column data, preventing them from generating more
             # queries. However the "fetch_by_default" behavior is passed on to them for future actions.
             database_name: _Database(
                 self, database_name,
-                {table_name: tuple(columns) for table_name, columns in table_to_columns.items()},
+                {table_name: _LazyColumns(columns) for table_name, columns in table_to_columns.items()},
                 fetch_by_default=self._fetch_by_default
             )
-            for database_name, table_to_columns in database_to_table_to_columns.items()
+            for database_name, table_to_columns in schema.items()
         }
 
 
+class _TableResolution:
+    """
+    Index of the table names of a database, and memoized wildcard resolutions. Valid only until the tables of the database are replaced or added to.
+    """
+    items_version: int
+    index: _NameIndex
+    tables_by_pattern: Dict[str, Tuple['_Table', ...]]
+    # The tables requested from "get_table" -> the resolved tables, the sum of their items versions, and their union columns
+    unions: Dict[Tuple[str, ...], Tuple[Tuple['_Table', ...], int, Optional[Tuple[BaseColumn, ...]]]]
+
+    def __init__(self, items_version: int, index: _NameIndex) -> None:
+        self.items_version = items_version
+        self.index = index
+        self.tables_by_pattern = {}
+        self.unions = {}
+
+
 class _Database(_ItemFetcher):
     """
     Handle to a Kusto database.
@@ -166,10 +610,11 @@ class _Database(_ItemFetcher):
     """
     __client: PyKustoClient
     __name: str
+    __table_resolution: Optional['_TableResolution']
 
     def __init__(
-            self, client: PyKustoClient, name: str, tables: Dict[str, Tuple[BaseColumn]] = None,
-            fetch_by_default: bool = True
+            self, client: PyKustoClient, name: str, tables: Dict[str, Union[Tuple[BaseColumn, ...], _LazyColumns]] = None,
+            fetch_by_default: bool = True, fetch_on_access: bool = False
     ) -> None:
         """
         Create a new handle to Kusto database. The value of "fetch_by_default" is used for current instance, and also
@@ -179,6 +624,8 @@ class _Database(_ItemFetcher):
         :param name: Database name
         :param tables: A mapping from table names to the columns of each table. If this is None and "fetch_by_default"
             is true then they will be fetched in the constructor.
+        :param fetch_on_access: If true, tables are not fetched in the constructor, but rather when the database is first
+            accessed.
         """
         super().__init__(
             # Providing the items to ItemFetcher prevents further queries until the "refresh" method is explicitly
@@ -187,10 +634,12 @@ class _Database(_ItemFetcher):
                 table_name: _Table(self, table_name, columns, fetch_by_default=fetch_by_default)
                 for table_name, columns in tables.items()
             },
-            fetch_by_default
+            fetch_by_default,
+            fetch_on_access
         )
         self.__client = client
         self.__name = name
+        self.__table_resolution = None
         self._refresh_if_needed()
 
     def __repr__(self) -> str:
@@ -210,6 +659,15 @@ class _Database(_ItemFetcher):
     def execute(self, query: KQL, properties: ClientRequestProperties = None) -> KustoResponse:
         return self.__client.execute(self.__name, query, properties)
 
+    def _get_schema_fetch_pool(self) -> SchemaFetchPool:
+        return self.__client._get_schema_fetch_pool()
+
+    def _get_schema_fetch_key(self) -> str:
+        return self.__client._get_schema_fetch_key()
+
+    def _get_schema_ttl(self) -> Optional[timedelta]:
+        return self.__client._get_schema_ttl()
+
     def get_table_names(self) -> Generator[str, None, None]:
         yield from self._get_item_names()
 
@@ -218,18 +676,45 @@ class _Database(_ItemFetcher):
         if not _Table.static_is_union(*tables):
             return self[tables[0]]
         columns: Optional[Tuple[BaseColumn, ...]] = None
+        self._fetch_on_access_if_needed()
         if self._items_fetched():
-            resolved_tables: Set[_Table] = set()
-            for table_pattern in tables:
-                if '*' in table_pattern:
-                    resolved_tables.update(table for table in self._get_items() if fnmatch(table.get_name(), table_pattern))
-                else:
-                    resolved_tables.add(self[table_pattern])
+            # Memoized resolutions bypass the item accessors, which are otherwise responsible for this
+            self._revalidate_if_stale()
+            resolution = self.__get_table_resolution()
+            union = resolution.unions.get(tables)
+            resolved_tables = self.__resolve_tables(resolution, *tables) if union is None else union[0]
             if len(resolved_tables) == 1:
-                return next(iter(resolved_tables))
-            columns = self.__try_to_resolve_union_columns(*resolved_tables)
+                return resolved_tables[0]
+            # Tables can be refreshed individually. Items versions only increase, so the sum changes whenever any of the tables changes.
+            columns_version = sum(table._get_items_version() for table in resolved_tables)
+            if union is None or union[1] != columns_version:
+                union = (resolved_tables, columns_version, self.__try_to_resolve_union_columns(*resolved_tables))
+                resolution.unions[tables] = union
+            columns = union[2]
         return _Table(self, tables, columns, fetch_by_default=self._fetch_by_default)
 
+    def __resolve_tables(self, resolution: '_TableResolution', *tables: str) -> Tuple['_Table', ...]:
+        resolved_tables: Set[_Table] = set()
+        for table_pattern in tables:
+            if '*' in table_pattern:
+                matching_tables = resolution.tables_by_pattern.get(table_pattern)
+                if matching_tables is None:
+                    matching_tables = tuple(self[table_name] for table_name in resolution.index.match(table_pattern))
+                    resolution.tables_by_pattern[table_pattern] = matching_tables
+                resolved_tables.update(matching_tables)
+            else:
+                resolved_tables.add(self[table_pattern])
+        return tuple(resolved_tables)
+
+    def __get_table_resolution(self) -> '_TableResolution':
+        items_version = self._get_items_version()
+        resolution = self.__table_resolution
+        if resolution is None or resolution.items_version != items_version:
+            resolution = _TableResolution(items_version, _NameIndex(self._get_item_names()))
+            # Replaced as a whole, so concurrent callers never see a mix of old and new tables
+            self.__table_resolution = resolution
+        return resolution
+
     @staticmethod
     def __try_to_resolve_union_columns(*resolved_tables: '_Table') -> Optional[Tuple[BaseColumn, ...]]:
         column_by_name: Dict[str, BaseColumn] = {}
@@ -241,22 +726,41 @@ class _Database(_ItemFetcher):
         return tuple(column_by_name.values())
 
     def _internal_get_items(self) -> Dict[str, '_Table']:
+        shared_tables = self.__client._get_shared_tables(self.__name)
+        if shared_tables is not None:
+            return {
+                table_name: _Table(self, table_name, _LazyColumns(columns), fetch_by_default=self._fetch_by_default)
+                for table_name, columns in shared_tables.items()
+            }
         # Retrieves table names, column names and types for this database only (the database name is added in the
         # "execute" method)
-        res: KustoResponse = self.execute(
-            KQL('.show database schema | project TableName, ColumnName, ColumnType | limit 10000')
-        )
-        table_to_columns = defaultdict(list)
-        for table_name, column_name, column_type in res.get_valid_rows():
-            table_to_columns[table_name].append(_typed_column.registry[_DOT_NAME_TO_TYPE[column_type]](column_name))
         # Table instances are provided with all column data, preventing them from generating more queries. However the
         # "fetch_by_default" behavior is
         # passed on to them for future actions.
         return {
-            table_name: _Table(self, table_name, tuple(columns), fetch_by_default=self._fetch_by_default)
-            for table_name, columns in table_to_columns.items()
+            table_name: _Table(self, table_name, _LazyColumns(columns), fetch_by_default=self._fetch_by_default)
+            for table_name, columns in self.__fetch_table_to_columns().items()
         }
 
+    def _internal_update_items(self) -> None:
+        # Existing tables are updated in place, and only if their columns changed
+        tables = self._items_snapshot()
+        updated_tables = {}
+        for table_name, columns in self.__fetch_table_to_columns().items():
+            table = tables.get(table_name)
+            if table is None:
+                table = _Table(self, table_name, _LazyColumns(columns), fetch_by_default=False)
+            else:
+                table._update_columns(_LazyColumns(columns))
+            updated_tables[table_name] = table
+        self._load_items(updated_tables)
+
+    def __fetch_table_to_columns(self) -> Dict[str, List[Tuple[str, _KustoType]]]:
+        table_to_columns = defaultdict(list)
+        for table_name, column_name, column_type in _fetch_schema_rows(self, self.execute, KQL('.show database schema'), 'TableName, ColumnName, ColumnType'):
+            table_to_columns[table_name].append((column_name, _DOT_NAME_TO_TYPE[column_type]))
+        return table_to_columns
+
 
 class _Table(_ItemFetcher):
     """
@@ -268,7 +772,7 @@ class _Table(_ItemFetcher):
 
     def __init__(
             self, database: _Database, tables: Union[str, List[str], Tuple[str, ...]],
-            columns: Tuple[BaseColumn, ...] = None, fetch_by_default: bool = True
+            columns: Union[Tuple[BaseColumn, ...], _LazyColumns] = None, fetch_by_default: bool = True
     ) -> None:
         """
         Create a new handle to a Kusto table.
@@ -276,11 +780,11 @@ class _Table(_ItemFetcher):
         :param database: The associated Database instance
         :param tables: Either a single table name, or a list of tables. If more than one table is given OR the table
             name contains a wildcard, the Kusto 'union' statement will be used.
-        :param columns: Table columns. If this is None and "ItemFetcher" is true then they will be fetched in the
-            constructor.
+        :param columns: Table columns, either as column objects, or in compact form. If this is None and "ItemFetcher" is
+            true then they will be fetched in the constructor.
         """
         super().__init__(
-            None if columns is None else {c.get_name(): c for c in columns},
+            None if columns is None else columns if isinstance(columns, _LazyColumns) else {c.get_name(): c for c in columns},
             fetch_by_default
         )
         self.__database = database
@@ -329,27 +833,38 @@ class _Table(_ItemFetcher):
     def execute(self, query: KQL) -> KustoResponse:
         return self.__database.execute(query)
 
+    def _get_schema_fetch_pool(self) -> SchemaFetchPool:
+        return self.__database._get_schema_fetch_pool()
+
+    def _get_schema_fetch_key(self) -> str:
+        return self.__database._get_schema_fetch_key()
+
+    def _get_schema_ttl(self) -> Optional[timedelta]:
+        return self.__database._get_schema_ttl()
+
     def get_columns_names(self) -> Generator[str, None, None]:
         yield from self._get_item_names()
 
+    def _update_columns(self, columns: _LazyColumns) -> None:
+        current_columns = self._get_items_mapping()
+        current_column_types = (
+            current_columns.get_column_types() if isinstance(current_columns, _LazyColumns) else [(name, type(column)) for name, column in current_columns.items()]
+        )
+        if current_column_types != columns.get_column_types():
+            self._load_items(columns)
+
     def get_columns(self) -> Generator[BaseColumn, None, None]:
         yield from self._get_items()
 
-    def _internal_get_items(self) -> Dict[str, BaseColumn]:
+    def _internal_get_items(self) -> _LazyColumns:
         if not self.is_union():
             # Retrieves column names and types for this table only
-            res: KustoResponse = self.execute(
-                KQL(f'.show table {self.get_name()} | project AttributeName, AttributeType | limit 10000')
+            return _LazyColumns(
+                (column_name, _INTERNAL_NAME_TO_TYPE[column_type])
+                for column_name, column_type in _fetch_schema_rows(self, self.execute, KQL(f'.show table {self.get_name()}'), 'AttributeName, AttributeType')
             )
-            return {
-                column_name: _typed_column.registry[_INTERNAL_NAME_TO_TYPE[column_type]](column_name)
-                for column_name, column_type in res.get_valid_rows()
-            }
         # Get Kusto to figure out the schema of the union, especially useful for column name conflict resolution
-        res: KustoResponse = self.execute(
-            KQL(f'{self.to_query_format()} | getschema | project ColumnName, DataType | limit 10000')
+        return _LazyColumns(
+            (column_name, _DOT_NAME_TO_TYPE[column_type])
+            for column_name, column_type in _fetch_schema_rows(self, self.execute, KQL(f'{self.to_query_format()} | getschema'), 'ColumnName, DataType')
         )
-        return {
-            column_name: _typed_column.registry[_DOT_NAME_TO_TYPE[column_type]](column_name)
-            for column_name, column_type in res.get_valid_rows()
-        }
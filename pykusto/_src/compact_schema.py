@@ -0,0 +1,81 @@
+from array import array
+from collections.abc import Mapping
+from sys import intern
+from typing import Dict, Iterator, Iterable, List, Optional, Tuple, Type
+
+from .expressions import BaseColumn
+from .type_utils import _KustoType, _typed_column
+
+# Column types are stored as indices into this tuple
+_KUSTO_TYPES: Tuple[_KustoType, ...] = tuple(_KustoType)
+_KUSTO_TYPE_CODES: Dict[_KustoType, int] = {kusto_type: code for code, kusto_type in enumerate(_KUSTO_TYPES)}
+
+
+class _LazyColumns(Mapping):
+    """
+    The columns of a table, stored compactly: interned column names (shared between all tables with the same column names), and the type of each column as a single
+    byte. Column objects are created only when accessed, and then cached. Columns can also be added, as with a dict.
+    Used for schemas of entire clusters, where most columns are never accessed.
+    """
+    __names: Tuple[str, ...]
+    __type_codes: array
+    __indices: Optional[Dict[str, int]]
+    __columns: Optional[Dict[str, BaseColumn]]
+
+    def __init__(self, columns: Iterable[Tuple[str, _KustoType]]) -> None:
+        """
+        :param columns: The name and type of each column
+        """
+        names = []
+        self.__type_codes = array('B')
+        for name, kusto_type in columns:
+            names.append(intern(name))
+            self.__type_codes.append(_KUSTO_TYPE_CODES[kusto_type])
+        self.__names = tuple(names)
+        # Created on first access, so that tables which are never accessed do not pay for them
+        self.__indices = None
+        self.__columns = None
+
+    def __len__(self) -> int:
+        return len(self.__names) + (0 if self.__columns is None else sum(1 for name in self.__columns if self.__index(name) is None))
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.__names
+        if self.__columns is not None:
+            yield from (name for name in self.__columns if self.__index(name) is None)
+
+    def __contains__(self, name: object) -> bool:
+        return self.__index(name) is not None or (self.__columns is not None and name in self.__columns)
+
+    def __getitem__(self, name: str) -> BaseColumn:
+        column = None if self.__columns is None else self.__columns.get(name)
+        if column is None:
+            index = self.__index(name)
+            if index is None:
+                raise KeyError(name)
+            column = _typed_column.registry[_KUSTO_TYPES[self.__type_codes[index]]](self.__names[index])
+            self[name] = column
+        return column
+
+    def __setitem__(self, name: str, column: BaseColumn) -> None:
+        if self.__columns is None:
+            self.__columns = {}
+        self.__columns[name] = column
+
+    def __index(self, name: object) -> Optional[int]:
+        if self.__indices is None:
+            self.__indices = {name: index for index, name in enumerate(self.__names)}
+        return self.__indices.get(name)
+
+    def get_column_types(self) -> List[Tuple[str, Type[BaseColumn]]]:
+        """
+        :return: The name and column class of each column, without creating column objects
+        """
+        column_types = []
+        # Columns which were not added come first, in the same order as their type codes
+        for index, name in enumerate(self):
+            if self.__columns is not None and name in self.__columns:
+                column_types.append((name, type(self.__columns[name])))
+            else:
+                column_types.append((name, _typed_column.registry[_KUSTO_TYPES[self.__type_codes[index]]]))
+        return column_types
@@ -339,11 +339,13 @@ class Functions:
         return expr.get_year()
 
     @staticmethod
-    def hash(expr: _ExpressionType) -> _StringExpression:
+    def hash(expr: _ExpressionType, mod: _NumberType = None) -> Union[_StringExpression, _NumberExpression]:
         """
         https://docs.microsoft.com/en-us/azure/data-explorer/kusto/query/hashfunction
         """
-        return expr.__hash__()
+        if mod is None:
+            return expr.__hash__()
+        return _NumberExpression(KQL(f'hash({_to_kql(expr)}, {_to_kql(mod)})'))
 
     @staticmethod
     def hash_sha256(expr: _ExpressionType) -> _StringExpression:
@@ -651,6 +653,15 @@ class Functions:
         """
         return expr.round(precision)
 
+    @staticmethod
+    def row_number(starting_index: _NumberType = None, restart: _BooleanType = None) -> _NumberExpression:
+        """
+        https://docs.microsoft.com/en-us/azure/data-explorer/kusto/query/rownumberfunction
+        """
+        if restart is not None:
+            return _NumberExpression(KQL(f'row_number({_to_kql(1 if starting_index is None else starting_index)}, {_to_kql(restart)})'))
+        return _NumberExpression(KQL('row_number()' if starting_index is None else f'row_number({_to_kql(starting_index)})'))
+
     # def series_add(self): return
     #
     #
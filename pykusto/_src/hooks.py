@@ -0,0 +1,93 @@
+from enum import Enum
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Any, Tuple, TypeVar
+
+from .logger import _logger
+
+_T = TypeVar('_T')
+_Hook = Callable[[Dict[str, Any]], None]
+
+
+class HookEvent(Enum):
+    """
+    Events which hooks can subscribe to using :func:`add_hook`. Each hook is called with a dict describing the event:
+
+    * BEFORE_QUERY_EXECUTE: 'query', 'table' (None unless a table was provided to :func:`Query.execute`)
+    * AFTER_QUERY_EXECUTE: same as BEFORE_QUERY_EXECUTE, with 'elapsed' (seconds), 'error' (None unless execution failed), 'response', 'row_count'
+    * BEFORE_RENDER: 'query'
+    * AFTER_RENDER: 'query', 'elapsed' (seconds), 'error' (None unless rendering failed), 'kql', 'kql_length'
+    * BEFORE_EXECUTE: 'client', 'database', 'query' (the rendered KQL), 'properties', 'query_bytes'
+    * AFTER_EXECUTE: same as BEFORE_EXECUTE, with 'elapsed' (seconds), 'error' (None unless execution failed), 'response', 'row_count'
+    * BEFORE_CONVERT: 'response', 'format' ('dataframe' or 'arrow')
+    * AFTER_CONVERT: same as BEFORE_CONVERT, with 'elapsed' (seconds), 'error' (None unless conversion failed), 'row_count'
+    * BEFORE_REFRESH: 'fetcher' (the client, database or table whose schema is fetched), 'incremental' (see :func:`incremental_refresh`)
+    * AFTER_REFRESH: 'fetcher', 'incremental', 'elapsed' (seconds), 'error' (None unless fetching failed), 'item_count'
+    """
+    BEFORE_QUERY_EXECUTE = 'before_query_execute'
+    AFTER_QUERY_EXECUTE = 'after_query_execute'
+    BEFORE_RENDER = 'before_render'
+    AFTER_RENDER = 'after_render'
+    BEFORE_EXECUTE = 'before_execute'
+    AFTER_EXECUTE = 'after_execute'
+    BEFORE_CONVERT = 'before_convert'
+    AFTER_CONVERT = 'after_convert'
+    BEFORE_REFRESH = 'before_refresh'
+    AFTER_REFRESH = 'after_refresh'
+
+
+# Hooks are kept in tuples which are replaced rather than modified, so that emitting an event does not require locking
+_HOOKS: Dict[HookEvent, Tuple[_Hook, ...]] = {event: tuple() for event in HookEvent}
+_HOOKS_LOCK = Lock()
+
+
+def add_hook(event: HookEvent, hook: _Hook) -> None:
+    """
+    Subscribe to an event. Hooks are called synchronously, in the thread where the event occurs, so they should return quickly. Exceptions raised by hooks are logged
+    and otherwise ignored.
+    """
+    with _HOOKS_LOCK:
+        _HOOKS[event] = _HOOKS[event] + (hook,)
+
+
+def remove_hook(event: HookEvent, hook: _Hook) -> None:
+    """
+    :raises ValueError: If the hook is not subscribed to the event
+    """
+    with _HOOKS_LOCK:
+        hooks = list(_HOOKS[event])
+        hooks.remove(hook)
+        _HOOKS[event] = tuple(hooks)
+
+
+def _has_hooks(*events: HookEvent) -> bool:
+    return any(_HOOKS[event] for event in events)
+
+
+def _emit(event: HookEvent, payload: Dict[str, Any]) -> None:
+    for hook in _HOOKS[event]:
+        try:
+            hook(payload)
+        except Exception:
+            _logger.exception(f"Hook for event '{event.value}' failed")
+
+
+def _call_with_hooks(
+        before: HookEvent, after: HookEvent, payload: Dict[str, Any], function: Callable[[], _T], describe_result: Callable[[_T], Dict[str, Any]]
+) -> _T:
+    """
+    Call the function, emitting an event before and after the call. Callers are expected to check :func:`_has_hooks` first, and to call the function directly if there
+    are no subscribers, so that the payload is not even built.
+
+    :param payload: Passed to hooks of both events, and extended with the elapsed time and the error (if any) for the second event
+    :param describe_result: Extends the payload of the second event according to the result of the function
+    """
+    _emit(before, payload)
+    start = perf_counter()
+    try:
+        result = function()
+    except Exception as e:
+        _emit(after, {**payload, 'elapsed': perf_counter() - start, 'error': e})
+        raise
+    _emit(after, {**payload, 'elapsed': perf_counter() - start, 'error': None, **describe_result(result)})
+    return result
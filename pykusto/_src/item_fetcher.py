@@ -1,12 +1,15 @@
+import asyncio
 from abc import ABCMeta, abstractmethod
-from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import Future, wait
+from datetime import timedelta
 from itertools import chain
 from threading import Lock
-from typing import Union, Dict, Any, Iterable, Callable, Generator
+from time import monotonic
+from typing import Union, Dict, Any, Iterable, Callable, Generator, Optional, Mapping
 
-# Using a thread pool even though we only need one thread, because that's the only way to make use of "futures".
-# Also, this makes it easy to use more than one thread, if the need ever arises.
-_POOL = ThreadPoolExecutor(max_workers=1)
+from .hooks import HookEvent, _has_hooks, _call_with_hooks
+from .logger import _logger
+from .schema_fetch_pool import SchemaFetchPool, get_default_schema_fetch_pool
 
 
 class _ItemFetcher(metaclass=ABCMeta):
@@ -14,37 +17,97 @@ class _ItemFetcher(metaclass=ABCMeta):
     Abstract class that caches a collection of items, fetching them in certain scenarios.
     """
     _fetch_by_default: bool
+    __fetch_on_access: bool
     __items: Union[None, Dict[str, Any]]
     __future: Union[None, Future]
     __item_write_lock: Lock
     __item_fetch_lock: Lock
+    __access_fetch_lock: Lock
+    __fetched_at: Optional[float]
+    __revalidating: bool
+    __revalidation_lock: Lock
+    __items_version: int
 
-    def __init__(self, items: Union[None, Dict[str, Any]], fetch_by_default: bool) -> None:
+    def __init__(self, items: Union[None, Dict[str, Any]], fetch_by_default: bool, fetch_on_access: bool = False) -> None:
         """
         :param items: Initial items. If not None, items will not be fetched until the "refresh" method is explicitly called.
         :param fetch_by_default: When true, items will be fetched in the constructor, but only if they were not supplied as a parameter. Subclasses are encouraged to pass
                                     on the value of "fetch_by_default" to child ItemFetchers.
+        :param fetch_on_access: When true, items are not fetched in the constructor, but rather synchronously when they are first accessed (unless they were supplied as
+                                    a parameter, or fetched in the meantime).
         """
         self._fetch_by_default = fetch_by_default
+        self.__fetch_on_access = fetch_on_access
         self.__items = items
         self.__future = None
         self.__item_write_lock = Lock()
         self.__item_fetch_lock = Lock()
+        self.__access_fetch_lock = Lock()
+        # Items supplied in the constructor were fetched by another ItemFetcher, which is responsible for keeping them fresh
+        self.__fetched_at = None
+        self.__revalidating = False
+        self.__revalidation_lock = Lock()
+        self.__items_version = 0
 
     def _items_fetched(self) -> bool:
         return self.__items is not None
 
     def _refresh_if_needed(self) -> None:
-        if self.__items is None and self._fetch_by_default:
+        if self.__items is None and self._fetch_by_default and not self.__fetch_on_access:
             self.refresh()
 
+    def _fetch_on_access_if_needed(self) -> None:
+        if self.__items is not None or not self.__fetch_on_access:
+            return
+        with self.__access_fetch_lock:
+            # Another thread might have fetched the items while we were waiting for the lock
+            if self.__items is None:
+                self._load_items(self.__fetch_items())
+                self.__fetched_at = monotonic()
+
+    def _revalidate_if_stale(self) -> None:
+        """
+        If items were fetched longer than the schema TTL ago, refresh them in the background. Meanwhile the current items remain available. At most one such refresh is
+        in progress at any time.
+        """
+        if self.__fetched_at is None:
+            return
+        ttl = self._get_schema_ttl()
+        if ttl is None or monotonic() - self.__fetched_at < ttl.total_seconds():
+            return
+        with self.__revalidation_lock:
+            if self.__revalidating:
+                return
+            self.__revalidating = True
+        try:
+            self.__future = self._get_schema_fetch_pool().submit(self._get_schema_fetch_key(), self.__revalidate)
+        except RuntimeError as e:
+            # E.g. the pool was shut down. The stale items remain available, and the next access tries again.
+            _logger.warning(f"Failed scheduling refresh of stale schema for {self!r}: {e!r}")
+            with self.__revalidation_lock:
+                self.__revalidating = False
+
+    def __revalidate(self) -> None:
+        # Items are replaced before the future is done, so that once "wait_for_items" returns they are up to date
+        try:
+            self._load_items(self.__fetch_items())
+            self.__fetched_at = monotonic()
+        finally:
+            # If the refresh failed, the items remain stale, and the next access tries again
+            with self.__revalidation_lock:
+                self.__revalidating = False
+
     def _get_item_names(self) -> Generator[str, None, None]:
+        self._fetch_on_access_if_needed()
+        self._revalidate_if_stale()
         if self.__items is None:
             return
         # No race condition because once fetched self.__items will never go back to being None
         yield from self.__items.keys()
 
     def _get_items(self) -> Generator[Any, None, None]:
+        self._fetch_on_access_if_needed()
+        self._revalidate_if_stale()
         if self.__items is None:
             return
         yield from self.__items.values()
@@ -82,9 +145,12 @@ class _ItemFetcher(metaclass=ABCMeta):
             if self.__items is None:
                 self.__items = {}
             self.__items[name] = item
+            self.__items_version += 1
         return item
 
     def _get_item(self, name: str, fallback: Callable[[], Any]) -> Any:
+        self._fetch_on_access_if_needed()
+        self._revalidate_if_stale()
         if self.__items is not None:
             resolved_item = self.__items.get(name)
             if resolved_item is not None:
@@ -92,6 +158,7 @@ class _ItemFetcher(metaclass=ABCMeta):
         return fallback()
 
     def __dir__(self) -> Iterable[str]:
+        self._fetch_on_access_if_needed()
         return sorted(chain(super().__dir__(), tuple() if self.__items is None else filter(lambda name: '.' not in name, self.__items.keys())))
 
     def refresh(self) -> None:
@@ -99,9 +166,19 @@ class _ItemFetcher(metaclass=ABCMeta):
         Fetches all items in a separate thread, making them available after the tread finishes executing. The 'wait_for_items' method can be used to wait for that to happen.
         The specific logic for fetching is defined in concrete subclasses.
         """
-        self.__future = _POOL.submit(self.__fetch_items)
+        self.__future = self._get_schema_fetch_pool().submit(self._get_schema_fetch_key(), self.__fetch_items)
         self.__future.add_done_callback(self._set_items)
 
+    def incremental_refresh(self) -> None:
+        """
+        Similar to :func:`refresh`, but if items were already fetched, only fetches what changed since, and updates existing items in place, so that references to them
+        remain current. The specific logic is defined in concrete subclasses. The 'wait_for_items' method can be used to wait for the update to finish.
+        """
+        if self.__items is None:
+            self.refresh()
+        else:
+            self.__future = self._get_schema_fetch_pool().submit(self._get_schema_fetch_key(), self._update_items)
+
     def wait_for_items(self) -> None:
         """
         If item fetching is currently in progress, wait until it is done and return, otherwise return immediately.
@@ -114,9 +191,87 @@ class _ItemFetcher(metaclass=ABCMeta):
         self.refresh()
         self.wait_for_items()
 
+    async def wait_for_items_async(self) -> None:
+        """
+        Awaitable counterpart of :func:`wait_for_items`, which does not block the running event loop.
+        """
+        if self.__future is not None:
+            await asyncio.wait((asyncio.wrap_future(self.__future),))
+
+    async def refresh_async(self) -> None:
+        """
+        Awaitable counterpart of :func:`blocking_refresh`, which does not block the running event loop. Items are still fetched in the schema fetch pool, so the
+        schemas of several clusters can be fetched concurrently using e.g. `asyncio.gather`.
+        """
+        self.refresh()
+        await self.wait_for_items_async()
+
+    def _load_items(self, items: Dict[str, Any]) -> None:
+        """
+        Use items which were obtained without fetching, e.g. from a cache. Unlike items provided in the constructor, they can be loaded after construction, and do not
+        prevent a subsequent fetch.
+        """
+        with self.__item_write_lock:
+            self.__items = items
+            self.__items_version += 1
+
+    def _get_items_version(self) -> int:
+        """
+        :return: A number which changes whenever items are replaced or added, for invalidating anything derived from the items
+        """
+        return self.__items_version
+
+    def _get_schema_fetch_pool(self) -> SchemaFetchPool:
+        """
+        :return: The pool in which items are fetched. Subclasses are encouraged to share the pool of their parent ItemFetcher.
+        """
+        return get_default_schema_fetch_pool()
+
+    @abstractmethod
+    def _get_schema_ttl(self) -> Optional[timedelta]:
+        """
+        :return: How long fetched items are considered fresh, or None if they never expire. Subclasses are encouraged to share the TTL of their parent ItemFetcher.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    @abstractmethod
+    def _get_schema_fetch_key(self) -> str:
+        """
+        :return: Identifies the cluster the items are fetched from, for fair scheduling by the pool
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def _items_snapshot(self) -> Dict[str, Any]:
+        return {} if self.__items is None else dict(self.__items)
+
+    def _get_items_mapping(self) -> Mapping[str, Any]:
+        """
+        :return: The current items, without copying them (unlike :func:`_items_snapshot`). Must not be modified.
+        """
+        return {} if self.__items is None else self.__items
+
+    def _update_items(self) -> None:
+        with self.__item_fetch_lock:
+            if _has_hooks(HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH):
+                _call_with_hooks(
+                    HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH, {'fetcher': self, 'incremental': True}, self._internal_update_items,
+                    lambda _: {'item_count': len(self.__items)}
+                )
+            else:
+                self._internal_update_items()
+            self.__fetched_at = monotonic()
+
+    def _internal_update_items(self) -> None:
+        """
+        Update the items incrementally. By default, all items are fetched and replaced.
+        """
+        self._load_items(self._internal_get_items())
+
     def _set_items(self, future: Future):
         with self.__item_write_lock:
             self.__items = future.result()
+            self.__items_version += 1
+            self.__fetched_at = monotonic()
 
     @abstractmethod
     def _internal_get_items(self) -> Dict[str, Any]:
@@ -124,6 +279,11 @@ class _ItemFetcher(metaclass=ABCMeta):
 
     def __fetch_items(self) -> Dict[str, Any]:
         with self.__item_fetch_lock:
+            if _has_hooks(HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH):
+                return _call_with_hooks(
+                    HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH, {'fetcher': self, 'incremental': False}, self._internal_get_items,
+                    lambda items: {'item_count': len(items)}
+                )
             return self._internal_get_items()
 
 
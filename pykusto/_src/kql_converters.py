@@ -1,5 +1,7 @@
 import json
+import re
 from datetime import datetime, timedelta
+from hashlib import sha256
 from itertools import chain
 from numbers import Number
 from typing import NewType, Union, Mapping, List, Tuple
@@ -58,3 +60,34 @@ def _number_to_kql(n: Number) -> KQL:
 
 
 _kql_converter.assert_all_types_covered()
+
+# Matches the output of each of the above converters. Keep in sync when modifying a converter.
+_LITERAL_PATTERNS = (
+    # Not literals, but part of the query shape: quoted column names, and names of clusters, databases and tables
+    ('identifier', r"\['(?:[^'\\]|\\.)*'\]"),
+    ('entity', r'(?<!\w)(?:cluster|database|table)\("(?:[^"\\]|\\.)*"\)'),
+    ('string', r'"(?:[^"\\]|\\.)*"'),
+    # JSON does not contain parentheses, except inside strings
+    ('dynamic', r'(?<!\w)dynamic\((?:"(?:[^"\\]|\\.)*"|[^()"])*\)'),
+    ('datetime', r'(?<!\w)datetime\([^)]*\)'),
+    ('timespan', r'(?<!\w)time\([^)]*\)'),
+    ('bool', r'(?<!\w)(?:true|false)(?!\w)'),
+    # Digits which are part of an identifier (e.g. 'field2') are not a literal
+    ('number', r'(?<![\w.])\d+(?:\.\d+)?(?:e[+-]?\d+)?(?![\w.])'),
+)
+_LITERAL_REGEX = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _LITERAL_PATTERNS))
+# Lists of literals on the right side of set operators have the same shape regardless of their length. Other comma separated literals, such as function arguments, keep
+# their number. (Dynamic arrays need no special handling, since each of them is replaced by a single placeholder.)
+_LITERAL_LIST_REGEX = re.compile(r'((?<![\w!~])(?:!?in~?|has_any|has_all) \()(<\w+>)(?:, <\w+>)*(?=\))')
+
+
+def _normalize_literals(kql: KQL) -> KQL:
+    """
+    Replace each literal in the query with a placeholder which only specifies its type, e.g. 'where foo == "bar"' becomes 'where foo == <string>'.
+    """
+    with_placeholders = _LITERAL_REGEX.sub(lambda match: match.group() if match.lastgroup in ('identifier', 'entity') else f'<{match.lastgroup}>', kql)
+    return KQL(_LITERAL_LIST_REGEX.sub(r'\1\2, ...', with_placeholders))
+
+
+def _kql_fingerprint(kql: KQL) -> str:
+    return sha256(_normalize_literals(kql).encode()).hexdigest()
@@ -0,0 +1,65 @@
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from typing import Iterable, List, Optional
+
+_WILDCARD_CHARACTERS = frozenset('*?[')
+
+
+def _literal_prefix(pattern: str) -> str:
+    for index, character in enumerate(pattern):
+        if character in _WILDCARD_CHARACTERS:
+            return pattern[:index]
+    return pattern
+
+
+def _literal_suffix(pattern: str) -> str:
+    # A ']' might close a character set, so it ends the suffix as well
+    return pattern[max(pattern.rfind(character) for character in _WILDCARD_CHARACTERS | {']'}) + 1:]
+
+
+def _range_with_prefix(sorted_names: List[str], prefix: str) -> List[str]:
+    """
+    :return: The names which start with the prefix, found by binary search
+    """
+    start = bisect_left(sorted_names, prefix)
+    # All names starting with the prefix are smaller than the prefix with its last character incremented
+    end = bisect_left(sorted_names, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+    return sorted_names[start:end]
+
+
+class _NameIndex:
+    """
+    Sorted item names, for finding the names which match a wildcard pattern (as in :func:`fnmatch.fnmatchcase`) without checking every name.
+    If the pattern starts with literal characters, only names starting with them are checked, and similarly if it ends with literal characters. Only patterns with
+    neither, such as '*Logs*', require checking every name.
+    """
+    __names: List[str]
+    __reversed_names: Optional[List[str]]
+
+    def __init__(self, names: Iterable[str]) -> None:
+        self.__names = sorted(names)
+        # Created on first suffix lookup, since most patterns have a literal prefix
+        self.__reversed_names = None
+
+    def match(self, pattern: str) -> List[str]:
+        """
+        :return: The names matching the pattern, in sorted order
+        """
+        prefix = _literal_prefix(pattern)
+        if prefix == pattern:
+            return [pattern] if self.__contains(pattern) else []
+        if len(prefix) > 0:
+            candidates = _range_with_prefix(self.__names, prefix)
+        else:
+            suffix = _literal_suffix(pattern)
+            if len(suffix) > 0:
+                if self.__reversed_names is None:
+                    self.__reversed_names = sorted(name[::-1] for name in self.__names)
+                candidates = sorted(name[::-1] for name in _range_with_prefix(self.__reversed_names, suffix[::-1]))
+            else:
+                candidates = self.__names
+        return [name for name in candidates if fnmatchcase(name, pattern)]
+
+    def __contains(self, name: str) -> bool:
+        index = bisect_left(self.__names, name)
+        return index < len(self.__names) and self.__names[index] == name
@@ -1,22 +1,32 @@
+import re
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy, deepcopy
+from datetime import datetime, timedelta
 from itertools import chain
 from os import linesep
 from types import FunctionType
-from typing import Tuple, List, Union, Optional
+from typing import Tuple, List, Union, Optional, Dict, Generator, TYPE_CHECKING
+
+import pandas as pd
 
 from .client import _Table, KustoResponse
 from .enums import Order, Nulls, JoinKind, Distribution, BagExpansion
 from .expressions import _BooleanType, _ExpressionType, AggregationExpression, _OrderedType, \
     _StringType, _AssignmentBase, _AssignmentFromAggregationToColumn, _AssignmentToSingleColumn, _AnyTypeColumn, \
     BaseExpression, \
-    _AssignmentFromColumnToColumn, AnyExpression, _to_kql, _expression_to_type, BaseColumn, _NumberType
+    _AssignmentFromColumnToColumn, AnyExpression, _to_kql, _expression_to_type, BaseColumn, _NumberType, _DatetimeExpression
 from .functions import Functions as f
-from .kql_converters import KQL
+from .hooks import HookEvent, _has_hooks, _call_with_hooks
+from .kql_converters import KQL, _normalize_literals, _kql_fingerprint
 from .logger import _logger
 from .type_utils import _KustoType, _typed_column, _plain_expression
 from .udf import _stringify_python_func
 
+if TYPE_CHECKING:  # pragma: no cover
+    # Optional dependency, used only for type hints
+    import pyarrow
+
 
 class Query:
     _head: Optional['Query']
@@ -158,6 +168,12 @@ class Query:
         """
         return _ExtendQuery(self, *self._extract_assignments(*args, **kwargs))
 
+    def serialize(self, *args: Union[BaseExpression, _AssignmentBase], **kwargs: _ExpressionType) -> '_SerializeQuery':
+        """
+        https://docs.microsoft.com/en-us/azure/data-explorer/kusto/query/serializeoperator
+        """
+        return _SerializeQuery(self, *self._extract_assignments(*args, **kwargs))
+
     def summarize(self, *args: Union[AggregationExpression, _AssignmentFromAggregationToColumn],
                   **kwargs: AggregationExpression) -> '_SummarizeQuery':
         """
@@ -220,6 +236,13 @@ class Query:
     def _compile(self) -> KQL:
         raise NotImplementedError()  # pragma: no cover
 
+    def _is_row_local(self) -> bool:
+        """
+        :return: Whether the operator processes each row independently of the others, so that applying it to disjoint subsets of the rows and concatenating the
+            results is the same as applying it to all rows
+        """
+        return True
+
     def _compile_all(self, use_full_table_name) -> KQL:
         if self._head is None:
             if self._table is None:
@@ -249,7 +272,13 @@ class Query:
             return self._head.get_table_name()
 
     def render(self, use_full_table_name: bool = False) -> KQL:
-        result = self._compile_all(use_full_table_name)
+        if _has_hooks(HookEvent.BEFORE_RENDER, HookEvent.AFTER_RENDER):
+            result = _call_with_hooks(
+                HookEvent.BEFORE_RENDER, HookEvent.AFTER_RENDER, {'query': self}, lambda: self._compile_all(use_full_table_name),
+                lambda kql: {'kql': kql, 'kql_length': 0 if kql is None else len(kql)},
+            )
+        else:
+            result = self._compile_all(use_full_table_name)
         _logger.debug("Complied query: " + result)
         return result
 
@@ -259,7 +288,28 @@ class Query:
             kql = KQL(kql.replace(" |", linesep + "|"))
         return kql
 
+    def render_template(self, use_full_table_name: bool = False) -> KQL:
+        """
+        Render the query with each literal replaced by a placeholder which only specifies its type, e.g. 'where foo == "bar"' becomes 'where foo == <string>'.
+        Queries which differ only in their literals have the same template.
+        """
+        return _normalize_literals(self.render(use_full_table_name))
+
+    def fingerprint(self, use_full_table_name: bool = False) -> str:
+        """
+        A stable hash of the shape of the query (see :func:`render_template`), useful for grouping executions of the same query with different parameters, or as a cache key.
+        """
+        return _kql_fingerprint(self.render(use_full_table_name))
+
     def execute(self, table: _Table = None) -> KustoResponse:
+        if _has_hooks(HookEvent.BEFORE_QUERY_EXECUTE, HookEvent.AFTER_QUERY_EXECUTE):
+            return _call_with_hooks(
+                HookEvent.BEFORE_QUERY_EXECUTE, HookEvent.AFTER_QUERY_EXECUTE, {'query': self, 'table': table}, lambda: self.__execute(table),
+                lambda response: {'response': response, 'row_count': response.get_row_count()},
+            )
+        return self.__execute(table)
+
+    def __execute(self, table: Optional[_Table]) -> KustoResponse:
         if self.get_table() is None:
             if table is None:
                 raise RuntimeError("No table supplied")
@@ -273,8 +323,172 @@ class Query:
         _logger.debug("Running query: " + rendered_query)
         return table.execute(rendered_query)
 
-    def to_dataframe(self, table: _Table = None):
-        return self.execute(table).to_dataframe()
+    def to_dataframe(
+            self, table: _Table = None, columnar: bool = False, compact: bool = False, dynamic_as_json: bool = False, valid_rows_only: bool = False
+    ):
+        """
+        Execute the query and convert the result to a dataframe. See :func:`KustoResponse.to_dataframe`.
+        """
+        return self.execute(table).to_dataframe(columnar, compact, dynamic_as_json, valid_rows_only)
+
+    def to_arrow(self, table: _Table = None) -> 'pyarrow.Table':
+        """
+        Execute the query and convert the result to an Arrow table. See :func:`KustoResponse.to_arrow`.
+        """
+        return self.execute(table).to_arrow()
+
+    def iter_dataframes(self, chunk_size: int, table: _Table = None) -> Generator[pd.DataFrame, None, None]:
+        """
+        Execute the query and yield the result as consecutive dataframes of at most `chunk_size` rows each. See :func:`KustoResponse.iter_dataframes`.
+        """
+        yield from self.execute(table).iter_dataframes(chunk_size)
+
+    def iter_pages(self, page_size: int, table: _Table = None) -> Generator[pd.DataFrame, None, None]:
+        """
+        Execute the query one page at a time, yielding each page as a dataframe. Useful for results which exceed the result size limit of the cluster.
+        While a page is being processed, the next one is fetched in the background.
+
+        Pages are windows over the row numbers of the serialized query output, and each page re-executes the query. Therefore the pages are deterministic only if the
+        order of the output is, for example if the query ends with `sort_by`.
+
+        :param page_size: Maximal number of rows in a page
+        :param table: Table to execute on, if the query is not already bound to one
+        """
+        assert page_size > 0, "Page size must be positive"
+        row_number = _AnyTypeColumn('_pykusto_row_number')
+        numbered_query = self.serialize(f.row_number().assign_to(row_number))
+
+        def fetch_page(page_number: int) -> pd.DataFrame:
+            return numbered_query.where(
+                row_number.between(page_number * page_size + 1, (page_number + 1) * page_size)
+            ).project_away(row_number).to_dataframe(table)
+
+        with ThreadPoolExecutor(max_workers=1) as prefetch_pool:
+            next_page = prefetch_pool.submit(fetch_page, 0)
+            page_number = 0
+            while True:
+                page = next_page.result()
+                if len(page) < page_size:
+                    if len(page) > 0:
+                        yield page
+                    return
+                page_number += 1
+                next_page = prefetch_pool.submit(fetch_page, page_number)
+                yield page
+
+    def to_dataframe_by_time_shards(
+            self, column: _DatetimeExpression, start: datetime, end: datetime, shards: int, table: _Table = None, max_workers: int = None,
+            sample_bin: timedelta = None
+    ) -> pd.DataFrame:
+        """
+        Split the time range [start, end) into equal sub-ranges, execute the query once for each sub-range concurrently, and merge the results into a single dataframe.
+        This helps with queries that would otherwise exceed the result size or timeout limits of the cluster.
+
+        If the query ends with a 'summarize' in which all aggregations are decomposable (count, sum, min, max and their conditional variants), the partial results are
+        re-aggregated, so that the outcome is the same as that of a single execution. A 'summarize' followed by other operators is not supported, since those operators
+        would be applied to the partial results. Neither are operators which do not process each row independently, such as 'take', 'top', 'sort', 'distinct' and 'count'.
+        Operators added with :func:`custom` cannot be analyzed, and are assumed to process each row independently.
+
+        :param column: The datetime column to shard by
+        :param start: Start of the time range (inclusive)
+        :param end: End of the time range (exclusive)
+        :param shards: Number of sub-ranges
+        :param table: Table to execute on, if the query is not already bound to one
+        :param max_workers: Maximal number of shards executed concurrently. Defaults to the number of shards.
+        :param sample_bin: If provided, the row count of the table is first sampled per time bucket of this size, and the shard boundaries are chosen such that all shards
+            cover roughly the same number of rows (and therefore take roughly the same time), instead of being of equal width. Useful for skewed tables. A bucket is never
+            split, so for very skewed tables there might be fewer shards than requested.
+        :raises ValueError: If the partial results cannot be merged. Raised before any shard is executed.
+        """
+        assert shards > 0, "Number of shards must be positive"
+        assert start < end, "Empty time range"
+        if sample_bin is None:
+            boundaries = [start + (end - start) * i / shards for i in range(shards)] + [end]
+        else:
+            boundaries = self._balanced_time_boundaries(column, start, end, shards, sample_bin, table)
+        return self._to_dataframe_by_predicates(
+            [(column >= lower) & (column < upper) for lower, upper in zip(boundaries, boundaries[1:])], table, max_workers
+        )
+
+    def to_dataframe_by_hash_partitions(self, key: BaseExpression, partitions: int, table: _Table = None, max_workers: int = None) -> pd.DataFrame:
+        """
+        Split the table into partitions by the hash of the given key, execute the query once for each partition concurrently, and merge the results into a single dataframe.
+        Useful for tables which have no suitable datetime column for :func:`to_dataframe_by_time_shards`.
+
+        If the query ends with a 'summarize' grouped by the key, the partial results are simply concatenated, since every key resides in a single partition. Otherwise
+        partial 'summarize' results are re-aggregated, as in :func:`to_dataframe_by_time_shards`.
+
+        :param key: The expression to partition by
+        :param partitions: Number of partitions
+        :param table: Table to execute on, if the query is not already bound to one
+        :param max_workers: Maximal number of partitions executed concurrently. Defaults to the number of partitions.
+        :raises ValueError: If the partial results cannot be merged. Raised before any partition is executed.
+        """
+        assert partitions > 0, "Number of partitions must be positive"
+        # Using the 'mod' argument of 'hash' rather than the modulo operator, which might return negative values
+        return self._to_dataframe_by_predicates(
+            [f.hash(key, partitions) == partition for partition in range(partitions)], table, max_workers,
+            reaggregate=not (isinstance(self, _SummarizeQuery) and self._is_grouped_by(key))
+        )
+
+    def _to_dataframe_by_predicates(self, predicates: List[_BooleanType], table: Optional[_Table], max_workers: Optional[int], reaggregate: bool = True) -> pd.DataFrame:
+        # Validate before executing any shard, rather than failing after all of them were executed
+        self._validate_shardable()
+        merge_functions = self._merge_functions() if reaggregate and isinstance(self, _SummarizeQuery) else None
+        shard_queries = [self._with_base_predicate(predicate) for predicate in predicates]
+        with ThreadPoolExecutor(max_workers=len(shard_queries) if max_workers is None else max_workers) as pool:
+            frames = list(pool.map(lambda shard_query: shard_query.to_dataframe(table), shard_queries))
+        merged = pd.concat(frames, ignore_index=True)
+        if merge_functions is not None:
+            return self._reaggregate(merged, merge_functions)
+        return merged
+
+    def _validate_shardable(self) -> None:
+        """
+        :raises ValueError: If the query contains an operator whose results over disjoint subsets of the rows cannot be merged. A 'summarize' is supported only as the
+            last operator, where its results are re-aggregated.
+        """
+        query = self
+        while query is not None:
+            if isinstance(query, _SummarizeQuery):
+                if query is not self:
+                    raise ValueError("Partial results cannot be merged when 'summarize' is followed by other operators")
+            elif not query._is_row_local():
+                raise ValueError(f"Partial results cannot be merged for '{query._compile().split(' ', 1)[0]}', which does not process each row independently")
+            query = query._head
+
+    def _balanced_time_boundaries(
+            self, column: _DatetimeExpression, start: datetime, end: datetime, shards: int, sample_bin: timedelta, table: Optional[_Table]
+    ) -> List[datetime]:
+        sample = _WhereQuery(copy(self._get_root()), (column >= start) & (column < end)).summarize(rows=f.count()).by(bucket=column.bin(sample_bin)).to_dataframe(table)
+        bucket_counts = sorted(zip(map(_to_naive_datetime, sample['bucket']), sample['rows']))
+        total = sum(count for _, count in bucket_counts)
+        boundaries = [start]
+        accumulated = 0
+        for bucket_start, count in bucket_counts:
+            if len(boundaries) < shards:
+                target = total * len(boundaries) / shards
+                if accumulated + count >= target:
+                    # Close the current shard either before or after this bucket, whichever is closer to its share of the rows
+                    boundary = bucket_start if target - accumulated < accumulated + count - target else bucket_start + sample_bin
+                    if boundaries[-1] < boundary < end:
+                        boundaries.append(boundary)
+            accumulated += count
+        return boundaries + [end]
+
+    def _get_root(self) -> 'Query':
+        root = self
+        while root._head is not None:
+            root = root._head
+        return root
+
+    def _with_base_predicate(self, predicate: _BooleanType) -> 'Query':
+        """
+        Generate a copy of this query, in which the given predicate is applied directly on the table, before any other operator.
+        """
+        if self._head is None:
+            return _WhereQuery(self, predicate)
+        return _WhereQuery(copy(self._get_root()), predicate) + self
 
     @staticmethod
     def _extract_assignments(*args: Union[_AssignmentBase, BaseExpression], **kwargs: _ExpressionType) -> List[_AssignmentBase]:
@@ -352,6 +566,9 @@ class _DistinctQuery(Query):
     def _compile(self) -> KQL:
         return KQL(f"distinct {', '.join(c.kql for c in self._columns)}")
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _SampleDistinctQuery(Query):
     _number_of_values: _NumberType
@@ -365,6 +582,9 @@ class _SampleDistinctQuery(Query):
     def _compile(self) -> KQL:
         return KQL(f"sample-distinct {_to_kql(self._number_of_values)} of {self._column.kql}")
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _TopHittersQuery(Query):
     _number_of_values: _NumberType
@@ -384,6 +604,9 @@ class _TopHittersQuery(Query):
     def _compile(self) -> KQL:
         return KQL(f"top-hitters {_to_kql(self._number_of_values)} of {self._column.kql}{'' if self._by_expression is None else f' by {_to_kql(self._by_expression)}'}")
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _ExtendQuery(Query):
     _assignments: Tuple[_AssignmentBase, ...]
@@ -396,6 +619,23 @@ class _ExtendQuery(Query):
         return KQL(f"extend {', '.join(a.to_kql() for a in self._assignments)}")
 
 
+class _SerializeQuery(Query):
+    _assignments: Tuple[_AssignmentBase, ...]
+
+    def __init__(self, head: 'Query', *assignments: _AssignmentBase) -> None:
+        super().__init__(head)
+        self._assignments = assignments
+
+    def _compile(self) -> KQL:
+        if len(self._assignments) == 0:
+            return KQL('serialize')
+        return KQL(f"serialize {', '.join(a.to_kql() for a in self._assignments)}")
+
+    def _is_row_local(self) -> bool:
+        # Row numbers and other window functions depend on the preceding rows
+        return len(self._assignments) == 0
+
+
 class _WhereQuery(Query):
     _predicates: Tuple[_BooleanType, ...]
 
@@ -421,6 +661,9 @@ class _SingleNumberQuery(Query):
     def _compile(self) -> KQL:
         return KQL(f'{self._query_name} {self._num_rows}')
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _TakeQuery(_SingleNumberQuery):
     _num_rows: int
@@ -452,6 +695,9 @@ class _CountQuery(Query):
     def _compile(self) -> KQL:
         return KQL('count')
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _OrderQueryBase(Query):
     class OrderSpec:
@@ -489,6 +735,9 @@ class _OrderQueryBase(Query):
     def _compile(self) -> KQL:
         return KQL(f'{self._query_name} by {", ".join([self._compile_order_spec(order_spec) for order_spec in self._order_specs])}')
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class _SortQuery(_OrderQueryBase):
     def __init__(self, head: Query, col: _OrderedType, order: Order, nulls: Nulls):
@@ -508,6 +757,9 @@ class _TopQuery(Query):
         # noinspection PyProtectedMember
         return KQL(f'top {self._num_rows} by {_SortQuery._compile_order_spec(self._order_spec)}')
 
+    def _is_row_local(self) -> bool:
+        return False
+
 
 class JoinException(Exception):
     pass
@@ -548,6 +800,23 @@ class _JoinQuery(Query):
                    f'{", ".join([self._compile_on_attribute(attr) for attr in self._on_attributes])}')
 
 
+def _to_naive_datetime(value) -> datetime:
+    # Kusto datetimes are always UTC, and literals are rendered without a timezone
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(None)
+    return timestamp.to_pydatetime()
+
+
+# Merge functions for aggregations whose results over disjoint subsets of the data can be combined into the result over the entire data
+_DECOMPOSABLE_AGGREGATIONS: Dict[str, str] = {
+    'count': 'sum', 'countif': 'sum', 'sum': 'sum', 'sumif': 'sum', 'min': 'min', 'minif': 'min', 'max': 'max', 'maxif': 'max',
+}
+_AGGREGATION_CALL = re.compile(r'(\w+)\((.*)\)')
+# Placeholder for null 'by' values while re-aggregating
+_NULL_GROUP_KEY = object()
+
+
 class _SummarizeQuery(Query):
     _assignments: List[_AssignmentFromAggregationToColumn]
     _by_columns: List[Union[_AnyTypeColumn, BaseExpression]]
@@ -578,6 +847,55 @@ class _SummarizeQuery(Query):
             result += f' by {", ".join(chain((c.kql for c in self._by_columns), (a.to_kql() for a in self._by_assignments)))}'
         return KQL(result)
 
+    def _is_grouped_by(self, expression: BaseExpression) -> bool:
+        kql = _to_kql(expression)
+        return any(c.kql == kql for c in self._by_columns) or any(a._rvalue == kql for a in self._by_assignments)
+
+    @staticmethod
+    def _merge_function(aggregation: KQL) -> Optional[str]:
+        match = _AGGREGATION_CALL.fullmatch(aggregation)
+        if match is None:
+            return None
+        # Make sure the outer parentheses belong to a single call, e.g. not "sum(x) + sum(y)"
+        depth = 0
+        for char in match.group(2):
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if depth < 0:
+                return None
+        return _DECOMPOSABLE_AGGREGATIONS.get(match.group(1))
+
+    def _merge_functions(self) -> List[str]:
+        """
+        :return: The merge function of each aggregation
+        :raises ValueError: If any of the aggregations is not decomposable
+        """
+        merge_functions = [self._merge_function(a._rvalue) for a in self._assignments]
+        if None in merge_functions:
+            raise ValueError(f"Partial results cannot be merged for non-decomposable aggregations: {', '.join(a.to_kql() for a in self._assignments)}")
+        return merge_functions
+
+    def _reaggregate(self, merged: pd.DataFrame, merge_functions: List[str]) -> pd.DataFrame:
+        """
+        Combine partial 'summarize' results, each calculated over a disjoint subset of the data.
+        Kusto places the 'by' columns first, followed by the aggregation columns in order of appearance.
+        """
+        num_group_columns = len(merged.columns) - len(self._assignments)
+        group_columns = list(merged.columns[:num_group_columns])
+        aggregations = dict(zip(merged.columns[num_group_columns:], merge_functions))
+        if len(group_columns) == 0:
+            return pd.DataFrame({column_name: [merged[column_name].agg(function)] for column_name, function in aggregations.items()})
+        # 'groupby' drops groups with null keys (and supports keeping them only from pandas 1.1), so null keys are replaced with a placeholder while grouping
+        null_values = {}
+        for column_name in group_columns:
+            nulls = merged[column_name].isnull()
+            if nulls.any():
+                null_values[column_name] = (merged[column_name].dtype, merged[column_name][nulls].iloc[0])
+                merged[column_name] = merged[column_name].astype(object).where(~nulls, _NULL_GROUP_KEY)
+        result = merged.groupby(group_columns, as_index=False, sort=False).agg(aggregations)
+        for column_name, (dtype, null_value) in null_values.items():
+            result[column_name] = result[column_name].map(lambda value: null_value if value is _NULL_GROUP_KEY else value).astype(dtype)
+        return result
+
 
 class _MvExpandQuery(Query):
     _assignments: Tuple[_AssignmentBase]
@@ -615,6 +933,10 @@ class _CustomQuery(Query):
         return KQL(self._custom_query)
 
 
+# Plugins which process each row independently
+_ROW_LOCAL_PLUGINS = frozenset(('bag_unpack', 'python'))
+
+
 class _EvaluateQuery(Query):
     _plugin_name: str
     _args: Tuple[_ExpressionType]
@@ -629,3 +951,7 @@ class _EvaluateQuery(Query):
     def _compile(self) -> KQL:
         return KQL(f'evaluate {"" if self._distribution is None else f"hint.distribution={self._distribution.value} "}'
                    f'{self._plugin_name}({", ".join(_to_kql(arg) for arg in self._args)})')
+
+    def _is_row_local(self) -> bool:
+        # Other plugins, e.g. 'autocluster', analyze the rows as a whole
+        return self._plugin_name in _ROW_LOCAL_PLUGINS
@@ -0,0 +1,234 @@
+import json
+from functools import lru_cache
+from operator import itemgetter, attrgetter
+from typing import List, Any, Dict, Iterable, Sequence, Optional, TYPE_CHECKING, Union
+
+import numpy as np
+import pandas as pd
+# noinspection PyProtectedMember
+from azure.kusto.data._models import KustoResultTable as _KustoResultTable
+
+from .type_utils import _result_converter, _KustoType, _get_result_column_type
+
+if TYPE_CHECKING:  # pragma: no cover
+    # Optional dependency, used only for type hints
+    import pyarrow
+
+# A string column is converted to a categorical when compacting, if the number of distinct values is at most this fraction of the number of rows
+_CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+_INTEGER_DTYPES: Dict[_KustoType, np.dtype] = {
+    _KustoType.INT: np.dtype(np.int32),
+    _KustoType.LONG: np.dtype(np.int64),
+    _KustoType.INT16: np.dtype(np.int16),
+    _KustoType.UINT8: np.dtype(np.uint8),
+    _KustoType.UINT16: np.dtype(np.uint16),
+    _KustoType.UINT32: np.dtype(np.uint32),
+    _KustoType.UINT64: np.dtype(np.uint64),
+}
+_REAL_DTYPES: Dict[_KustoType, np.dtype] = {
+    _KustoType.REAL: np.dtype(np.float64),
+    _KustoType.FLOAT: np.dtype(np.float32),
+}
+
+
+@_result_converter(*_INTEGER_DTYPES.keys())
+def _integer_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    try:
+        return np.fromiter(values, dtype=_INTEGER_DTYPES[kusto_type], count=len(values))
+    except TypeError:
+        # Integer arrays cannot hold nulls. Fall back to floats, same as pandas does
+        return np.array(values, dtype=np.float64)
+
+
+@_result_converter(*_REAL_DTYPES.keys())
+def _real_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    # Nulls become NaN
+    return np.array(values, dtype=_REAL_DTYPES[kusto_type])
+
+
+@_result_converter(_KustoType.BOOL)
+def _bool_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    array = _object_column(values, kusto_type)
+    if (array == None).any():  # noqa: E711 (element-wise comparison)
+        # Boolean arrays cannot hold nulls
+        return array
+    return array.astype(bool)
+
+
+def _nanoseconds(values: Sequence) -> np.ndarray:
+    # The Kusto client converts datetime and timespan values to pandas Timestamp and Timedelta objects, which hold their value as nanoseconds. Reading it directly is
+    # about ten times faster than letting pandas convert the objects.
+    return np.fromiter(map(attrgetter('value'), values), dtype=np.int64, count=len(values))
+
+
+@_result_converter(_KustoType.DATETIME)
+def _datetime_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    # Kusto datetimes are always UTC. The result is a timezone-naive datetime64 array, nulls become NaT.
+    try:
+        return _nanoseconds(values).view('datetime64[ns]')
+    except AttributeError:
+        # The column contains nulls
+        return pd.to_datetime(values, utc=True).values
+
+
+@_result_converter(_KustoType.TIMESPAN)
+def _timespan_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    try:
+        return _nanoseconds(values).view('timedelta64[ns]')
+    except AttributeError:
+        # The column contains nulls, which become NaT
+        return pd.to_timedelta(values).values
+
+
+@_result_converter(_KustoType.STRING, _KustoType.ARRAY, _KustoType.MAPPING, _KustoType.DECIMAL)
+def _object_column(values: Sequence, kusto_type: _KustoType) -> np.ndarray:
+    # Allocating first and then filling, since otherwise numpy would turn lists of equally sized lists into a multi-dimensional array
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _convert_column(values: Sequence, kusto_type: Optional[_KustoType]) -> np.ndarray:
+    return _result_converter.registry.get(kusto_type, _object_column)(values, kusto_type)
+
+
+def _has_null_fallback_dtype(array: np.ndarray, kusto_type: Optional[_KustoType]) -> bool:
+    """
+    :return: Whether the array is not of the usual dtype for the column type, because some of the values it was converted from are null
+    """
+    if kusto_type in _INTEGER_DTYPES:
+        return array.dtype != _INTEGER_DTYPES[kusto_type]
+    return kusto_type is _KustoType.BOOL and array.dtype.kind == 'O'
+
+
+def _column_values(raw_rows: Iterable[List[Any]], index: int) -> List[Any]:
+    return list(map(itemgetter(index), raw_rows))
+
+
+def _dynamic_to_json(values: Sequence) -> List[Optional[bytes]]:
+    # The values were already parsed by the Kusto client, so they are serialized again
+    return [None if value is None else json.dumps(value).encode() for value in values]
+
+
+def _compact_column(array: np.ndarray, kusto_type: Optional[_KustoType]) -> Union[np.ndarray, pd.Categorical]:
+    """
+    Reduce the memory footprint of a column without losing information: low-cardinality strings become categoricals, and numbers are downcast to the smallest dtype
+    which can hold all their values.
+    """
+    if kusto_type is _KustoType.STRING:
+        categorical = pd.Categorical(array)
+        return categorical if len(categorical.categories) <= len(array) * _CATEGORICAL_MAX_UNIQUE_RATIO else array
+    if array.dtype.kind in 'iu':
+        return pd.to_numeric(array, downcast='unsigned' if array.dtype.kind == 'u' else 'integer')
+    if array.dtype.kind == 'f' and array.dtype.itemsize > 4:
+        downcast = array.astype(np.float32)
+        # Comparing NaNs explicitly, since 'equal_nan' of 'np.array_equal' requires numpy 1.19
+        return downcast if ((downcast == array) | (np.isnan(downcast) & np.isnan(array))).all() else array
+    return array
+
+
+def _columnar_dataframe(table: _KustoResultTable, compact: bool = False, dynamic_as_json: bool = False) -> pd.DataFrame:
+    """
+    Convert a result table to a dataframe one column at a time, allocating a typed numpy array for each column according to the column type in the result, instead
+    of building the dataframe from rows and letting pandas infer the types.
+
+    :param compact: See :func:`_compact_column`
+    :param dynamic_as_json: Re-encode dynamic values as JSON bytes, which are much smaller than the equivalent Python objects. The Kusto client parses the entire
+        response, so the original JSON text of the values is not available.
+    """
+    # noinspection PyProtectedMember
+    raw_rows = tuple(table._rows)
+    arrays = {}
+    for index, column in enumerate(table.columns):
+        kusto_type = _get_result_column_type(column.column_type)
+        values = _column_values(raw_rows, index)
+        if dynamic_as_json and kusto_type in (_KustoType.ARRAY, _KustoType.MAPPING):
+            values = _dynamic_to_json(values)
+        array = _convert_column(values, kusto_type)
+        if compact:
+            array = _compact_column(array, kusto_type)
+        # Same as in the row-based conversion, datetime columns are timezone-aware
+        arrays[column.column_name] = pd.DatetimeIndex(array).tz_localize('UTC') if array.dtype.kind == 'M' else array
+    return pd.DataFrame(arrays, columns=[column.column_name for column in table.columns])
+
+
+def _blank_strings_mask(values: np.ndarray) -> np.ndarray:
+    try:
+        codes, distinct_values = pd.factorize(values)
+    except TypeError:
+        # Unhashable values, such as dynamic arrays and property bags
+        codes, distinct_values = np.arange(len(values)), values
+    # Each distinct value is checked only once. Nulls are assigned the code -1, which is mapped to the extra entry at the end.
+    blank = np.fromiter((isinstance(value, str) and len(value.strip()) == 0 for value in distinct_values), dtype=bool, count=len(distinct_values))
+    return np.append(blank, False)[codes]
+
+
+def _valid_rows_mask(table: _KustoResultTable) -> np.ndarray:
+    """
+    Vectorized equivalent of applying :func:`KustoResponse.is_row_valid` to every row of the table: a row is valid if none of its fields is null or a blank string.
+    """
+    # noinspection PyProtectedMember
+    raw_rows = tuple(table._rows)
+    valid = np.ones(len(raw_rows), dtype=bool)
+    for index, column in enumerate(table.columns):
+        values = _object_column(_column_values(raw_rows, index), None)
+        valid &= np.not_equal(values, None)
+        # Only columns which are not converted to a typed array can contain strings
+        if _result_converter.registry.get(_get_result_column_type(column.column_type), _object_column) is _object_column:
+            valid &= ~_blank_strings_mask(values)
+    return valid
+
+
+@lru_cache(maxsize=1)
+def _arrow_types() -> Dict[Optional[_KustoType], Any]:
+    # pyarrow is an optional dependency, and is therefore imported only when needed
+    import pyarrow as pa
+    return {
+        _KustoType.BOOL: pa.bool_(),
+        _KustoType.DATETIME: pa.timestamp('ns', tz='UTC'),
+        _KustoType.TIMESPAN: pa.duration('ns'),
+        _KustoType.INT: pa.int32(),
+        _KustoType.LONG: pa.int64(),
+        _KustoType.INT16: pa.int16(),
+        _KustoType.UINT8: pa.uint8(),
+        _KustoType.UINT16: pa.uint16(),
+        _KustoType.UINT32: pa.uint32(),
+        _KustoType.UINT64: pa.uint64(),
+        _KustoType.REAL: pa.float64(),
+        _KustoType.FLOAT: pa.float32(),
+        _KustoType.STRING: pa.string(),
+        # Arrow has no equivalent of the dynamic type, so dynamic values are kept as JSON strings
+        _KustoType.ARRAY: pa.string(),
+        _KustoType.MAPPING: pa.string(),
+        # Kept in their raw string form, same as in dataframes, to avoid losing precision
+        _KustoType.DECIMAL: pa.string(),
+        _KustoType.GUID: pa.string(),
+    }
+
+
+def _arrow_table(table: _KustoResultTable) -> 'pyarrow.Table':
+    """
+    Convert a result table to an Arrow table one column at a time, using the same typed numpy arrays as :func:`_columnar_dataframe` without going through a dataframe.
+    Numeric columns without nulls are handed over to Arrow without copying.
+    """
+    import pyarrow as pa
+    # noinspection PyProtectedMember
+    raw_rows = tuple(table._rows)
+    arrays = []
+    for index, column in enumerate(table.columns):
+        kusto_type = _get_result_column_type(column.column_type)
+        values = _column_values(raw_rows, index)
+        if kusto_type in (_KustoType.ARRAY, _KustoType.MAPPING):
+            values = [None if value is None else json.dumps(value) for value in values]
+        array = _convert_column(values, kusto_type)
+        if kusto_type in _INTEGER_DTYPES and array.dtype.kind == 'f':
+            # Integers with nulls, which numpy holds as floats. Building from the original values instead, so that integers above 2**53 do not lose precision.
+            arrays.append(pa.array(values, type=_arrow_types()[kusto_type]))
+            continue
+        # 'from_pandas' turns NaN and NaT (used for nulls in float and datetime arrays) into Arrow nulls
+        arrays.append(pa.array(array, type=_arrow_types().get(kusto_type), from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[column.column_name for column in table.columns])
+
+
+_result_converter.assert_all_types_covered()
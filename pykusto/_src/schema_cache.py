@@ -0,0 +1,97 @@
+import json
+import os
+from datetime import timedelta
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from time import time
+from typing import Dict, List, Tuple, Optional, Union
+
+from .logger import _logger
+from .type_utils import _KustoType, _PRIMARY_NAME_TO_TYPE
+
+# Database name -> table name -> names and types of the columns
+_ClusterSchema = Dict[str, Dict[str, List[Tuple[str, _KustoType]]]]
+
+# Increment when the file format changes, to invalidate files written in the previous format
+_SCHEMA_CACHE_VERSION = 1
+
+
+class SchemaCache:
+    """
+    Persists cluster schemas in a local directory, so that new :class:`PyKustoClient` instances can use the schema immediately, instead of waiting for it to be
+    fetched. Each cluster is stored in a separate JSON file.
+    A cached schema is ignored if it is older than the maximal age, or if it was written in a different format version.
+    """
+    directory: Path
+    max_age: Optional[timedelta]
+
+    def __init__(self, directory: Union[str, Path] = None, max_age: Optional[timedelta] = timedelta(days=1)) -> None:
+        """
+        :param directory: Where to store the cache files. Defaults to '.pykusto/schema_cache' in the home directory.
+        :param max_age: Cached schemas older than this are ignored. If None, cached schemas never expire.
+        """
+        self.directory = Path.home() / '.pykusto' / 'schema_cache' if directory is None else Path(directory)
+        self.max_age = max_age
+
+    def __repr__(self) -> str:
+        return f'SchemaCache({self.directory})'
+
+    def _path(self, cluster_name: str) -> Path:
+        return self.directory / f'{sha256(cluster_name.encode()).hexdigest()}.json'
+
+    def load(self, cluster_name: str) -> Optional[_ClusterSchema]:
+        """
+        :return: The cached schema of the cluster, or None if there is no valid cached schema
+        """
+        path = self._path(cluster_name)
+        try:
+            with path.open() as f:
+                cached = json.load(f)
+            if cached['version'] != _SCHEMA_CACHE_VERSION or cached['cluster'] != cluster_name:
+                return None
+            if self.max_age is not None and time() - cached['timestamp'] > self.max_age.total_seconds():
+                return None
+            return {
+                database_name: {
+                    table_name: [(column_name, _PRIMARY_NAME_TO_TYPE[column_type]) for column_name, column_type in columns]
+                    for table_name, columns in tables.items()
+                }
+                for database_name, tables in cached['schema'].items()
+            }
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            _logger.warning(f"Ignoring invalid schema cache file '{path}': {e!r}")
+            return None
+
+    def save(self, cluster_name: str, schema: _ClusterSchema) -> None:
+        """
+        Write the schema to the cache. Failures are logged and otherwise ignored, since the cache is only an optimization.
+        """
+        path = self._path(cluster_name)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file and then rename it, so that concurrent readers never see a partially written file
+            with NamedTemporaryFile('w', dir=str(self.directory), suffix='.tmp', delete=False) as f:
+                json.dump({
+                    'version': _SCHEMA_CACHE_VERSION,
+                    'cluster': cluster_name,
+                    'timestamp': time(),
+                    'schema': {
+                        database_name: {
+                            table_name: [(column_name, column_type.primary_name) for column_name, column_type in columns]
+                            for table_name, columns in tables.items()
+                        }
+                        for database_name, tables in schema.items()
+                    },
+                }, f)
+            os.replace(f.name, str(path))
+        except OSError as e:
+            _logger.warning(f"Failed writing schema cache file '{path}': {e!r}")
+
+    def invalidate(self, cluster_name: str) -> None:
+        try:
+            self._path(cluster_name).unlink()
+        except FileNotFoundError:
+            pass
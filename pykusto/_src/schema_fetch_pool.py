@@ -0,0 +1,137 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Callable, Deque, List, Tuple, Any
+
+
+class SchemaFetchPool:
+    """
+    Fetches schemas in a bounded number of worker threads.
+    Pending fetches are queued separately for each cluster, and idle workers take fetches from the clusters in round-robin order, so that a cluster with many pending
+    fetches, or with slow ones, does not hold back the fetches of other clusters.
+    Worker threads are started on demand, and are daemon threads, so an unresponsive cluster does not prevent the process from exiting.
+    Large schemas are fetched in several pages, which are scheduled in the same pool, under the same cluster, as the fetch they belong to.
+    """
+    max_workers: int
+    __queues: 'OrderedDict[str, Deque[Tuple[Future, Callable[[], Any]]]]'
+    __workers: List[Thread]
+    __idle_workers: int
+    __pending_tasks: int
+    __shutdown: bool
+    __condition: Condition
+
+    def __init__(self, max_workers: int = 4) -> None:
+        """
+        :param max_workers: Maximal number of schemas fetched concurrently
+        """
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        self.max_workers = max_workers
+        self.__queues = OrderedDict()
+        self.__workers = []
+        self.__idle_workers = 0
+        self.__pending_tasks = 0
+        self.__shutdown = False
+        self.__condition = Condition()
+
+    def __repr__(self) -> str:
+        return f'SchemaFetchPool(max_workers={self.max_workers})'
+
+    def __enter__(self) -> 'SchemaFetchPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.shutdown()
+
+    def submit(self, cluster: str, function: Callable[[], Any]) -> Future:
+        """
+        Schedule a fetch.
+
+        :param cluster: The name of the cluster the fetch queries, used for fair scheduling
+        :param function: Performs the fetch
+        :return: A future for the result of the function
+        :raises RuntimeError: If the pool was shut down
+        """
+        future = Future()
+        with self.__condition:
+            if self.__shutdown:
+                raise RuntimeError("Cannot schedule new fetches after shutdown")
+            self.__queues.setdefault(cluster, deque()).append((future, function))
+            self.__pending_tasks += 1
+            # A notified worker remains idle until it wakes up, so it might already be claimed by an earlier task
+            if self.__pending_tasks > self.__idle_workers and len(self.__workers) < self.max_workers:
+                worker = Thread(target=self.__work, name=f'pykusto-schema-fetch-{len(self.__workers)}', daemon=True)
+                self.__workers.append(worker)
+                worker.start()
+            else:
+                self.__condition.notify()
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """
+        Stop accepting new fetches, and stop the worker threads once the pending fetches are done. Similar to :func:`concurrent.futures.Executor.shutdown`.
+
+        :param wait: If true, return only after all workers have stopped
+        :param cancel_futures: If true, cancel fetches which did not start yet
+        """
+        with self.__condition:
+            self.__shutdown = True
+            if cancel_futures:
+                for queue in self.__queues.values():
+                    for future, _ in queue:
+                        future.cancel()
+                self.__queues.clear()
+                self.__pending_tasks = 0
+            self.__condition.notify_all()
+            workers = tuple(self.__workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def __next_task(self) -> Tuple[Future, Callable[[], Any]]:
+        # Take the first task of the cluster that was served least recently, and move the cluster to the back of the line
+        cluster, queue = next(iter(self.__queues.items()))
+        task = queue.popleft()
+        self.__pending_tasks -= 1
+        if len(queue) == 0:
+            del self.__queues[cluster]
+        else:
+            self.__queues.move_to_end(cluster)
+        return task
+
+    def __work(self) -> None:
+        while True:
+            with self.__condition:
+                self.__idle_workers += 1
+                while len(self.__queues) == 0 and not self.__shutdown:
+                    self.__condition.wait()
+                self.__idle_workers -= 1
+                if len(self.__queues) == 0:
+                    return
+                future, function = self.__next_task()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = function()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+_default_pool = SchemaFetchPool()
+
+
+def get_default_schema_fetch_pool() -> SchemaFetchPool:
+    """
+    :return: The pool used by clients which were not given a pool of their own
+    """
+    return _default_pool
+
+
+def set_default_schema_fetch_pool(pool: SchemaFetchPool) -> None:
+    """
+    Replace the pool used by clients which were not given a pool of their own. The previous pool is not shut down.
+    """
+    global _default_pool
+    _default_pool = pool
@@ -0,0 +1,182 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from time import time
+from typing import Dict, List, Tuple, Optional, Union
+
+from .logger import _logger
+from .schema_cache import _ClusterSchema
+from .type_utils import _KustoType, _PRIMARY_NAME_TO_TYPE
+
+_SHARED_SCHEMA_MAGIC = b'PKSS'
+# Increment when the file format changes, to ignore files written in the previous format
+_SHARED_SCHEMA_VERSION = 1
+# Magic, format version, byte order, timestamp, and counts of strings, types, databases, tables and columns, followed by the string ID of the cluster name.
+# The size is a multiple of 4, so the arrays of 32-bit integers which follow are aligned.
+_SHARED_SCHEMA_HEADER = struct.Struct('<4sHHdIIIIII')
+_BYTE_ORDERS = {'little': 1, 'big': 2}
+
+
+class _SharedSchema:
+    """
+    Read-only view of a schema file written by :func:`SharedSchemaStore.publish`. Nothing is decoded up front: the schema of a database is decoded from the mapped file
+    when it is requested, so all processes share the same physical memory for the undecoded schema.
+
+    The file consists of a header, followed by these arrays (32-bit integers in native byte order, unless noted otherwise):
+
+    * String offsets: The start of each string in the string pool, and the end of the pool
+    * Types: The string ID of the primary name of each type
+    * Databases: Triplets of name string ID, first table index and end table index
+    * Tables: Triplets of name string ID, first column index and end column index
+    * Column names: The string ID of the name of each column
+    * Column types (8-bit): The type ID of each column
+    * String pool: UTF-8 encoded strings
+    """
+    cluster_name: str
+    timestamp: float
+    __mapped_file: mmap.mmap
+    __string_offsets: memoryview
+    __strings: memoryview
+    __types: Tuple[_KustoType, ...]
+    __databases: memoryview
+    __tables: memoryview
+    __column_names: memoryview
+    __column_types: memoryview
+    __database_indices: Dict[str, int]
+
+    def __init__(self, mapped_file: mmap.mmap) -> None:
+        """
+        :raises ValueError: If the file is invalid
+        """
+        self.__mapped_file = mapped_file
+        if len(mapped_file) < _SHARED_SCHEMA_HEADER.size:
+            raise ValueError("File too short")
+        magic, version, byte_order, self.timestamp, string_count, type_count, database_count, table_count, column_count, cluster_name_id = \
+            _SHARED_SCHEMA_HEADER.unpack_from(mapped_file)
+        if magic != _SHARED_SCHEMA_MAGIC or version != _SHARED_SCHEMA_VERSION or byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise ValueError("Unsupported format")
+        view = memoryview(mapped_file)
+        position = _SHARED_SCHEMA_HEADER.size
+        arrays = []
+        for length in (string_count + 1, type_count, database_count * 3, table_count * 3, column_count):
+            arrays.append(view[position:position + length * 4].cast('I'))
+            position += length * 4
+        self.__string_offsets, types, self.__databases, self.__tables, self.__column_names = arrays
+        self.__column_types = view[position:position + column_count]
+        position += column_count
+        self.__strings = view[position:]
+        if len(self.__strings) != self.__string_offsets[-1]:
+            raise ValueError("Unexpected file length")
+        self.__types = tuple(_PRIMARY_NAME_TO_TYPE[self.__string(type_name_id)] for type_name_id in types)
+        self.cluster_name = self.__string(cluster_name_id)
+        self.__database_indices = {self.__string(self.__databases[i * 3]): i for i in range(database_count)}
+
+    def __string(self, string_id: int) -> str:
+        return str(self.__strings[self.__string_offsets[string_id]:self.__string_offsets[string_id + 1]], 'utf-8')
+
+    def get_database_names(self) -> List[str]:
+        return list(self.__database_indices.keys())
+
+    def get_tables(self, database_name: str) -> Optional[Dict[str, List[Tuple[str, _KustoType]]]]:
+        """
+        :return: The names and types of the columns of each table in the database, or None if the database is not in the schema
+        """
+        database_index = self.__database_indices.get(database_name)
+        if database_index is None:
+            return None
+        tables = {}
+        for table_index in range(self.__databases[database_index * 3 + 1], self.__databases[database_index * 3 + 2]):
+            table_name_id, first_column, end_column = self.__tables[table_index * 3:table_index * 3 + 3]
+            tables[self.__string(table_name_id)] = [
+                (self.__string(self.__column_names[column_index]), self.__types[self.__column_types[column_index]]) for column_index in range(first_column, end_column)
+            ]
+        return tables
+
+
+class SharedSchemaStore:
+    """
+    Shares cluster schemas between the processes of a host, through memory-mapped files in a local directory.
+    One designated process, whose store is created with "publisher" set to true, fetches the schema from the cluster and publishes it to the store. Clients in all other
+    processes read the schema from the store instead of fetching it, and decode the schema of each database only when it is first accessed.
+    Published files are replaced atomically, so readers always see a complete schema.
+    """
+    directory: Path
+    publisher: bool
+
+    def __init__(self, directory: Union[str, Path] = None, publisher: bool = False) -> None:
+        """
+        :param directory: Where to store the schema files. Defaults to '.pykusto/shared_schema' in the home directory.
+        :param publisher: If true, clients using this store fetch schemas from the cluster and publish them. Otherwise, clients read schemas from the store, and only
+            fetch them from the cluster if nothing was published yet.
+        """
+        self.directory = Path.home() / '.pykusto' / 'shared_schema' if directory is None else Path(directory)
+        self.publisher = publisher
+
+    def __repr__(self) -> str:
+        return f'SharedSchemaStore({self.directory}, publisher={self.publisher})'
+
+    def _path(self, cluster_name: str) -> Path:
+        return self.directory / f'{sha256(cluster_name.encode()).hexdigest()}.schema'
+
+    def open(self, cluster_name: str) -> Optional[_SharedSchema]:
+        """
+        :return: The published schema of the cluster, or None if there is no valid published schema
+        """
+        path = self._path(cluster_name)
+        try:
+            with path.open('rb') as f:
+                # The mapping remains valid after the file is closed, and after it is replaced by a newer version
+                shared_schema = _SharedSchema(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, IndexError, TypeError, struct.error) as e:
+            _logger.warning(f"Ignoring invalid shared schema file '{path}': {e!r}")
+            return None
+        return shared_schema if shared_schema.cluster_name == cluster_name else None
+
+    def publish(self, cluster_name: str, schema: _ClusterSchema) -> None:
+        """
+        Write the schema to the store. Failures are logged and otherwise ignored.
+        """
+        strings: Dict[str, int] = {}
+
+        def string_id(string: str) -> int:
+            return strings.setdefault(string, len(strings))
+
+        type_ids: Dict[_KustoType, int] = {}
+        databases, tables, column_names = array('I'), array('I'), array('I')
+        column_types = array('B')
+        cluster_name_id = string_id(cluster_name)
+        for database_name, table_to_columns in schema.items():
+            databases.extend((string_id(database_name), len(tables) // 3, len(tables) // 3 + len(table_to_columns)))
+            for table_name, columns in table_to_columns.items():
+                tables.extend((string_id(table_name), len(column_names), len(column_names) + len(columns)))
+                for column_name, column_type in columns:
+                    column_names.append(string_id(column_name))
+                    column_types.append(type_ids.setdefault(column_type, len(type_ids)))
+        types = array('I', (string_id(kusto_type.primary_name) for kusto_type in type_ids))
+        encoded_strings = [string.encode() for string in strings]
+        string_offsets = array('I', [0])
+        for encoded_string in encoded_strings:
+            string_offsets.append(string_offsets[-1] + len(encoded_string))
+        header = _SHARED_SCHEMA_HEADER.pack(
+            _SHARED_SCHEMA_MAGIC, _SHARED_SCHEMA_VERSION, _BYTE_ORDERS[sys.byteorder], time(), len(strings), len(types), len(databases) // 3, len(tables) // 3,
+            len(column_names), cluster_name_id
+        )
+        path = self._path(cluster_name)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file and then rename it, so that readers never see a partially written file
+            with NamedTemporaryFile('wb', dir=str(self.directory), suffix='.tmp', delete=False) as f:
+                f.write(header)
+                for part in (string_offsets, types, databases, tables, column_names, column_types):
+                    part.tofile(f)
+                f.writelines(encoded_strings)
+            os.replace(f.name, str(path))
+        except OSError as e:
+            _logger.warning(f"Failed writing shared schema file '{path}': {e!r}")
@@ -0,0 +1,171 @@
+from threading import local, Lock
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from weakref import WeakKeyDictionary
+
+from .hooks import HookEvent, add_hook, remove_hook
+from .kql_converters import _kql_fingerprint
+
+_SPAN_NAMES = {
+    HookEvent.BEFORE_QUERY_EXECUTE: 'pykusto.query',
+    HookEvent.BEFORE_RENDER: 'pykusto.render',
+    HookEvent.BEFORE_EXECUTE: 'pykusto.network',
+    HookEvent.BEFORE_CONVERT: 'pykusto.convert',
+    HookEvent.BEFORE_REFRESH: 'pykusto.refresh',
+}
+
+
+class _Tracing:
+    """
+    Translates pykusto hook events to OpenTelemetry spans. Every "before" event starts a span which becomes the current span, and the matching "after" event ends it.
+    Events always come in nested pairs in the same thread, so each thread keeps a stack of its open spans.
+    """
+    __tracer: Any
+    __local: local
+    __query_spans: WeakKeyDictionary
+    __hooks: List[Tuple[HookEvent, Callable[[Dict[str, Any]], None]]]
+
+    def __init__(self, tracer: Any) -> None:
+        self.__tracer = tracer
+        self.__local = local()
+        # The span of the query which produced each response, so that conversions of the response are traced as children of the query span
+        self.__query_spans = WeakKeyDictionary()
+        self.__hooks = [
+            (HookEvent.BEFORE_QUERY_EXECUTE, self.__before_query_execute),
+            (HookEvent.AFTER_QUERY_EXECUTE, self.__after_query_execute),
+            (HookEvent.BEFORE_RENDER, self.__before_render),
+            (HookEvent.AFTER_RENDER, self.__after_render),
+            (HookEvent.BEFORE_EXECUTE, self.__before_execute),
+            (HookEvent.AFTER_EXECUTE, self.__after_execute),
+            (HookEvent.BEFORE_CONVERT, self.__before_convert),
+            (HookEvent.AFTER_CONVERT, self.__after_convert),
+            (HookEvent.BEFORE_REFRESH, self.__before_refresh),
+            (HookEvent.AFTER_REFRESH, self.__after_refresh),
+        ]
+
+    def subscribe(self) -> None:
+        for event, hook in self.__hooks:
+            add_hook(event, hook)
+
+    def unsubscribe(self) -> None:
+        for event, hook in self.__hooks:
+            remove_hook(event, hook)
+
+    def __stack(self) -> List[Tuple[Any, Any, HookEvent, Dict[str, Any]]]:
+        stack = getattr(self.__local, 'stack', None)
+        if stack is None:
+            stack = self.__local.stack = []
+        return stack
+
+    def __start_span(self, event: HookEvent, payload: Dict[str, Any], attributes: Dict[str, Any], parent: Any = None) -> None:
+        from opentelemetry import trace, context
+        span = self.__tracer.start_span(_SPAN_NAMES[event], context=None if parent is None else trace.set_span_in_context(parent), attributes=attributes)
+        token = context.attach(trace.set_span_in_context(span))
+        self.__stack().append((span, token, event, payload))
+
+    def __end_span(self, payload: Dict[str, Any], attributes: Dict[str, Any] = None) -> Any:
+        from opentelemetry import context
+        from opentelemetry.trace import Status, StatusCode
+        span, token, _, _ = self.__stack().pop()
+        context.detach(token)
+        error = payload['error']
+        if error is None:
+            span.set_attributes(attributes or {})
+        else:
+            span.record_exception(error)
+            span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.end()
+        return span
+
+    def __enclosing_query(self) -> Optional[Tuple[Any, Dict[str, Any]]]:
+        stack = self.__stack()
+        if len(stack) == 0 or stack[-1][2] is not HookEvent.BEFORE_QUERY_EXECUTE:
+            return None
+        span, _, _, payload = stack[-1]
+        return span, payload
+
+    def __before_query_execute(self, payload: Dict[str, Any]) -> None:
+        self.__start_span(HookEvent.BEFORE_QUERY_EXECUTE, payload, {'db.system': 'kusto'})
+
+    def __after_query_execute(self, payload: Dict[str, Any]) -> None:
+        if payload['error'] is not None:
+            self.__end_span(payload)
+            return
+        response = payload['response']
+        attributes = {'pykusto.row_count': payload['row_count']}
+        stats = response.get_stats()
+        if stats is not None:
+            attributes.update({
+                f'pykusto.stats.{name}': value for name, value in (
+                    ('execution_time', None if stats.execution_time is None else stats.execution_time.total_seconds()),
+                    ('cpu_time', None if stats.cpu_time is None else stats.cpu_time.total_seconds()),
+                    ('memory_peak_per_node', stats.memory_peak_per_node),
+                    ('extents_total', stats.extents_total),
+                    ('extents_scanned', stats.extents_scanned),
+                    ('rows_total', stats.rows_total),
+                    ('rows_scanned', stats.rows_scanned),
+                ) if value is not None
+            })
+        self.__query_spans[response] = self.__end_span(payload, attributes)
+
+    def __before_render(self, payload: Dict[str, Any]) -> None:
+        self.__start_span(HookEvent.BEFORE_RENDER, payload, {})
+
+    def __after_render(self, payload: Dict[str, Any]) -> None:
+        self.__end_span(payload, {'pykusto.kql_length': payload.get('kql_length', 0)})
+        enclosing = self.__enclosing_query()
+        # Subqueries (e.g. of joins) are rendered as well, but only the rendering of the executed query itself identifies it
+        if payload['error'] is None and payload['kql'] is not None and enclosing is not None and enclosing[1]['query'] is payload['query']:
+            enclosing[0].set_attribute('pykusto.query.fingerprint', _kql_fingerprint(payload['kql']))
+
+    def __before_execute(self, payload: Dict[str, Any]) -> None:
+        attributes = {
+            'db.system': 'kusto', 'db.name': payload['database'], 'pykusto.cluster': payload['client'].get_cluster_name(), 'pykusto.query_bytes': payload['query_bytes'],
+        }
+        enclosing = self.__enclosing_query()
+        if enclosing is not None:
+            enclosing[0].set_attributes({'db.name': attributes['db.name'], 'pykusto.cluster': attributes['pykusto.cluster']})
+        self.__start_span(HookEvent.BEFORE_EXECUTE, payload, attributes)
+
+    def __after_execute(self, payload: Dict[str, Any]) -> None:
+        self.__end_span(payload, {'pykusto.row_count': payload.get('row_count', 0)})
+
+    def __before_convert(self, payload: Dict[str, Any]) -> None:
+        self.__start_span(HookEvent.BEFORE_CONVERT, payload, {'pykusto.format': payload['format']}, self.__query_spans.get(payload['response']))
+
+    def __after_convert(self, payload: Dict[str, Any]) -> None:
+        self.__end_span(payload, {'pykusto.row_count': payload.get('row_count', 0)})
+
+    def __before_refresh(self, payload: Dict[str, Any]) -> None:
+        self.__start_span(HookEvent.BEFORE_REFRESH, payload, {'pykusto.fetcher': repr(payload['fetcher'])})
+
+    def __after_refresh(self, payload: Dict[str, Any]) -> None:
+        self.__end_span(payload, {'pykusto.item_count': payload.get('item_count', 0)})
+
+
+_active_tracing: Optional[_Tracing] = None
+_active_tracing_lock = Lock()
+
+
+def enable_tracing(tracer_provider: Any = None) -> None:
+    """
+    Trace queries using OpenTelemetry. Requires the 'opentelemetry-api' package (included in the 'tracing' extra: `pip install pykusto[tracing]`).
+    Each execution of a query produces a 'pykusto.query' span, with child spans for rendering ('pykusto.render'), the request to the cluster ('pykusto.network') and
+    conversion of the response ('pykusto.convert'). Background schema fetches produce 'pykusto.refresh' spans.
+
+    :param tracer_provider: The OpenTelemetry tracer provider to use. If not provided, the global tracer provider is used.
+    """
+    from opentelemetry import trace
+    global _active_tracing
+    with _active_tracing_lock:
+        if _active_tracing is not None:
+            _active_tracing.unsubscribe()
+        _active_tracing = _Tracing(trace.get_tracer('pykusto', tracer_provider=tracer_provider))
+        _active_tracing.subscribe()
+
+
+def disable_tracing() -> None:
+    global _active_tracing
+    with _active_tracing_lock:
+        if _active_tracing is not None:
+            _active_tracing.unsubscribe()
+            _active_tracing = None
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Union, Mapping, Type, Dict, Callable, Tuple, List, Set, FrozenSet
+from typing import Union, Mapping, Type, Dict, Callable, Tuple, List, Set, FrozenSet, Optional
 
 PythonTypes = Union[str, int, float, bool, datetime, Mapping, List, Tuple, timedelta]
 
@@ -56,6 +56,7 @@ class _KustoType(Enum):
 
 _INTERNAL_NAME_TO_TYPE: Dict[str, _KustoType] = {t.internal_name: t for t in _KustoType}
 _DOT_NAME_TO_TYPE: Dict[str, _KustoType] = {t.dot_net_name: t for t in _KustoType}
+_PRIMARY_NAME_TO_TYPE: Dict[str, _KustoType] = {t.primary_name: t for t in _KustoType}
 _NUMBER_TYPES: FrozenSet[_KustoType] = frozenset([
     _KustoType.INT, _KustoType.LONG, _KustoType.REAL, _KustoType.DECIMAL, _KustoType.FLOAT,
     _KustoType.INT16, _KustoType.UINT16, _KustoType.UINT32, _KustoType.UINT64, _KustoType.UINT8
@@ -148,6 +149,18 @@ _kql_converter = _TypeRegistrar("KQL Converter")
 _typed_column = _TypeRegistrar("Column")
 _plain_expression = _TypeRegistrar("Plain expression")
 _aggregation_expression = _TypeRegistrar("Aggregation expression")
+_result_converter = _TypeRegistrar("Result converter")
+
+
+def _get_result_column_type(column_type: str) -> Optional[_KustoType]:
+    """
+    Resolve the type of a result column. Depending on the response version, the type is given either by its Kusto name (e.g. 'long') or by its .NET name, possibly
+    without the 'System' prefix (e.g. 'System.Int64' or 'Int64').
+    """
+    for kusto_type in (_PRIMARY_NAME_TO_TYPE.get(column_type), _DOT_NAME_TO_TYPE.get(column_type), _DOT_NAME_TO_TYPE.get('System.' + column_type)):
+        if kusto_type is not None:
+            return kusto_type
+    return None
 
 
 def _get_base_types(obj: Union[Type, Callable]) -> Set[_KustoType]:
@@ -26,11 +26,17 @@ setup(
         'azure-kusto-data>=0.0.43,<=0.1.0',  # In 0.0.43 some packages were renamed
         'pandas>=0.24.1,<=1.1.0rc0',  # azure-kusto-data requires 0.24.1
     ],
+    extras_require={
+        'arrow': ['pyarrow'],  # Required for 'to_arrow'
+        'tracing': ['opentelemetry-api'],  # Required for 'enable_tracing'
+    },
     tests_require=[
         'pytest',
         'pytest-cov',
         'flake8',
         'pandas>=0.25.0',  # Tests use DataFrame constructor options introduced in 0.25.0
+        'pyarrow',
+        'opentelemetry-sdk',
     ],
     classifiers=[
         "Development Status :: 3 - Alpha",
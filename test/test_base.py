@@ -1,7 +1,8 @@
 import json
 import logging
+import re
 import sys
-from typing import Callable, Tuple, Any, List, Optional
+from typing import Callable, Tuple, Any, List, Optional, Dict
 from unittest import TestCase
 # noinspection PyProtectedMember
 from unittest.case import _AssertLogsContext
@@ -9,7 +10,7 @@ from urllib.parse import urljoin
 
 from azure.kusto.data import KustoClient, ClientRequestProperties
 # noinspection PyProtectedMember
-from azure.kusto.data._models import KustoResultTable, KustoResultRow
+from azure.kusto.data._models import KustoResultTable, KustoResultRow, WellKnownDataSet
 from azure.kusto.data.response import KustoResponseDataSet
 
 # noinspection PyProtectedMember
@@ -82,17 +83,26 @@ class CustomAssertLogsContext(_AssertLogsContext):
 
 # noinspection PyMissingConstructor
 class MockKustoResultTable(KustoResultTable):
-    def __init__(self, rows: Tuple[Any, ...], columns: Tuple[str, ...]):
-        self.rows = tuple(KustoResultRow(columns, row) for row in rows)
-        self.columns = tuple(type('Column', (object,), {'column_name': col, 'column_type': ''}) for col in columns)
+    def __init__(self, rows: Tuple[Any, ...], columns: Tuple[str, ...], column_types: Tuple[str, ...] = None):
+        self.columns = tuple(
+            type('Column', (object,), {'column_name': col, 'column_type': '' if column_types is None else column_types[i]}) for i, col in enumerate(columns)
+        )
+        self.rows = tuple(KustoResultRow(columns if column_types is None else self.columns, row) for row in rows)
+        self.table_name = 'PrimaryResult'
+        self.table_kind = WellKnownDataSet.PrimaryResult
 
 
 # noinspection PyTypeChecker
-def mock_response(rows: Tuple[Any, ...], columns: Tuple[str, ...] = tuple()) -> KustoResponseDataSet:
+def mock_response(rows: Tuple[Any, ...], columns: Tuple[str, ...] = tuple(), column_types: Tuple[str, ...] = None) -> KustoResponseDataSet:
+    """
+    :param column_types: Kusto type names of the columns (e.g. 'datetime'). If provided, the values are converted the same way the Kusto client converts them, so raw values
+        should be given as they appear in a Kusto response (e.g. datetimes as strings).
+    """
+    table = MockKustoResultTable(rows, columns, column_types)
     return type(
         'MockKustoResponseDataSet',
         (KustoResponseDataSet,),
-        {'primary_results': (MockKustoResultTable(rows, columns),)}
+        {'primary_results': (table,), 'tables': (table,)}
     )
 
 
@@ -119,6 +129,10 @@ def mock_databases_response(databases: List[Tuple[str, List[Tuple[str, List[Tupl
     )
 
 
+def mock_database_versions_response(versions: List[Tuple[str, str]] = tuple()) -> KustoResponseDataSet:
+    return mock_response(tuple(versions), ('DatabaseName', 'Version'))
+
+
 def mock_getschema_response(columns: List[Tuple[str, _KustoType]] = tuple()) -> KustoResponseDataSet:
     return mock_response(tuple((c_name, c_type.dot_net_name) for c_name, c_type in columns), ('ColumnName', 'DataType'))
 
@@ -149,7 +163,9 @@ class MockKustoClient(KustoClient):
     tables_response: KustoResponseDataSet
     databases_response: KustoResponseDataSet
     getschema_response: KustoResponseDataSet
+    database_versions_response: KustoResponseDataSet
     main_response: KustoResponseDataSet
+    query_responses: Dict[str, KustoResponseDataSet]
     upon_execute: Callable[[RecordedQuery], None]
     record_metadata: bool
 
@@ -160,7 +176,9 @@ class MockKustoClient(KustoClient):
             tables_response: KustoResponseDataSet = mock_tables_response([]),
             databases_response: KustoResponseDataSet = mock_databases_response([]),
             getschema_response: KustoResponseDataSet = mock_getschema_response([]),
+            database_versions_response: KustoResponseDataSet = mock_database_versions_response([]),
             main_response: KustoResponseDataSet = mock_response(tuple()),
+            query_responses: Dict[str, KustoResponseDataSet] = None,
             upon_execute: Callable[[RecordedQuery], None] = None,
             record_metadata: bool = False
     ):
@@ -170,7 +188,9 @@ class MockKustoClient(KustoClient):
         self.tables_response = tables_response
         self.databases_response = databases_response
         self.getschema_response = getschema_response
+        self.database_versions_response = database_versions_response
         self.main_response = main_response
+        self.query_responses = {} if query_responses is None else query_responses
         self.upon_execute = upon_execute
         self.record_metadata = record_metadata
 
@@ -179,20 +199,40 @@ class MockKustoClient(KustoClient):
         if self.upon_execute is not None:
             self.upon_execute(recorded_query)
         metadata_query = True
-        if rendered_query == '.show database schema | project TableName, ColumnName, ColumnType | limit 10000':
+        if rendered_query.startswith('.show database schema | '):
             response = self.tables_response
         elif rendered_query.startswith('.show table '):
             response = self.columns_response
-        elif rendered_query.startswith('.show databases schema '):
+        elif rendered_query.startswith('.show databases schema | '):
             response = self.databases_response
-        elif rendered_query.endswith(' | getschema | project ColumnName, DataType | limit 10000'):
+        elif ' | getschema | ' in rendered_query:
             response = self.getschema_response
+        elif rendered_query == '.show databases | project DatabaseName, Version':
+            response = self.database_versions_response
         else:
             metadata_query = False
-            response = self.main_response
+            response = self.query_responses.get(rendered_query, self.main_response)
+        if metadata_query:
+            response = self.__page_response(rendered_query, response)
         if self.record_metadata or not metadata_query:
             self.recorded_queries.append(recorded_query)
         return response
 
+    @staticmethod
+    def __page_response(rendered_query: str, response: KustoResponseDataSet) -> KustoResponseDataSet:
+        # Simulates counting, limiting and paging of schema query results
+        table = response.primary_results[0]
+        if rendered_query.endswith(' | count'):
+            return mock_response(((len(table.rows),),), ('Count',))
+        page = re.search(r'\| where _RowNumber between \((\d+) \.\. (\d+)\)', rendered_query)
+        limit = re.search(r'\| limit (\d+)$', rendered_query)
+        if page is not None:
+            rows = table.rows[int(page.group(1)) - 1:int(page.group(2))]
+        elif limit is not None:
+            rows = table.rows[:int(limit.group(1))]
+        else:
+            return response
+        return mock_response(tuple(tuple(row) for row in rows), tuple(c.column_name for c in table.columns))
+
 
 test_logger = logging.getLogger("pykusto_test")
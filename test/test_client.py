@@ -1,9 +1,14 @@
+import json
 import logging
+from datetime import timedelta
 from unittest.mock import patch
 
 from azure.kusto.data import KustoClient
+# noinspection PyProtectedMember
+from azure.kusto.data._models import WellKnownDataSet
+from azure.kusto.data.response import KustoResponseDataSetV2
 
-from pykusto import PyKustoClient, column_generator as col, Query
+from pykusto import PyKustoClient, column_generator as col, Query, KustoResponse
 # noinspection PyProtectedMember
 from pykusto._src.logger import _logger
 from test.test_base import TestBase, MockKustoClient, RecordedQuery
@@ -168,3 +173,63 @@ class TestClient(TestBase):
             ['INFO:pykusto:Failed to get Azure CLI token, falling back to AAD device authentication'],
             cm.output
         )
+
+
+def completion_information_response(payload: dict) -> KustoResponseDataSetV2:
+    return KustoResponseDataSetV2([
+        {
+            'FrameType': 'DataTable', 'TableId': 1, 'TableKind': 'PrimaryResult', 'TableName': 'PrimaryResult',
+            'Columns': [{'ColumnName': 'foo', 'ColumnType': 'long'}], 'Rows': [[1], [2]],
+        },
+        {
+            'FrameType': 'DataTable', 'TableId': 2, 'TableKind': 'QueryCompletionInformation', 'TableName': 'QueryCompletionInformation',
+            'Columns': [
+                {'ColumnName': 'EventTypeName', 'ColumnType': 'string'}, {'ColumnName': 'Level', 'ColumnType': 'int'}, {'ColumnName': 'Payload', 'ColumnType': 'string'},
+            ],
+            'Rows': [['QueryInfo', 4, '{"Count": 1, "Text": "Query completed successfully"}'], ['QueryResourceConsumption', 4, json.dumps(payload)]],
+        },
+    ])
+
+
+class TestKustoResponse(TestBase):
+    def test_tables(self):
+        response = KustoResponse(completion_information_response({}))
+        self.assertEqual(['PrimaryResult', 'QueryCompletionInformation'], [table.table_name for table in response.get_tables()])
+        self.assertEqual('QueryCompletionInformation', response.get_table(1).table_name)
+        self.assertEqual(2, len(response.get_table('PrimaryResult')))
+        self.assertEqual(['PrimaryResult'], [table.table_name for table in response.get_primary_results()])
+        self.assertEqual(
+            ['QueryCompletionInformation'], [table.table_name for table in response.get_tables_by_kind(WellKnownDataSet.QueryCompletionInformation)]
+        )
+
+    def test_stats(self):
+        stats = KustoResponse(completion_information_response({
+            'ExecutionTime': 0.5,
+            'resource_usage': {'cpu': {'user': '00:00:01', 'kernel': '00:00:00.5', 'total cpu': '00:00:01.5'}, 'memory': {'peak_per_node': 1024}},
+            'input_dataset_statistics': {'extents': {'total': 10, 'scanned': 3}, 'rows': {'total': 1000, 'scanned': 300}},
+        })).get_stats()
+        self.assertEqual(timedelta(seconds=0.5), stats.execution_time)
+        self.assertEqual(timedelta(seconds=1.5), stats.cpu_time)
+        self.assertEqual(1024, stats.memory_peak_per_node)
+        self.assertEqual((10, 3, 1000, 300), (stats.extents_total, stats.extents_scanned, stats.rows_total, stats.rows_scanned))
+        self.assertEqual(
+            'QueryStats(execution_time=0:00:00.500000, cpu_time=0:00:01.500000, memory_peak_per_node=1024, extents_scanned=3/10, rows_scanned=300/1000)',
+            repr(stats),
+        )
+
+    def test_stats_partial(self):
+        stats = KustoResponse(completion_information_response({'resource_usage': {'cpu': 'unexpected'}})).get_stats()
+        self.assertIsNone(stats.execution_time)
+        self.assertIsNone(stats.cpu_time)
+        self.assertIsNone(stats.memory_peak_per_node)
+        self.assertEqual({'resource_usage': {'cpu': 'unexpected'}}, stats.payload)
+
+    def test_no_stats(self):
+        response = PyKustoClient(MockKustoClient()).execute('test_db', 'mock_table')
+        self.assertIsNone(response.get_stats())
+        self.assertIsNone(response.get_stats())
+
+    def test_no_resource_consumption_event(self):
+        response = completion_information_response({})
+        response.tables[1].rows.pop()
+        self.assertIsNone(KustoResponse(response).get_stats())
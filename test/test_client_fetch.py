@@ -1,14 +1,23 @@
+import asyncio
+import logging
 from concurrent.futures import Future
-from threading import Thread, Lock
+from datetime import timedelta
+from threading import Thread, Lock, Event
+from unittest.mock import patch
 
-from pykusto import PyKustoClient, Query
+from pykusto import PyKustoClient, Query, SchemaFetchPool
 # noinspection PyProtectedMember
 from pykusto._src.client import _Database
 # noinspection PyProtectedMember
 from pykusto._src.expressions import _StringColumn, _NumberColumn, _AnyTypeColumn, _BooleanColumn
 # noinspection PyProtectedMember
+from pykusto._src.logger import _logger
+# noinspection PyProtectedMember
+from pykusto._src.name_index import _NameIndex
+# noinspection PyProtectedMember
 from pykusto._src.type_utils import _KustoType
-from test.test_base import TestBase, MockKustoClient, mock_columns_response, RecordedQuery, mock_tables_response, mock_getschema_response, mock_databases_response
+from test.test_base import TestBase, MockKustoClient, mock_columns_response, RecordedQuery, mock_tables_response, mock_getschema_response, mock_databases_response, \
+    mock_database_versions_response, mock_response
 
 
 class TestClientFetch(TestBase):
@@ -64,6 +73,7 @@ class TestClientFetch(TestBase):
         mock_response_future.called = False
         mock_response_future.executed = False
         future_called_lock = Lock()
+        fetch_started = Event()
 
         def upon_execute(query):
             with future_called_lock:
@@ -73,6 +83,7 @@ class TestClientFetch(TestBase):
                     mock_response_future.called = True
                     first_run = True
             if first_run:
+                fetch_started.set()
                 mock_response_future.result()
                 mock_response_future.executed = True
             mock_response_future.returned_queries.append(query)
@@ -81,6 +92,8 @@ class TestClientFetch(TestBase):
             mock_kusto_client = MockKustoClient(upon_execute=upon_execute, record_metadata=True)
             table = PyKustoClient(mock_kusto_client, fetch_by_default=False)['test_db']['mock_table']
             table.refresh()
+            # Otherwise the query might be executed first, and the fetch would block on it instead
+            self.assertTrue(fetch_started.wait(10))
 
             # Executing a query in a separate thread, because it is supposed to block until the fetch returns
             query_thread = Thread(target=Query(table).take(5).execute)
@@ -206,6 +219,45 @@ class TestClientFetch(TestBase):
         self.assertEqual(type(table.bar), _NumberColumn)
         self.assertEqual(type(table['baz']), _AnyTypeColumn)
 
+    def test_union_wildcard_memoized(self):
+        mock_kusto_client = MockKustoClient(
+            tables_response=mock_tables_response([
+                ('test_table_1', [('foo', _KustoType.STRING)]), ('test_table_2', [('bar', _KustoType.INT)]), ('other_table', [('baz', _KustoType.BOOL)])
+            ]),
+        )
+        db = PyKustoClient(mock_kusto_client, fetch_by_default=False)['test_db']
+        db.blocking_refresh()
+        with patch.object(_NameIndex, 'match', autospec=True, side_effect=_NameIndex.match) as match, \
+                patch.object(_Database, '_Database__try_to_resolve_union_columns', side_effect=_Database._Database__try_to_resolve_union_columns) as resolve_union_columns:
+            self.assertCountEqual(('foo', 'bar'), db.get_table('test_table_*').get_columns_names())
+            self.assertCountEqual(('foo', 'bar'), db.get_table('test_table_*').get_columns_names())
+            self.assertEqual(1, match.call_count)
+            self.assertEqual(1, resolve_union_columns.call_count)
+            # The same pattern along with another one
+            self.assertCountEqual(('foo', 'bar', 'baz'), db.get_table('test_table_*', 'other_table').get_columns_names())
+            self.assertEqual(1, match.call_count)
+            self.assertEqual(2, resolve_union_columns.call_count)
+            # Refreshing invalidates the memoized resolutions
+            mock_kusto_client.tables_response = mock_tables_response([
+                ('test_table_1', [('foo', _KustoType.STRING)]), ('test_table_2', [('bar', _KustoType.INT)]), ('test_table_3', [('baz', _KustoType.BOOL)])
+            ])
+            db.blocking_refresh()
+            self.assertCountEqual(('foo', 'bar', 'baz'), db.get_table('test_table_*').get_columns_names())
+            self.assertEqual(2, match.call_count)
+            self.assertEqual(3, resolve_union_columns.call_count)
+
+    def test_union_wildcard_table_refreshed(self):
+        mock_kusto_client = MockKustoClient(
+            tables_response=mock_tables_response([('test_table_1', [('foo', _KustoType.STRING)]), ('test_table_2', [('bar', _KustoType.INT)])]),
+            columns_response=mock_columns_response([('foo', _KustoType.STRING), ('new_column', _KustoType.INT)]),
+        )
+        db = PyKustoClient(mock_kusto_client, fetch_by_default=False)['test_db']
+        db.blocking_refresh()
+        self.assertCountEqual(('foo', 'bar'), db.get_table('test_table_*').get_columns_names())
+        # The table is refreshed on its own, without replacing the tables of the database
+        db.test_table_1.blocking_refresh()
+        self.assertCountEqual(('foo', 'new_column', 'bar'), db.get_table('test_table_*').get_columns_names())
+
     def test_database_fetch(self):
         mock_kusto_client = MockKustoClient(
             databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])])]),
@@ -214,7 +266,7 @@ class TestClientFetch(TestBase):
         client = PyKustoClient(mock_kusto_client)
         client.wait_for_items()
         self.assertEqual(
-            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 100000')],
+            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000')],
             mock_kusto_client.recorded_queries,
         )
         # Table columns
@@ -260,7 +312,7 @@ class TestClientFetch(TestBase):
         client = PyKustoClient(mock_kusto_client)
         client.wait_for_items()
         self.assertEqual(
-            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 100000')],
+            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000')],
             mock_kusto_client.recorded_queries,
         )
         self.assertEqual(type(client.test_db.mock_table.foo), _StringColumn)
@@ -269,3 +321,335 @@ class TestClientFetch(TestBase):
         client = PyKustoClient(MockKustoClient(), fetch_by_default=False)
         self.assertEqual(frozenset(), set(client.get_databases_names()))
         self.assertEqual(frozenset(), set(client.get_databases()))
+
+    def test_database_incremental_refresh(self):
+        mock_kusto_client = MockKustoClient(
+            tables_response=mock_tables_response([
+                ('mock_table', [('foo', _KustoType.STRING)]), ('other_table', [('bar', _KustoType.INT)]), ('removed_table', [('baz', _KustoType.BOOL)])
+            ]),
+        )
+        db = PyKustoClient(mock_kusto_client, fetch_by_default=False)['test_db']
+        db.blocking_refresh()
+        mock_table, other_table = db.mock_table, db.other_table
+        mock_kusto_client.tables_response = mock_tables_response([
+            ('mock_table', [('foo', _KustoType.STRING), ('new_column', _KustoType.INT)]), ('other_table', [('bar', _KustoType.INT)]),
+            ('new_table', [('baz', _KustoType.BOOL)]),
+        ])
+        db.incremental_refresh()
+        db.wait_for_items()
+        # Existing tables are patched in place
+        self.assertIs(mock_table, db.mock_table)
+        self.assertIs(other_table, db.other_table)
+        self.assertEqual(('foo', 'new_column'), tuple(mock_table.get_columns_names()))
+        self.assertEqual(type(mock_table.new_column), _NumberColumn)
+        self.assertEqual(('bar',), tuple(other_table.get_columns_names()))
+        self.assertEqual(('mock_table', 'other_table', 'new_table'), tuple(db.get_table_names()))
+        self.assertEqual(type(db.new_table.baz), _BooleanColumn)
+
+    def test_client_incremental_refresh(self):
+        mock_kusto_client = MockKustoClient(
+            database_versions_response=mock_database_versions_response([('test_db', 'v1'), ('other_db', 'v1')]),
+            tables_response=mock_tables_response([('mock_table', [('foo', _KustoType.STRING)])]),
+            record_metadata=True,
+        )
+        client = PyKustoClient(mock_kusto_client, fetch_by_default=False)
+        # Without previously fetched items, a full refresh is performed
+        client.incremental_refresh()
+        client.wait_for_items()
+        self.assertEqual(
+            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000')],
+            mock_kusto_client.recorded_queries,
+        )
+        # Versions are not known yet, so all databases are fetched
+        client.incremental_refresh()
+        client.wait_for_items()
+        test_db, mock_table = client.test_db, client.test_db.mock_table
+        self.assertEqual(('test_db', 'other_db'), tuple(client.get_databases_names()))
+        self.assertEqual(('foo',), tuple(mock_table.get_columns_names()))
+        # Only changed databases are fetched
+        mock_kusto_client.recorded_queries.clear()
+        mock_kusto_client.database_versions_response = mock_database_versions_response([('test_db', 'v2'), ('new_db', 'v1')])
+        mock_kusto_client.tables_response = mock_tables_response([('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])])
+        client.incremental_refresh()
+        client.wait_for_items()
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases | project DatabaseName, Version'),
+                RecordedQuery('test_db', '.show database schema | project TableName, ColumnName, ColumnType | limit 10000'),
+                RecordedQuery('new_db', '.show database schema | project TableName, ColumnName, ColumnType | limit 10000'),
+            ],
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertIs(test_db, client.test_db)
+        self.assertIs(mock_table, client.test_db.mock_table)
+        self.assertEqual(('foo', 'bar'), tuple(mock_table.get_columns_names()))
+        self.assertEqual(('test_db', 'new_db'), tuple(client.get_databases_names()))
+        # Nothing changed
+        mock_kusto_client.recorded_queries.clear()
+        client.incremental_refresh()
+        client.wait_for_items()
+        self.assertEqual([RecordedQuery('', '.show databases | project DatabaseName, Version')], mock_kusto_client.recorded_queries)
+
+    def test_lazy_databases(self):
+        mock_kusto_client = MockKustoClient(
+            database_versions_response=mock_database_versions_response([('test_db', 'v1'), ('other_db', 'v1')]),
+            tables_response=mock_tables_response([('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])]),
+            record_metadata=True,
+        )
+        client = PyKustoClient(mock_kusto_client, lazy_databases=True)
+        client.wait_for_items()
+        # Only database names are fetched
+        self.assertEqual([RecordedQuery('', '.show databases | project DatabaseName, Version')], mock_kusto_client.recorded_queries)
+        self.assertEqual(('test_db', 'other_db'), tuple(client.get_databases_names()))
+        # The schema of a database is fetched on first access, and only once
+        table = client.test_db.mock_table
+        self.assertEqual(type(table.foo), _StringColumn)
+        self.assertEqual(type(table.bar), _NumberColumn)
+        self.assertEqual(('mock_table',), tuple(client.test_db.get_table_names()))
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases | project DatabaseName, Version'),
+                RecordedQuery('test_db', '.show database schema | project TableName, ColumnName, ColumnType | limit 10000'),
+            ],
+            mock_kusto_client.recorded_queries,
+        )
+
+    def test_lazy_databases_union(self):
+        mock_kusto_client = MockKustoClient(
+            database_versions_response=mock_database_versions_response([('test_db', 'v1')]),
+            tables_response=mock_tables_response([('test_table_1', [('foo', _KustoType.STRING)]), ('test_table_2', [('bar', _KustoType.INT)])]),
+        )
+        client = PyKustoClient(mock_kusto_client, lazy_databases=True)
+        client.wait_for_items()
+        table = client.get_database('test_db').get_table('test_table_*')
+        self.assertEqual(type(table.foo), _StringColumn)
+        self.assertEqual(type(table.bar), _NumberColumn)
+
+    def test_lazy_databases_concurrent_access(self):
+        mock_kusto_client = MockKustoClient(
+            database_versions_response=mock_database_versions_response([('test_db', 'v1')]),
+            tables_response=mock_tables_response([('mock_table', [('foo', _KustoType.STRING)])]),
+            record_metadata=True,
+        )
+        client = PyKustoClient(mock_kusto_client, lazy_databases=True)
+        client.wait_for_items()
+        db = client.test_db
+        access_lock = Lock()
+        access_lock.acquire()
+        fetch_started = Future()
+
+        def upon_execute(query: RecordedQuery) -> None:
+            fetch_started.set_result(None)
+            with access_lock:
+                pass
+
+        mock_kusto_client.upon_execute = upon_execute
+        thread = Thread(target=lambda: tuple(db.get_table_names()))
+        thread.start()
+        fetch_started.result()
+        mock_kusto_client.upon_execute = None
+        access_lock.release()
+        # Waits for the fetch in the other thread instead of starting another one
+        self.assertEqual(('mock_table',), tuple(db.get_table_names()))
+        thread.join()
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases | project DatabaseName, Version'),
+                RecordedQuery('test_db', '.show database schema | project TableName, ColumnName, ColumnType | limit 10000'),
+            ],
+            mock_kusto_client.recorded_queries,
+        )
+
+    def test_lazy_databases_incremental_refresh(self):
+        mock_kusto_client = MockKustoClient(
+            database_versions_response=mock_database_versions_response([('test_db', 'v1'), ('other_db', 'v1')]),
+            tables_response=mock_tables_response([('mock_table', [('foo', _KustoType.STRING)])]),
+            record_metadata=True,
+        )
+        client = PyKustoClient(mock_kusto_client, lazy_databases=True)
+        client.wait_for_items()
+        mock_table = client.test_db.mock_table
+        mock_kusto_client.recorded_queries.clear()
+        mock_kusto_client.database_versions_response = mock_database_versions_response([('test_db', 'v2'), ('other_db', 'v2'), ('new_db', 'v1')])
+        mock_kusto_client.tables_response = mock_tables_response([('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])])
+        client.incremental_refresh()
+        client.wait_for_items()
+        # Only the database which was already accessed is fetched
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases | project DatabaseName, Version'),
+                RecordedQuery('test_db', '.show database schema | project TableName, ColumnName, ColumnType | limit 10000'),
+            ],
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertIs(mock_table, client.test_db.mock_table)
+        self.assertEqual(('foo', 'bar'), tuple(mock_table.get_columns_names()))
+        self.assertEqual(('test_db', 'other_db', 'new_db'), tuple(client.get_databases_names()))
+        self.assertEqual(('mock_table',), tuple(client.new_db.get_table_names()))
+
+    def test_paged_fetch(self):
+        mock_kusto_client = MockKustoClient(
+            databases_response=mock_databases_response([
+                ('test_db', [('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)]), ('other_table', [('baz', _KustoType.BOOL)])]),
+                ('other_db', [('mock_table', [('foo', _KustoType.INT)])]),
+            ]),
+            record_metadata=True,
+        )
+        with patch('pykusto._src.client._SCHEMA_PAGE_SIZE', 1):
+            client = PyKustoClient(mock_kusto_client, fetch_by_default=False)
+            client.blocking_refresh()
+        # The first page is full, so the rows are counted
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 1'),
+                RecordedQuery('', '.show databases schema | count'),
+            ],
+            mock_kusto_client.recorded_queries[:2],
+        )
+        # The remaining pages are fetched in parallel, in any order
+        self.assertCountEqual(
+            [
+                RecordedQuery(
+                    '',
+                    f'.show databases schema | serialize _RowNumber = row_number() | where _RowNumber between ({row} .. {row}) | project DatabaseName, TableName, ColumnName, '
+                    f'ColumnType'
+                )
+                for row in range(2, 5)
+            ],
+            mock_kusto_client.recorded_queries[2:],
+        )
+        # Pages are merged in order
+        self.assertEqual(('foo', 'bar'), tuple(client.test_db.mock_table.get_columns_names()))
+        self.assertEqual(type(client.test_db.other_table.baz), _BooleanColumn)
+        self.assertEqual(type(client.other_db.mock_table.foo), _NumberColumn)
+
+    def test_paged_fetch_invalid_rows(self):
+        # Real responses include database and table rows with no column, so a full first page might have no valid rows at all
+        mock_kusto_client = MockKustoClient(
+            databases_response=mock_response(
+                (
+                    ('test_db', '', '', ''),
+                    ('test_db', 'mock_table', '', ''),
+                    ('test_db', 'mock_table', 'foo', _KustoType.STRING.dot_net_name),
+                    ('test_db', 'mock_table', 'bar', _KustoType.INT.dot_net_name),
+                ),
+                ('DatabaseName', 'TableName', 'ColumnName', 'ColumnType'),
+            ),
+            record_metadata=True,
+        )
+        with patch('pykusto._src.client._SCHEMA_PAGE_SIZE', 2):
+            client = PyKustoClient(mock_kusto_client, fetch_by_default=False)
+            client.blocking_refresh()
+        self.assertEqual(
+            [
+                RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 2'),
+                RecordedQuery('', '.show databases schema | count'),
+                RecordedQuery(
+                    '',
+                    '.show databases schema | serialize _RowNumber = row_number() | where _RowNumber between (3 .. 4) | project DatabaseName, TableName, ColumnName, ColumnType'
+                ),
+            ],
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertEqual(('foo', 'bar'), tuple(client.test_db.mock_table.get_columns_names()))
+
+    def test_refresh_async(self):
+        clients = [
+            PyKustoClient(
+                MockKustoClient(
+                    f'https://cluster_{i}.kusto.windows.net',
+                    databases_response=mock_databases_response([(f'db_{i}', [('mock_table', [('foo', _KustoType.STRING)])])]),
+                ),
+                fetch_by_default=False,
+            )
+            for i in range(3)
+        ]
+
+        async def warm_schemas():
+            await asyncio.gather(*(client.refresh_async() for client in clients))
+
+        asyncio.get_event_loop().run_until_complete(warm_schemas())
+        for i, client in enumerate(clients):
+            self.assertEqual((f'db_{i}',), tuple(client.get_databases_names()))
+            self.assertEqual(type(client[f'db_{i}'].mock_table.foo), _StringColumn)
+
+    def test_wait_for_items_async(self):
+        table = PyKustoClient(MockKustoClient(columns_response=mock_columns_response([('foo', _KustoType.INT)])), fetch_by_default=False)['test_db']['mock_table']
+        loop = asyncio.get_event_loop()
+        # Nothing to wait for
+        loop.run_until_complete(table.wait_for_items_async())
+        table.refresh()
+        loop.run_until_complete(table.wait_for_items_async())
+        self.assertEqual(type(table.foo), _NumberColumn)
+
+    def test_schema_ttl(self):
+        now = [1000.0]
+        fetch_started = Event()
+        release_fetch = Event()
+        release_fetch.set()
+
+        def upon_execute(_):
+            fetch_started.set()
+            release_fetch.wait(10)
+
+        mock_kusto_client = MockKustoClient(
+            databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING)])])]), upon_execute=upon_execute, record_metadata=True,
+        )
+        with patch('pykusto._src.item_fetcher.monotonic', lambda: now[0]):
+            client = PyKustoClient(mock_kusto_client, fetch_by_default=False, schema_ttl=timedelta(minutes=10))
+            client.blocking_refresh()
+            mock_kusto_client.recorded_queries.clear()
+            # Fresh schema
+            now[0] += 599
+            self.assertEqual(type(client.test_db.mock_table.foo), _StringColumn)
+            self.assertEqual([], mock_kusto_client.recorded_queries)
+            # Stale schema: the cached schema is returned immediately, and a single background refresh is triggered
+            now[0] += 1
+            fetch_started.clear()
+            release_fetch.clear()
+            mock_kusto_client.databases_response = mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.INT)])])])
+            for _ in range(5):
+                self.assertEqual(type(client.test_db.mock_table.foo), _StringColumn)
+                self.assertEqual(('test_db',), tuple(client.get_databases_names()))
+            self.assertTrue(fetch_started.wait(10))
+            release_fetch.set()
+            client.wait_for_items()
+            self.assertEqual(
+                [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000')], mock_kusto_client.recorded_queries
+            )
+            self.assertEqual(type(client.test_db.mock_table.foo), _NumberColumn)
+            # Fresh again
+            self.assertEqual(1, len(mock_kusto_client.recorded_queries))
+
+    def test_schema_ttl_failed_refresh(self):
+        now = [1000.0]
+        mock_kusto_client = MockKustoClient(columns_response=mock_columns_response([('foo', _KustoType.STRING)]), record_metadata=True)
+        with patch('pykusto._src.item_fetcher.monotonic', lambda: now[0]):
+            table = PyKustoClient(mock_kusto_client, fetch_by_default=False, schema_ttl=timedelta(minutes=10))['test_db']['mock_table']
+            table.blocking_refresh()
+            now[0] += 600
+            mock_kusto_client.columns_response = None
+            self.assertEqual(type(table.foo), _StringColumn)
+            table.wait_for_items()
+            # The failed refresh does not prevent later ones
+            mock_kusto_client.columns_response = mock_columns_response([('foo', _KustoType.INT)])
+            self.assertEqual(type(table.foo), _StringColumn)
+            table.wait_for_items()
+            self.assertEqual(type(table.foo), _NumberColumn)
+
+    def test_schema_ttl_after_shutdown(self):
+        now = [1000.0]
+        pool = SchemaFetchPool(max_workers=1)
+        mock_kusto_client = MockKustoClient(columns_response=mock_columns_response([('foo', _KustoType.STRING)]), record_metadata=True)
+        with patch('pykusto._src.item_fetcher.monotonic', lambda: now[0]):
+            table = PyKustoClient(mock_kusto_client, fetch_by_default=False, schema_ttl=timedelta(minutes=10), schema_fetch_pool=pool)['test_db']['mock_table']
+            table.blocking_refresh()
+            pool.shutdown()
+            now[0] += 600
+            # The stale schema is still returned, and each access tries to refresh it again
+            for _ in range(2):
+                with self.assertLogs(_logger, logging.WARNING) as cm:
+                    self.assertEqual(type(table.foo), _StringColumn)
+                self.assertEqual(
+                    [f"WARNING:pykusto:Failed scheduling refresh of stale schema for {table!r}: RuntimeError('Cannot schedule new fetches after shutdown')"], cm.output
+                )
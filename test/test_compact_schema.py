@@ -0,0 +1,53 @@
+from pykusto import PyKustoClient
+# noinspection PyProtectedMember
+from pykusto._src.compact_schema import _LazyColumns
+# noinspection PyProtectedMember
+from pykusto._src.expressions import _StringColumn, _NumberColumn, _AnyTypeColumn, _BooleanColumn
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_databases_response
+
+
+class TestCompactSchema(TestBase):
+    def test_columns_created_on_access(self):
+        columns = _LazyColumns([('foo', _KustoType.STRING), ('bar', _KustoType.INT)])
+        self.assertEqual(2, len(columns))
+        self.assertEqual(['foo', 'bar'], list(columns))
+        self.assertIn('foo', columns)
+        self.assertNotIn('baz', columns)
+        foo = columns['foo']
+        self.assertEqual(type(foo), _StringColumn)
+        self.assertEqual('foo', foo.get_name())
+        # Cached once created
+        self.assertIs(foo, columns['foo'])
+        self.assertIsNone(columns.get('baz'))
+        self.assertRaises(KeyError('baz'), columns.__getitem__, 'baz')
+
+    def test_names_interned(self):
+        first = _LazyColumns([(''.join(['f', 'oo']), _KustoType.STRING)])
+        second = _LazyColumns([(''.join(['fo', 'o']), _KustoType.INT)])
+        self.assertIs(next(iter(first)), next(iter(second)))
+
+    def test_added_columns(self):
+        columns = _LazyColumns([('foo', _KustoType.STRING), ('bar', _KustoType.INT)])
+        columns['baz'] = _AnyTypeColumn('baz')
+        columns['bar'] = _BooleanColumn('bar')
+        self.assertEqual(3, len(columns))
+        self.assertEqual(['foo', 'bar', 'baz'], list(columns))
+        self.assertIn('baz', columns)
+        self.assertEqual(type(columns['bar']), _BooleanColumn)
+        self.assertEqual([('foo', _StringColumn), ('bar', _BooleanColumn), ('baz', _AnyTypeColumn)], columns.get_column_types())
+
+    def test_client_schema(self):
+        client = PyKustoClient(
+            MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])])])),
+            fetch_by_default=False,
+        )
+        client.blocking_refresh()
+        table = client.test_db.mock_table
+        self.assertIsInstance(table._get_items_mapping(), _LazyColumns)
+        self.assertEqual(('foo', 'bar'), tuple(table.get_columns_names()))
+        self.assertEqual(type(table.bar), _NumberColumn)
+        # Columns which are not in the schema are added on access
+        self.assertEqual(type(table.baz), _AnyTypeColumn)
+        self.assertEqual(('foo', 'bar', 'baz'), tuple(table.get_columns_names()))
@@ -170,6 +170,26 @@ class TestFunction(TestBase):
             Query().where(f.hash(t.stringField) == 3).render()
         )
 
+    def test_hash_with_mod(self):
+        self.assertEqual(
+            " | where (hash(stringField, 8)) == 3",
+            Query().where(f.hash(t.stringField, 8) == 3).render()
+        )
+
+    def test_row_number(self):
+        self.assertEqual(
+            " | serialize rn = row_number()",
+            Query().serialize(rn=f.row_number()).render()
+        )
+        self.assertEqual(
+            " | serialize rn = row_number(7)",
+            Query().serialize(rn=f.row_number(7)).render()
+        )
+        self.assertEqual(
+            " | serialize rn = row_number(1, stringField != stringField2)",
+            Query().serialize(rn=f.row_number(restart=t.stringField != t.stringField2)).render()
+        )
+
     def test_hash_sha256(self):
         self.assertEqual(
             " | where (hash_sha256(stringField)) == 3",
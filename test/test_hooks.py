@@ -0,0 +1,99 @@
+from typing import List, Tuple, Dict, Any
+
+from pykusto import PyKustoClient, Query, column_generator as col, HookEvent, add_hook, remove_hook
+# noinspection PyProtectedMember
+from pykusto._src.logger import _logger
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_response, mock_databases_response, mock_columns_response, mock_table as t
+
+
+class TestHooks(TestBase):
+    events: List[Tuple[HookEvent, Dict[str, Any]]]
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.events = []
+
+    def subscribe(self, *events: HookEvent) -> None:
+        for event in events:
+            hook = (lambda e: lambda payload: self.events.append((e, payload)))(event)
+            add_hook(event, hook)
+            self.addCleanup(remove_hook, event, hook)
+
+    def test_render(self):
+        self.subscribe(HookEvent.BEFORE_RENDER, HookEvent.AFTER_RENDER)
+        query = Query().where(col.foo > 1)
+        self.assertEqual(' | where foo > 1', query.render())
+        self.assertEqual([HookEvent.BEFORE_RENDER, HookEvent.AFTER_RENDER], [event for event, _ in self.events])
+        self.assertIs(query, self.events[0][1]['query'])
+        after = self.events[1][1]
+        self.assertEqual(' | where foo > 1', after['kql'])
+        self.assertEqual(16, after['kql_length'])
+        self.assertIsNone(after['error'])
+        self.assertGreaterEqual(after['elapsed'], 0)
+
+    def test_render_error(self):
+        self.subscribe(HookEvent.AFTER_RENDER)
+        query = Query().take(1)
+        query._compile_all = lambda use_full_table_name: 1 / 0
+        self.assertRaises(ZeroDivisionError('division by zero'), query.render)
+        self.assertIsInstance(self.events[0][1]['error'], ZeroDivisionError)
+
+    def test_execute(self):
+        self.subscribe(HookEvent.BEFORE_EXECUTE, HookEvent.AFTER_EXECUTE)
+        client = PyKustoClient(MockKustoClient(main_response=mock_response((['foo'], ['bar']), ('stringField',))))
+        response = Query(client['test_db']['mock_table']).take(2).execute()
+        self.assertEqual([HookEvent.BEFORE_EXECUTE, HookEvent.AFTER_EXECUTE], [event for event, _ in self.events])
+        before, after = self.events[0][1], self.events[1][1]
+        self.assertIs(client, before['client'])
+        self.assertEqual('test_db', before['database'])
+        self.assertEqual('mock_table | take 2', before['query'])
+        self.assertEqual(19, before['query_bytes'])
+        self.assertIs(response, after['response'])
+        self.assertEqual(2, after['row_count'])
+        self.assertIsNone(after['error'])
+
+    def test_refresh(self):
+        self.subscribe(HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH)
+        client = PyKustoClient(
+            MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING)])])])), fetch_by_default=False
+        )
+        client.blocking_refresh()
+        self.assertEqual([HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH], [event for event, _ in self.events])
+        self.assertIs(client, self.events[0][1]['fetcher'])
+        self.assertFalse(self.events[0][1]['incremental'])
+        self.assertEqual(1, self.events[1][1]['item_count'])
+
+    def test_incremental_refresh(self):
+        table = PyKustoClient(
+            MockKustoClient(columns_response=mock_columns_response([('foo', _KustoType.STRING), ('bar', _KustoType.INT)])), fetch_by_default=False
+        )['test_db']['mock_table']
+        table.blocking_refresh()
+        self.subscribe(HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH)
+        table.incremental_refresh()
+        table.wait_for_items()
+        self.assertEqual([HookEvent.BEFORE_REFRESH, HookEvent.AFTER_REFRESH], [event for event, _ in self.events])
+        self.assertIs(table, self.events[0][1]['fetcher'])
+        self.assertTrue(self.events[0][1]['incremental'])
+        self.assertEqual(2, self.events[1][1]['item_count'])
+        self.assertEqual(('foo', 'bar'), tuple(table.get_columns_names()))
+
+    def test_failing_hook(self):
+        def failing_hook(_):
+            raise ValueError()
+
+        add_hook(HookEvent.AFTER_RENDER, failing_hook)
+        self.addCleanup(remove_hook, HookEvent.AFTER_RENDER, failing_hook)
+        with self.assertLogs(_logger, 'ERROR') as cm:
+            self.assertEqual('mock_table | take 1', Query(t).take(1).render())
+        self.assertEqual(["ERROR:pykusto:Hook for event 'after_render' failed"], [output.split('\n')[0] for output in cm.output])
+
+    def test_remove_hook(self):
+        self.subscribe(HookEvent.BEFORE_RENDER)
+        hook = self.events.append
+        add_hook(HookEvent.BEFORE_RENDER, hook)
+        remove_hook(HookEvent.BEFORE_RENDER, hook)
+        Query().take(1).render()
+        self.assertEqual(1, len(self.events))
+        self.assertRaises(ValueError('list.remove(x): x not in list'), remove_hook, HookEvent.BEFORE_RENDER, hook)
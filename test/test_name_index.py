@@ -0,0 +1,40 @@
+# noinspection PyProtectedMember
+from pykusto._src.name_index import _NameIndex
+from test.test_base import TestBase
+
+
+class TestNameIndex(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.index = _NameIndex(['StormEvents', 'AppLogs', 'AppMetrics', 'SysLogs', 'App', 'Apps[1]', 'Other'])
+
+    def test_prefix(self):
+        self.assertEqual(['App', 'AppLogs', 'AppMetrics', 'Apps[1]'], self.index.match('App*'))
+
+    def test_suffix(self):
+        self.assertEqual(['AppLogs', 'SysLogs'], self.index.match('*Logs'))
+
+    def test_prefix_and_suffix(self):
+        self.assertEqual(['AppLogs'], self.index.match('A*Logs'))
+
+    def test_no_literal_prefix_or_suffix(self):
+        self.assertEqual(['AppMetrics', 'Other', 'StormEvents'], self.index.match('*e*'))
+
+    def test_character_set(self):
+        self.assertEqual(['AppLogs', 'SysLogs'], self.index.match('[AS]*Logs'))
+        self.assertEqual(['AppLogs'], self.index.match('*[p]Logs'))
+
+    def test_question_mark(self):
+        self.assertEqual(['App'], self.index.match('Ap?'))
+
+    def test_literal(self):
+        self.assertEqual(['Other'], self.index.match('Other'))
+        self.assertEqual([], self.index.match('Another'))
+
+    def test_case_sensitive(self):
+        self.assertEqual([], self.index.match('app*'))
+        self.assertEqual([], self.index.match('*logs'))
+
+    def test_no_match(self):
+        self.assertEqual([], self.index.match('Zzz*'))
+        self.assertEqual([], self.index.match('*Zzz'))
@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta, timezone
 from os import linesep
 
 import pandas as pd
@@ -5,7 +6,7 @@ import pandas as pd
 from pykusto import PyKustoClient, Order, Nulls, JoinKind, Distribution, BagExpansion, column_generator as col, Functions as f, Query, JoinException
 # noinspection PyProtectedMember
 from pykusto._src.type_utils import _KustoType
-from test.test_base import TestBase, mock_databases_response, MockKustoClient, mock_response
+from test.test_base import TestBase, mock_databases_response, MockKustoClient, mock_response, RecordedQuery
 from test.test_base import mock_table as t, mock_columns_response
 from test.udf import func, STRINGIFIED
 
@@ -472,3 +473,306 @@ class TestQuery(TestBase):
         self.assertTrue(
             pd.DataFrame(rows, columns=columns).equals(Query(table).take(10).to_dataframe())
         )
+
+    def test_iter_dataframes(self):
+        columns = ('stringField', 'boolField')
+        table = PyKustoClient(MockKustoClient(
+            main_response=mock_response((['foo', True], ['bar', False], ['baz', True]), columns, ('string', 'bool')),
+        ))['test_db']['mock_table']
+        chunks = list(Query(table).take(10).iter_dataframes(2))
+        self.assertEqual(2, len(chunks))
+        self.assertTrue(pd.DataFrame([['foo', True], ['bar', False]], columns=columns).equals(chunks[0]))
+        self.assertTrue(pd.DataFrame([['baz', True]], columns=columns).equals(chunks[1]))
+        self.assertEqual(bool, chunks[1]['boolField'].dtype)
+
+    def test_iter_dataframes_empty(self):
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(tuple(), ('stringField',))))['test_db']['mock_table']
+        self.assertEqual([], list(Query(table).iter_dataframes(2)))
+
+    def test_serialize(self):
+        self.assertEqual(
+            "mock_table | serialize | take 5",
+            Query(t).serialize().take(5).render(),
+        )
+
+    def test_iter_pages(self):
+        page_query = 'mock_table | sort by numField | serialize _pykusto_row_number = row_number() | where _pykusto_row_number between ({} .. {}) ' \
+                     '| project-away _pykusto_row_number'
+        columns = ('stringField', 'numField')
+        mock_kusto_client = MockKustoClient(query_responses={
+            page_query.format(1, 2): mock_response((['foo', 10], ['bar', 20]), columns),
+            page_query.format(3, 4): mock_response((['baz', 30],), columns),
+        })
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        pages = list(Query(table).sort_by(table.numField).iter_pages(2))
+        self.assertEqual(
+            [RecordedQuery('test_db', page_query.format(1, 2)), RecordedQuery('test_db', page_query.format(3, 4))],
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertEqual(2, len(pages))
+        self.assertTrue(pd.DataFrame([['foo', 10], ['bar', 20]], columns=columns).equals(pages[0]))
+        self.assertTrue(pd.DataFrame([['baz', 30]], columns=columns).equals(pages[1]))
+
+    def test_iter_pages_last_page_empty(self):
+        page_query = 'mock_table | serialize _pykusto_row_number = row_number() | where _pykusto_row_number between ({} .. {}) | project-away _pykusto_row_number'
+        columns = ('stringField', 'numField')
+        mock_kusto_client = MockKustoClient(
+            main_response=mock_response(tuple(), columns),
+            query_responses={page_query.format(1, 2): mock_response((['foo', 10], ['bar', 20]), columns)},
+        )
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        pages = list(Query().iter_pages(2, table))
+        self.assertEqual(
+            [RecordedQuery('test_db', page_query.format(1, 2)), RecordedQuery('test_db', page_query.format(3, 4))],
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertEqual(1, len(pages))
+
+    def test_to_dataframe_by_time_shards(self):
+        first_shard = 'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-02 00:00:00.000000)) | project stringField, numField'
+        second_shard = 'mock_table | where (dateField >= datetime(2020-01-02 00:00:00.000000)) and (dateField < datetime(2020-01-03 00:00:00.000000)) | project stringField, numField'
+        columns = ('stringField', 'numField')
+        mock_kusto_client = MockKustoClient(query_responses={
+            first_shard: mock_response((['foo', 10], ['bar', 20]), columns),
+            second_shard: mock_response((['baz', 30],), columns),
+        })
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = Query(table).project(table.stringField, table.numField).to_dataframe_by_time_shards(table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2)
+        self.assertEqual(
+            [RecordedQuery('test_db', first_shard), RecordedQuery('test_db', second_shard)],
+            sorted(mock_kusto_client.recorded_queries, key=lambda q: q.query),
+        )
+        self.assertTrue(pd.DataFrame([['foo', 10], ['bar', 20], ['baz', 30]], columns=columns).equals(df))
+
+    def test_to_dataframe_by_time_shards_unbound(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo'],), ('stringField',)))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        Query().to_dataframe_by_time_shards(col.dateField, datetime(2020, 1, 1), datetime(2020, 1, 2), 1, table)
+        self.assertEqual(
+            [RecordedQuery('test_db', 'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-02 00:00:00.000000))')],
+            mock_kusto_client.recorded_queries,
+        )
+
+    def test_to_dataframe_by_time_shards_reaggregate(self):
+        query = Query().where(col.numField > 1).summarize(f.count(), f.sum(col.numField).assign_to(col.total), f.max(col.numField2)).by(col.stringField)
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo', 1, 10, 5], ['bar', 2, 20, 6]), ('stringField', 'count_', 'total', 'max_numField2')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = query.to_dataframe_by_time_shards(col.dateField, datetime(2020, 1, 1), datetime(2020, 1, 4), 3, table, max_workers=2)
+        self.assertEqual(3, len(mock_kusto_client.recorded_queries))
+        self.assertIn(
+            RecordedQuery(
+                'test_db',
+                'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-02 00:00:00.000000)) | where numField > 1 '
+                '| summarize count(), total = sum(numField), max(numField2) by stringField'
+            ),
+            mock_kusto_client.recorded_queries,
+        )
+        self.assertTrue(
+            pd.DataFrame([['foo', 3, 30, 5], ['bar', 6, 60, 6]], columns=('stringField', 'count_', 'total', 'max_numField2')).equals(df)
+        )
+
+    def test_to_dataframe_by_time_shards_reaggregate_no_by(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response(([3, 7],), ('count_', 'min_numField')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = Query(table).summarize(f.count_if(table.numField > 1), f.min(table.numField)).to_dataframe_by_time_shards(
+            table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+        )
+        self.assertTrue(pd.DataFrame({'count_': [6], 'min_numField': [7]}).equals(df))
+
+    def test_to_dataframe_by_time_shards_non_decomposable(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response(([3],), ('dcount_numField',)))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        self.assertRaises(
+            ValueError("Partial results cannot be merged for non-decomposable aggregations: dcount(numField)"),
+            Query(table).summarize(f.dcount(table.numField)).to_dataframe_by_time_shards, table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+        )
+        self.assertRaises(
+            ValueError("Partial results cannot be merged for non-decomposable aggregations: sum(numField) + sum(numField2)"),
+            Query(table).summarize(f.sum(table.numField) + f.sum(table.numField2)).to_dataframe_by_time_shards, table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+        )
+        self.assertRaises(
+            ValueError("Partial results cannot be merged for non-decomposable aggregations: count() / 2"),
+            Query(table).summarize(f.count() / 2).to_dataframe_by_time_shards, table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+        )
+        # Raised before executing any shard
+        self.assertEqual([], mock_kusto_client.recorded_queries)
+
+    def test_to_dataframe_by_time_shards_summarize_not_last(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo', 3],), ('stringField', 'count_')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        for query in (
+                Query(table).summarize(f.count()).by(table.stringField).where(col.count_ > 1),
+                Query(table).summarize(f.count()).by(table.stringField).project(col.count_),
+                Query(table).summarize(f.count()).by(table.stringField).summarize(f.sum(col.count_)),
+        ):
+            self.assertRaises(
+                ValueError("Partial results cannot be merged when 'summarize' is followed by other operators"),
+                query.to_dataframe_by_time_shards, table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+            )
+            self.assertRaises(
+                ValueError("Partial results cannot be merged when 'summarize' is followed by other operators"),
+                query.to_dataframe_by_hash_partitions, table.stringField, 2
+            )
+        self.assertEqual([], mock_kusto_client.recorded_queries)
+
+    def test_to_dataframe_by_time_shards_reaggregate_null_keys(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response(
+            (['foo', 1.5, 1], [None, 1.5, 2], ['foo', None, 3], [None, None, 4]), ('stringField', 'numField', 'count_')
+        ))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = Query(table).summarize(f.count()).by(table.stringField, table.numField).to_dataframe_by_time_shards(
+            table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2
+        )
+        expected = pd.DataFrame([['foo', 1.5, 2], [None, 1.5, 4], ['foo', None, 6], [None, None, 8]], columns=('stringField', 'numField', 'count_'))
+        self.assertTrue(expected.equals(df), df)
+
+    def test_to_dataframe_by_time_shards_adaptive(self):
+        sample_query = (
+            'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-05 00:00:00.000000)) '
+            '| summarize rows = count() by bucket = bin(dateField, time(1.0:0:0.0))'
+        )
+        mock_kusto_client = MockKustoClient(
+            main_response=mock_response((['foo'],), ('stringField',)),
+            query_responses={sample_query: mock_response(
+                (
+                    [datetime(2020, 1, 4, tzinfo=timezone.utc), 70], [datetime(2020, 1, 1, tzinfo=timezone.utc), 100],
+                    [datetime(2020, 1, 2, tzinfo=timezone.utc), 20], [datetime(2020, 1, 3, tzinfo=timezone.utc), 10],
+                ),
+                ('bucket', 'rows')
+            )},
+        )
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        Query(table).to_dataframe_by_time_shards(table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 5), 3, sample_bin=timedelta(days=1))
+        self.assertEqual(RecordedQuery('test_db', sample_query), mock_kusto_client.recorded_queries[0])
+        # The first bucket holds half of the rows, so it gets a shard of its own. The rest are split as evenly as possible.
+        self.assertEqual(
+            [
+                'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-02 00:00:00.000000))',
+                'mock_table | where (dateField >= datetime(2020-01-02 00:00:00.000000)) and (dateField < datetime(2020-01-04 00:00:00.000000))',
+                'mock_table | where (dateField >= datetime(2020-01-04 00:00:00.000000)) and (dateField < datetime(2020-01-05 00:00:00.000000))',
+            ],
+            sorted(q.query for q in mock_kusto_client.recorded_queries[1:]),
+        )
+
+    def test_to_dataframe_by_time_shards_adaptive_skewed(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response(([datetime(2020, 1, 2), 100],), ('bucket', 'rows')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        Query(table).to_dataframe_by_time_shards(table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 5), 4, sample_bin=timedelta(days=1))
+        # All rows are in a single bucket, which cannot be split
+        self.assertEqual(
+            [
+                'mock_table | where (dateField >= datetime(2020-01-01 00:00:00.000000)) and (dateField < datetime(2020-01-02 00:00:00.000000))',
+                'mock_table | where (dateField >= datetime(2020-01-02 00:00:00.000000)) and (dateField < datetime(2020-01-05 00:00:00.000000))',
+            ],
+            sorted(q.query for q in mock_kusto_client.recorded_queries[1:]),
+        )
+
+    def test_to_dataframe_by_shards_not_row_local(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo', 3],), ('stringField', 'numField')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        for operator, query in (
+                ('take', Query(table).take(10)),
+                ('limit', Query(table).limit(10).where(table.numField > 1)),
+                ('sample', Query(table).sample(10)),
+                ('top', Query(table).top(10, table.numField)),
+                ('sort', Query(table).sort_by(table.numField)),
+                ('distinct', Query(table).distinct(table.stringField)),
+                ('count', Query(table).count()),
+                ('sample-distinct', Query(table).distinct(table.stringField).sample(10)),
+                ('top-hitters', Query(table).distinct(table.stringField).top_hitters(10)),
+                ('serialize', Query(table).serialize(rn=f.row_number())),
+                ('evaluate', Query(table).evaluate('autocluster')),
+                ('take', Query(table).take(10).summarize(f.count())),
+        ):
+            expected = ValueError(f"Partial results cannot be merged for '{operator}', which does not process each row independently")
+            self.assertRaises(expected, query.to_dataframe_by_time_shards, table.dateField, datetime(2020, 1, 1), datetime(2020, 1, 3), 2)
+            self.assertRaises(expected, query.to_dataframe_by_hash_partitions, table.stringField, 2)
+        self.assertEqual([], mock_kusto_client.recorded_queries)
+
+    def test_to_dataframe_by_shards_row_local_evaluate(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo'],), ('stringField',)))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        Query(table).serialize().evaluate('bag_unpack', col.dynamicField).to_dataframe_by_hash_partitions(table.stringField, 1)
+        self.assertEqual(
+            [RecordedQuery('test_db', 'mock_table | where (hash(stringField, 1)) == 0 | serialize | evaluate bag_unpack(dynamicField)')],
+            mock_kusto_client.recorded_queries,
+        )
+
+    def test_to_dataframe_by_hash_partitions(self):
+        columns = ('stringField', 'numField')
+        mock_kusto_client = MockKustoClient(query_responses={
+            'mock_table | where (hash(stringField, 2)) == 0 | project stringField, numField': mock_response((['foo', 10], ['bar', 20]), columns),
+            'mock_table | where (hash(stringField, 2)) == 1 | project stringField, numField': mock_response((['baz', 30],), columns),
+        })
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = Query(table).project(table.stringField, table.numField).to_dataframe_by_hash_partitions(table.stringField, 2)
+        self.assertEqual(
+            [
+                RecordedQuery('test_db', 'mock_table | where (hash(stringField, 2)) == 0 | project stringField, numField'),
+                RecordedQuery('test_db', 'mock_table | where (hash(stringField, 2)) == 1 | project stringField, numField'),
+            ],
+            sorted(mock_kusto_client.recorded_queries, key=lambda q: q.query),
+        )
+        self.assertTrue(pd.DataFrame([['foo', 10], ['bar', 20], ['baz', 30]], columns=columns).equals(df))
+
+    def test_to_dataframe_by_hash_partitions_summarize_by_key(self):
+        columns = ('stringField', 'count_')
+        mock_kusto_client = MockKustoClient(query_responses={
+            'mock_table | where (hash(stringField, 2)) == 0 | summarize dcount(numField) by stringField': mock_response((['foo', 1], ['bar', 2]), columns),
+            'mock_table | where (hash(stringField, 2)) == 1 | summarize dcount(numField) by stringField': mock_response((['baz', 3],), columns),
+        })
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        # No re-aggregation, so even non-decomposable aggregations are supported
+        df = Query(table).summarize(f.dcount(table.numField)).by(table.stringField).to_dataframe_by_hash_partitions(table.stringField, 2)
+        self.assertTrue(pd.DataFrame([['foo', 1], ['bar', 2], ['baz', 3]], columns=columns).equals(df))
+
+    def test_to_dataframe_by_hash_partitions_summarize_by_other(self):
+        mock_kusto_client = MockKustoClient(main_response=mock_response((['foo', 1], ['bar', 2]), ('key', 'count_')))
+        table = PyKustoClient(mock_kusto_client)['test_db']['mock_table']
+        df = Query(table).summarize(f.count()).by(key=table.stringField).to_dataframe_by_hash_partitions(table.numField, 2)
+        self.assertTrue(pd.DataFrame([['foo', 2], ['bar', 4]], columns=('key', 'count_')).equals(df))
+        df = Query(table).summarize(f.count()).by(key=table.stringField).to_dataframe_by_hash_partitions(table.stringField, 2)
+        self.assertTrue(pd.DataFrame([['foo', 1], ['bar', 2], ['foo', 1], ['bar', 2]], columns=('key', 'count_')).equals(df))
+
+    def test_render_template(self):
+        self.assertEqual(
+            'mock_table | where ((((stringField == <string>) and (numField > <number>)) and (dateField < <datetime>)) and (timespanField == <timespan>)) '
+            'and (boolField == <bool>) | where stringField2 in (<string>, ...) | where numField2 in (<number>, ...) | take <number>',
+            Query(t).where(
+                (t.stringField == 'foo (1)') & (t.numField > 1.5e-05) & (t.dateField < datetime(2020, 1, 1)) & (t.timespanField == timedelta(hours=1))
+                & (t.boolField == True)  # noqa: E712
+            ).where(t.stringField2.is_in(['a', 'b', 'c'])).where(t.numField2.is_in([1, 2])).take(10).render_template()
+        )
+
+    def test_render_template_keeps_identifiers(self):
+        self.assertEqual(
+            'mock_table | where arrayField contains <string> | extend [\'2\'] = numField6, bar = <dynamic> | where (hash(stringField, <number>)) == <number>',
+            Query(t).where(t.arrayField.array_contains('x')).extend(
+                t.numField6.assign_to(col['2']), bar={'a': [1, '(2)']}
+            ).where(f.hash(t.stringField, 2) == 0).render_template()
+        )
+
+    def test_render_template_keeps_entities(self):
+        client = PyKustoClient(MockKustoClient(), fetch_by_default=False)
+        table = client['test_db']['mock_table']
+        self.assertEqual(
+            'mock_table | join  (cluster("test_cluster.kusto.windows.net").database("test_db").table("mock_table") | take <number>) on foo',
+            Query(table).join(Query(table).take(5)).on(col.foo).render_template(),
+        )
+
+    def test_fingerprint(self):
+        self.assertEqual(Query(t).where(t.stringField == 'foo').take(5).fingerprint(), Query(t).where(t.stringField == 'bar').take(10).fingerprint())
+        self.assertEqual(Query(t).where(t.numField.is_in([1, 2, 3])).fingerprint(), Query(t).where(t.numField.is_in([4, 5])).fingerprint())
+        self.assertNotEqual(Query(t).where(t.stringField == 'foo').fingerprint(), Query(t).where(t.stringField2 == 'foo').fingerprint())
+        self.assertEqual(64, len(Query(t).take(5).fingerprint()))
+
+    def test_fingerprint_function_arity(self):
+        self.assertEqual(Query(t).where(t.numField.is_in([1])).fingerprint(), Query(t).where(t.numField.is_in([4, 5])).fingerprint())
+        # Function arguments are not a list, so their number is part of the query shape
+        self.assertNotEqual(
+            Query(t).extend(foo=f.substring(t.stringField, 1, 2)).fingerprint(), Query(t).extend(foo=f.substring(t.stringField, 1)).fingerprint()
+        )
+        self.assertEqual(
+            'mock_table | extend foo = substring(stringField, <number>, <number>) | where numField in (<number>, ...)',
+            Query(t).extend(foo=f.substring(t.stringField, 1, 2)).where(t.numField.is_in([1, 2])).render_template(),
+        )
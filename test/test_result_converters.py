@@ -0,0 +1,222 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pykusto import PyKustoClient, Query
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType, _get_result_column_type
+from test.test_base import TestBase, MockKustoClient, mock_response
+
+
+class TestResultConverters(TestBase):
+    @staticmethod
+    def columnar_dataframe(rows, columns, column_types) -> pd.DataFrame:
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(rows, columns, column_types)))['test_db']['mock_table']
+        return Query(table).to_dataframe(columnar=True)
+
+    def test_result_column_type(self):
+        self.assertEqual(_KustoType.LONG, _get_result_column_type('long'))
+        self.assertEqual(_KustoType.LONG, _get_result_column_type('System.Int64'))
+        self.assertEqual(_KustoType.LONG, _get_result_column_type('Int64'))
+        self.assertIsNone(_get_result_column_type('foo'))
+
+    def test_columnar_dtypes(self):
+        df = self.columnar_dataframe(
+            (
+                [1, 2, 1.5, 'foo', True, '2020-01-01T00:00:00Z', '01:00:00', [1, 2], {'a': 1}, '1.5', 'guid'],
+                [3, 4, 2.5, 'bar', False, '2020-01-02T00:00:00Z', '1.00:00:00', [3, 4], {'b': 2}, '2.5', 'guid'],
+            ),
+            ('int', 'long', 'real', 'string', 'bool', 'datetime', 'timespan', 'array', 'mapping', 'decimal', 'guid'),
+            ('int', 'long', 'real', 'string', 'bool', 'datetime', 'timespan', 'dynamic', 'dynamic', 'decimal', 'guid'),
+        )
+        self.assertEqual(
+            [
+                np.dtype(np.int32), np.dtype(np.int64), np.dtype(np.float64), np.dtype(object), np.dtype(bool), pd.DatetimeTZDtype(tz='UTC'),
+                np.dtype('timedelta64[ns]'), np.dtype(object), np.dtype(object), np.dtype(object), np.dtype(object),
+            ],
+            list(df.dtypes),
+        )
+        self.assertEqual([1, 3], list(df['int']))
+        self.assertEqual(['foo', 'bar'], list(df['string']))
+        self.assertEqual(
+            [datetime(2020, 1, 1, tzinfo=timezone.utc), datetime(2020, 1, 2, tzinfo=timezone.utc)],
+            [timestamp.to_pydatetime() for timestamp in df['datetime']]
+        )
+        self.assertEqual([timedelta(hours=1), timedelta(days=1)], [timedelta_value.to_pytimedelta() for timedelta_value in df['timespan']])
+        self.assertEqual([[1, 2], [3, 4]], list(df['array']))
+        self.assertEqual([{'a': 1}, {'b': 2}], list(df['mapping']))
+        # Same as in the row-based conversion, decimals are kept in their raw string form to avoid losing precision
+        self.assertEqual(['1.5', '2.5'], list(df['decimal']))
+
+    def test_columnar_nulls(self):
+        df = self.columnar_dataframe(
+            ([1, 1.5, True, '2020-01-01T00:00:00Z', '01:00:00'], [None, None, None, None, None]),
+            ('long', 'real', 'bool', 'datetime', 'timespan'),
+            ('long', 'real', 'bool', 'datetime', 'timespan'),
+        )
+        self.assertEqual(np.dtype(np.float64), df['long'].dtype)
+        self.assertTrue(np.isnan(df['long'][1]))
+        self.assertTrue(np.isnan(df['real'][1]))
+        self.assertEqual([True, None], list(df['bool']))
+        self.assertTrue(pd.isnull(df['datetime'][1]))
+        self.assertTrue(pd.isnull(df['timespan'][1]))
+
+    def test_columnar_same_as_rows(self):
+        rows = (['foo', 10], ['bar', 20])
+        columns = ('stringField', 'numField')
+        self.assertTrue(pd.DataFrame(rows, columns=columns).equals(self.columnar_dataframe(rows, columns, ('string', 'long'))))
+
+    def test_columnar_empty(self):
+        df = self.columnar_dataframe(tuple(), ('stringField', 'numField'), ('string', 'long'))
+        self.assertEqual(['stringField', 'numField'], list(df.columns))
+        self.assertEqual(0, len(df))
+
+    def test_to_arrow(self):
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (
+                [1, 1.5, 'foo', True, '2020-01-01T00:00:00Z', '01:00:00', [1, 2], '1.5', 'x'],
+                [None, None, None, None, None, None, None, None, None],
+            ),
+            ('long', 'real', 'string', 'bool', 'datetime', 'timespan', 'dynamic', 'decimal', 'untyped'),
+            ('long', 'real', 'string', 'bool', 'datetime', 'timespan', 'dynamic', 'decimal', ''),
+        )))['test_db']['mock_table']
+        arrow_table = Query(table).to_arrow()
+        self.assertEqual(
+            pa.schema([
+                ('long', pa.int64()), ('real', pa.float64()), ('string', pa.string()), ('bool', pa.bool_()), ('datetime', pa.timestamp('ns', tz='UTC')),
+                ('timespan', pa.duration('ns')), ('dynamic', pa.string()), ('decimal', pa.string()), ('untyped', pa.string()),
+            ]),
+            arrow_table.schema,
+        )
+        self.assertEqual(
+            {
+                'long': [1, None], 'real': [1.5, None], 'string': ['foo', None], 'bool': [True, None],
+                'datetime': [datetime(2020, 1, 1, tzinfo=timezone.utc), None], 'timespan': [timedelta(hours=1), None], 'dynamic': ['[1, 2]', None],
+                'decimal': ['1.5', None], 'untyped': ['x', None],
+            },
+            arrow_table.to_pydict(),
+        )
+
+    def test_to_arrow_large_nullable_integers(self):
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(
+            ([2 ** 60 + 1, 2 ** 31 - 1], [None, None], [-(2 ** 60) - 1, -(2 ** 31)]), ('long', 'int'), ('long', 'int'),
+        )))['test_db']['mock_table']
+        arrow_table = Query(table).to_arrow()
+        self.assertEqual(pa.schema([('long', pa.int64()), ('int', pa.int32())]), arrow_table.schema)
+        self.assertEqual({'long': [2 ** 60 + 1, None, -(2 ** 60) - 1], 'int': [2 ** 31 - 1, None, -(2 ** 31)]}, arrow_table.to_pydict())
+
+    def test_compact(self):
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (
+                ['westus', 'a', 1, 100000, 3000000000, 1.5, 0.1, 1, True],
+                ['westus', 'b', 2, 2, 4, 2.5, 0.2, None, False],
+                ['westus', 'c', 3, -3, 5, None, 0.3, 3, True],
+            ),
+            ('region', 'id', 'small', 'medium', 'large', 'exactFloat', 'inexactFloat', 'nullableLong', 'bool'),
+            ('string', 'string', 'long', 'long', 'long', 'real', 'real', 'long', 'bool'),
+        )))['test_db']['mock_table']
+        df = Query(table).to_dataframe(compact=True)
+        self.assertEqual(
+            ['category', 'object', 'int8', 'int32', 'int64', 'float32', 'float64', 'float32', 'bool'],
+            [str(dtype) for dtype in df.dtypes],
+        )
+        self.assertEqual(['westus', 'westus', 'westus'], list(df['region']))
+        self.assertEqual([1, 2, 3], list(df['small']))
+        self.assertEqual([0.1, 0.2, 0.3], list(df['inexactFloat']))
+
+    def test_compact_unsigned(self):
+        df = self.columnar_dataframe(([1, 2], [3, 4]), ('uint', 'ulong'), ('uint32', 'uint64'))
+        self.assertEqual([np.dtype(np.uint32), np.dtype(np.uint64)], list(df.dtypes))
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(([1, 2], [3, 4]), ('uint', 'ulong'), ('uint32', 'uint64'))))['test_db']['mock_table']
+        self.assertEqual([np.dtype(np.uint8), np.dtype(np.uint8)], list(Query(table).to_dataframe(compact=True).dtypes))
+
+    def test_dynamic_as_json(self):
+        table = PyKustoClient(MockKustoClient(main_response=mock_response(
+            ([[1, 2], 'foo'], [None, 'bar']), ('dynamicField', 'stringField'), ('dynamic', 'string')
+        )))['test_db']['mock_table']
+        df = Query(table).to_dataframe(dynamic_as_json=True)
+        self.assertEqual([b'[1, 2]', None], list(df['dynamicField']))
+        self.assertEqual(['foo', 'bar'], list(df['stringField']))
+
+    def test_valid_rows(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (['foo', 1, 1.5, [1]], ['', 2, 2.5, [2]], ['bar', None, 3.5, [3]], [' \t', 4, 4.5, [4]], ['baz', 5, float('nan'), {'a': 5}], ['qux', 6, 6.5, ' ']),
+            ('stringField', 'numField', 'realField', 'dynamicField'), ('string', 'long', 'real', 'dynamic'),
+        ))).execute('test_db', 'mock_table')
+        self.assertEqual([True, False, False, False, True, False], list(response.get_valid_rows_mask()))
+        self.assertIs(response.get_valid_rows_mask(), response.get_valid_rows_mask())
+        self.assertEqual(
+            [[row[i] for i in range(4)] for row in response.get_rows() if response.is_row_valid(row)],
+            [[row[i] for i in range(4)] for row in response.get_valid_rows()],
+        )
+        df = response.to_dataframe(valid_rows_only=True)
+        self.assertEqual(['foo', 'baz'], list(df['stringField']))
+        self.assertEqual([0, 1], list(df.index))
+
+    def test_valid_rows_empty(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(tuple(), ('stringField',), ('string',)))).execute('test_db', 'mock_table')
+        self.assertEqual([], list(response.get_valid_rows()))
+        self.assertEqual(0, len(response.to_dataframe(columnar=True, valid_rows_only=True)))
+
+    def test_view_column(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (['foo', 1, '2020-01-01T00:00:00Z'], ['bar', 2, '2020-01-02T00:00:00Z'], ['baz', 3, None]),
+            ('stringField', 'numField', 'dateField'), ('string', 'long', 'datetime'),
+        ))).execute('test_db', 'mock_table')
+        column = response.column('numField')
+        self.assertEqual(np.int64, column.dtype)
+        self.assertEqual([1, 2, 3], list(column))
+        self.assertIs(column, response.column('numField'))
+        self.assertFalse(column.flags.writeable)
+        self.assertEqual(np.dtype('datetime64[ns]'), response.column('dateField').dtype)
+        self.assertEqual(['stringField', 'numField', 'dateField'], response.view().column_names)
+        self.assertEqual("KustoResultView(3 rows, ['stringField', 'numField', 'dateField'])", repr(response.view()))
+
+    def test_view_column_dtype_of_own_rows(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            ([1, True, 1.5], [2, False, 2.5], [None, None, None]), ('numField', 'boolField', 'realField'), ('long', 'bool', 'real'),
+        ))).execute('test_db', 'mock_table')
+        view = response.view()
+        self.assertEqual([np.dtype(np.float64), np.dtype(object), np.dtype(np.float64)], [view.column(name).dtype for name in view.column_names])
+        # The rows of the child views contain no nulls, so the columns have their usual dtype rather than the one of the parent
+        for child in (view.head(2), view.head(2).select('numField', 'boolField')):
+            self.assertEqual(np.dtype(np.int64), child.column('numField').dtype)
+            self.assertEqual([1, 2], list(child.column('numField')))
+            self.assertEqual(np.dtype(bool), child.column('boolField').dtype)
+        # Other columns are still shared
+        self.assertTrue(np.shares_memory(view.column('realField'), view.head(2).column('realField')))
+        self.assertEqual(np.dtype(np.float64), view.slice(1).column('numField').dtype)
+
+    def test_view_shares_converted_columns(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (['foo', 1], ['bar', 2], ['baz', 3], ['qux', 4]), ('stringField', 'numField'), ('string', 'long'),
+        ))).execute('test_db', 'mock_table')
+        column = response.column('numField')
+        head = response.head(3)
+        self.assertEqual(3, len(head))
+        self.assertEqual([1, 2, 3], list(head.column('numField')))
+        self.assertTrue(np.shares_memory(column, head.column('numField')))
+        sliced = head.select('numField').slice(1, -1)
+        self.assertEqual(['numField'], sliced.column_names)
+        self.assertEqual([2], list(sliced.column('numField')))
+        self.assertTrue(np.shares_memory(column, sliced.column('numField')))
+
+    def test_view_converts_only_its_rows(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (['foo', 1], ['bar', 2], ['baz', None]), ('stringField', 'numField'), ('string', 'long'),
+        ))).execute('test_db', 'mock_table')
+        head = response.head(2)
+        # A null in the rest of the result would have changed the dtype
+        self.assertEqual(np.int64, head.column('numField').dtype)
+        self.assertEqual(0, len(response.head(5).slice(3)))
+        self.assertEqual(['foo'], list(response.select('stringField').head(1).column('stringField')))
+
+    def test_view_to_dataframe(self):
+        response = PyKustoClient(MockKustoClient(main_response=mock_response(
+            (['foo', '2020-01-01T00:00:00Z'], ['bar', '2020-01-02T00:00:00Z']), ('stringField', 'dateField'), ('string', 'datetime'),
+        ))).execute('test_db', 'mock_table')
+        df = response.head(1).to_dataframe()
+        self.assertEqual(['stringField', 'dateField'], list(df.columns))
+        self.assertEqual([pd.Timestamp(datetime(2020, 1, 1, tzinfo=timezone.utc))], list(df['dateField']))
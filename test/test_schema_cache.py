@@ -0,0 +1,109 @@
+import json
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from pykusto import PyKustoClient, SchemaCache
+# noinspection PyProtectedMember
+from pykusto._src.expressions import _StringColumn, _NumberColumn
+# noinspection PyProtectedMember
+from pykusto._src.logger import _logger
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_databases_response, RecordedQuery
+
+SCHEMA = {'test_db': {'mock_table': [('foo', _KustoType.STRING), ('bar', _KustoType.INT)]}}
+CLUSTER = 'test_cluster.kusto.windows.net'
+FETCH_QUERIES = [
+    RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000'),
+]
+
+
+class TestSchemaCache(TestBase):
+    directory: Path
+
+    def setUp(self) -> None:
+        super().setUp()
+        temporary_directory = TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = Path(temporary_directory.name)
+
+    def test_save_and_load(self):
+        cache = SchemaCache(self.directory)
+        self.assertIsNone(cache.load(CLUSTER))
+        cache.save(CLUSTER, SCHEMA)
+        self.assertEqual(SCHEMA, cache.load(CLUSTER))
+        self.assertIsNone(cache.load('other_cluster'))
+        self.assertEqual(1, len(list(self.directory.iterdir())))
+        self.assertEqual(f'SchemaCache({self.directory})', repr(cache))
+
+    def test_default_directory(self):
+        self.assertEqual(Path.home() / '.pykusto' / 'schema_cache', SchemaCache().directory)
+
+    def test_expired(self):
+        SchemaCache(self.directory).save(CLUSTER, SCHEMA)
+        with patch('pykusto._src.schema_cache.time', lambda: 1e12):
+            self.assertIsNone(SchemaCache(self.directory, max_age=timedelta(hours=1)).load(CLUSTER))
+            self.assertEqual(SCHEMA, SchemaCache(self.directory, max_age=None).load(CLUSTER))
+
+    def test_version_mismatch(self):
+        cache = SchemaCache(self.directory)
+        cache.save(CLUSTER, SCHEMA)
+        with patch('pykusto._src.schema_cache._SCHEMA_CACHE_VERSION', 0):
+            self.assertIsNone(cache.load(CLUSTER))
+
+    def test_invalid_file(self):
+        cache = SchemaCache(self.directory)
+        cache._path(CLUSTER).write_text(json.dumps({'version': 1}))
+        with self.assertLogs(_logger, 'WARNING') as cm:
+            self.assertIsNone(cache.load(CLUSTER))
+        self.assertEqual(
+            [f"WARNING:pykusto:Ignoring invalid schema cache file '{cache._path(CLUSTER)}': KeyError('cluster')"],
+            cm.output
+        )
+
+    def test_save_failure(self):
+        directory = self.directory / 'file'
+        directory.write_text('')
+        with self.assertLogs(_logger, 'WARNING') as cm:
+            SchemaCache(directory).save(CLUSTER, SCHEMA)
+        self.assertEqual(1, len(cm.output))
+        self.assertTrue(cm.output[0].startswith('WARNING:pykusto:Failed writing schema cache file'))
+
+    def test_invalidate(self):
+        cache = SchemaCache(self.directory)
+        cache.save(CLUSTER, SCHEMA)
+        cache.invalidate(CLUSTER)
+        self.assertIsNone(cache.load(CLUSTER))
+        cache.invalidate(CLUSTER)
+
+    def test_client_saves_fetched_schema(self):
+        cache = SchemaCache(self.directory)
+        client = PyKustoClient(
+            MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', SCHEMA['test_db']['mock_table'])])])), schema_cache=cache
+        )
+        client.wait_for_items()
+        self.assertEqual(SCHEMA, cache.load(CLUSTER))
+
+    def test_client_loads_cached_schema(self):
+        cache = SchemaCache(self.directory)
+        cache.save(CLUSTER, SCHEMA)
+        mock_client = MockKustoClient(record_metadata=True)
+        client = PyKustoClient(mock_client, fetch_by_default=False, schema_cache=cache)
+        self.assertEqual([], mock_client.recorded_queries)
+        table = client.test_db.mock_table
+        self.assertEqual(_StringColumn, type(table.foo))
+        self.assertEqual(_NumberColumn, type(table.bar))
+
+    def test_client_refreshes_cached_schema(self):
+        cache = SchemaCache(self.directory)
+        cache.save(CLUSTER, SCHEMA)
+        mock_client = MockKustoClient(
+            databases_response=mock_databases_response([('test_db', [('mock_table', [('baz', _KustoType.BOOL)])])]), record_metadata=True
+        )
+        client = PyKustoClient(mock_client, schema_cache=cache)
+        client.wait_for_items()
+        self.assertEqual(FETCH_QUERIES, mock_client.recorded_queries)
+        self.assertEqual(['baz'], list(client.test_db.mock_table.get_columns_names()))
+        self.assertEqual({'test_db': {'mock_table': [('baz', _KustoType.BOOL)]}}, cache.load(CLUSTER))
@@ -0,0 +1,178 @@
+from threading import Event, Lock
+from time import sleep
+from unittest.mock import patch
+
+from pykusto import PyKustoClient, SchemaFetchPool, get_default_schema_fetch_pool, set_default_schema_fetch_pool
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_databases_response, mock_columns_response, mock_tables_response, mock_database_versions_response
+
+
+class TestSchemaFetchPool(TestBase):
+    def test_independent_refreshes_run_concurrently(self):
+        fetch_started = Event()
+        release_fetch = Event()
+
+        def upon_execute(_):
+            fetch_started.set()
+            # Bounded wait, so that a failure does not hang the test
+            release_fetch.wait(10)
+
+        slow_client = PyKustoClient(MockKustoClient('https://slow_cluster.kusto.windows.net', upon_execute=upon_execute), fetch_by_default=False)
+        fast_client = PyKustoClient(
+            MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING)])])])), fetch_by_default=False
+        )
+        try:
+            slow_client.refresh()
+            self.assertTrue(fetch_started.wait(10))
+            fast_client.blocking_refresh()
+            self.assertFalse(release_fetch.is_set())
+            self.assertEqual(('test_db',), tuple(fast_client.get_databases_names()))
+        finally:
+            release_fetch.set()
+        slow_client.wait_for_items()
+
+    def test_round_robin(self):
+        order = []
+        started = Event()
+        release = Event()
+        with SchemaFetchPool(max_workers=1) as pool:
+            pool.submit('a', lambda: started.set() or release.wait(10))
+            self.assertTrue(started.wait(10))
+            futures = [pool.submit(cluster, (lambda name: lambda: order.append(name))(f'{cluster}{i}')) for cluster, i in (('a', 1), ('a', 2), ('a', 3), ('b', 1), ('b', 2))]
+            release.set()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(['a1', 'b1', 'a2', 'b2', 'a3'], order)
+
+    def test_max_workers(self):
+        running = []
+        max_running = []
+        lock = Lock()
+        two_running = Event()
+        release = Event()
+
+        def task():
+            with lock:
+                running.append(None)
+                max_running.append(len(running))
+                if len(running) == 2:
+                    two_running.set()
+            release.wait(10)
+            with lock:
+                running.pop()
+
+        pool = SchemaFetchPool(max_workers=2)
+        futures = [pool.submit(str(i), task) for i in range(5)]
+        self.assertTrue(two_running.wait(10))
+        release.set()
+        pool.shutdown()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(2, max(max_running))
+
+    def test_submit_while_worker_idle(self):
+        with SchemaFetchPool(max_workers=2) as pool:
+            pool.submit('a', lambda: None).result(10)
+            # Wait for the worker to become idle
+            for _ in range(1000):
+                with pool._SchemaFetchPool__condition:
+                    if pool._SchemaFetchPool__idle_workers == 1:
+                        break
+                sleep(0.01)
+            started = [Event(), Event()]
+            release = Event()
+            try:
+                # Both fetches are submitted before the idle worker wakes up, so the second one requires a new worker
+                with pool._SchemaFetchPool__condition:
+                    for event in started:
+                        pool.submit('a', lambda event=event: event.set() or release.wait(10))
+                # Shorter than the wait of the fetches, so that the second one cannot start after the first one is done
+                self.assertTrue(all(event.wait(5) for event in started))
+            finally:
+                release.set()
+
+    def test_exception(self):
+        with SchemaFetchPool() as pool:
+            future = pool.submit('a', lambda: 1 / 0)
+        self.assertRaises(ZeroDivisionError('division by zero'), future.result)
+
+    def test_shutdown(self):
+        release = Event()
+        pool = SchemaFetchPool(max_workers=1)
+        blocking = pool.submit('a', lambda: release.wait(10))
+        pending = pool.submit('a', lambda: 1)
+        cancelled = pool.submit('b', lambda: 2)
+        cancelled.cancel()
+        pool.shutdown(wait=False)
+        self.assertRaises(RuntimeError("Cannot schedule new fetches after shutdown"), pool.submit, 'a', lambda: 3)
+        release.set()
+        pool.shutdown()
+        self.assertTrue(blocking.result())
+        self.assertEqual(1, pending.result())
+        self.assertTrue(cancelled.cancelled())
+
+    def test_shutdown_cancel_futures(self):
+        started = Event()
+        release = Event()
+        pool = SchemaFetchPool(max_workers=1)
+        blocking = pool.submit('a', lambda: started.set() or release.wait(10))
+        pending = pool.submit('a', lambda: 1)
+        self.assertTrue(started.wait(10))
+        pool.shutdown(wait=False, cancel_futures=True)
+        release.set()
+        pool.shutdown()
+        self.assertTrue(blocking.result())
+        self.assertTrue(pending.cancelled())
+
+    def test_invalid_max_workers(self):
+        self.assertRaises(ValueError("max_workers must be greater than 0"), SchemaFetchPool, 0)
+
+    def test_client_pool(self):
+        pool = SchemaFetchPool(max_workers=2)
+        self.assertEqual('SchemaFetchPool(max_workers=2)', repr(pool))
+        client = PyKustoClient(MockKustoClient(columns_response=mock_columns_response([('foo', _KustoType.STRING)])), fetch_by_default=False, schema_fetch_pool=pool)
+        table = client['test_db']['mock_table']
+        table.blocking_refresh()
+        self.assertEqual(('foo',), tuple(table.get_columns_names()))
+        pool.shutdown()
+        # Databases and tables use the pool of their client
+        self.assertRaises(RuntimeError("Cannot schedule new fetches after shutdown"), table.refresh)
+        self.assertRaises(RuntimeError("Cannot schedule new fetches after shutdown"), client['test_db'].refresh)
+
+    def test_pages_fetched_in_client_pool(self):
+        pool = SchemaFetchPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        mock_kusto_client = MockKustoClient(
+            databases_response=mock_databases_response([
+                ('test_db', [('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)]), ('other_table', [('baz', _KustoType.BOOL)])]),
+            ]),
+        )
+        client = PyKustoClient(mock_kusto_client, fetch_by_default=False, schema_fetch_pool=pool)
+        with patch('pykusto._src.client._SCHEMA_PAGE_SIZE', 1), patch.object(pool, 'submit', wraps=pool.submit) as submit:
+            # With a single worker, which is busy with the refresh itself, pages which did not start are fetched by the waiting refresh
+            client.blocking_refresh()
+        # The refresh, and the two pages after the first one
+        self.assertEqual([client._get_schema_fetch_key()] * 3, [call[0][0] for call in submit.call_args_list])
+        self.assertEqual(('foo', 'bar'), tuple(client.test_db.mock_table.get_columns_names()))
+        self.assertEqual(('baz',), tuple(client.test_db.other_table.get_columns_names()))
+
+    def test_pages_fetched_after_shutdown(self):
+        pool = SchemaFetchPool(max_workers=1)
+        mock_kusto_client = MockKustoClient(
+            tables_response=mock_tables_response([('mock_table', [('foo', _KustoType.STRING), ('bar', _KustoType.INT)])]),
+            database_versions_response=mock_database_versions_response([('test_db', 'v1')]),
+        )
+        client = PyKustoClient(mock_kusto_client, lazy_databases=True, schema_fetch_pool=pool)
+        client.wait_for_items()
+        pool.shutdown()
+        with patch('pykusto._src.client._SCHEMA_PAGE_SIZE', 1):
+            # The database is fetched in this thread when first accessed, including the pages which can no longer be submitted to the pool
+            self.assertEqual(('foo', 'bar'), tuple(client.test_db.mock_table.get_columns_names()))
+
+    def test_default_pool(self):
+        original_pool = get_default_schema_fetch_pool()
+        pool = SchemaFetchPool(max_workers=1)
+        set_default_schema_fetch_pool(pool)
+        self.addCleanup(set_default_schema_fetch_pool, original_pool)
+        client = PyKustoClient(MockKustoClient(), fetch_by_default=False)
+        pool.shutdown()
+        self.assertRaises(RuntimeError("Cannot schedule new fetches after shutdown"), client.refresh)
@@ -0,0 +1,112 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from pykusto import PyKustoClient, SharedSchemaStore
+# noinspection PyProtectedMember
+from pykusto._src.expressions import _StringColumn, _NumberColumn, _BooleanColumn
+# noinspection PyProtectedMember
+from pykusto._src.logger import _logger
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_databases_response, RecordedQuery
+
+SCHEMA = {
+    'test_db': {'mock_table': [('foo', _KustoType.STRING), ('bar', _KustoType.INT)], 'other_table': [('foo', _KustoType.BOOL), ('ünïcode', _KustoType.STRING)]},
+    'other_db': {'mock_table': [('foo', _KustoType.INT)]},
+    'empty_db': {},
+}
+CLUSTER = 'test_cluster.kusto.windows.net'
+
+
+class TestSharedSchemaStore(TestBase):
+    directory: Path
+
+    def setUp(self) -> None:
+        super().setUp()
+        temporary_directory = TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = Path(temporary_directory.name)
+
+    def test_publish_and_open(self):
+        store = SharedSchemaStore(self.directory, publisher=True)
+        self.assertIsNone(store.open(CLUSTER))
+        store.publish(CLUSTER, SCHEMA)
+        shared_schema = SharedSchemaStore(self.directory).open(CLUSTER)
+        self.assertEqual(CLUSTER, shared_schema.cluster_name)
+        self.assertEqual(['test_db', 'other_db', 'empty_db'], shared_schema.get_database_names())
+        for database_name, tables in SCHEMA.items():
+            self.assertEqual(tables, shared_schema.get_tables(database_name))
+        self.assertIsNone(shared_schema.get_tables('unknown_db'))
+        self.assertEqual(f'SharedSchemaStore({self.directory}, publisher=True)', repr(store))
+
+    def test_default_directory(self):
+        self.assertEqual(Path.home() / '.pykusto' / 'shared_schema', SharedSchemaStore().directory)
+
+    def test_open_survives_replacement(self):
+        store = SharedSchemaStore(self.directory, publisher=True)
+        store.publish(CLUSTER, SCHEMA)
+        shared_schema = store.open(CLUSTER)
+        store.publish(CLUSTER, {'new_db': {}})
+        self.assertEqual(SCHEMA['test_db'], shared_schema.get_tables('test_db'))
+        self.assertEqual(['new_db'], store.open(CLUSTER).get_database_names())
+
+    def test_cluster_mismatch(self):
+        store = SharedSchemaStore(self.directory)
+        store.publish(CLUSTER, SCHEMA)
+        os.replace(str(store._path(CLUSTER)), str(store._path('other_cluster')))
+        self.assertIsNone(store.open('other_cluster'))
+
+    def test_version_mismatch(self):
+        store = SharedSchemaStore(self.directory)
+        store.publish(CLUSTER, SCHEMA)
+        with patch('pykusto._src.shared_schema_store._SHARED_SCHEMA_VERSION', 0), self.assertLogs(_logger, 'WARNING') as cm:
+            self.assertIsNone(store.open(CLUSTER))
+        self.assertEqual([f"WARNING:pykusto:Ignoring invalid shared schema file '{store._path(CLUSTER)}': ValueError('Unsupported format')"], cm.output)
+
+    def test_invalid_files(self):
+        store = SharedSchemaStore(self.directory)
+        store.publish(CLUSTER, SCHEMA)
+        path = store._path(CLUSTER)
+        contents = path.read_bytes()
+        for invalid_contents, error in ((b'', "ValueError('cannot mmap an empty file')"), (b'PKSS', "ValueError('File too short')"), (contents[:-1], "ValueError('Unexpected file length')")):
+            path.write_bytes(invalid_contents)
+            with self.assertLogs(_logger, 'WARNING') as cm:
+                self.assertIsNone(store.open(CLUSTER))
+            self.assertEqual([f"WARNING:pykusto:Ignoring invalid shared schema file '{path}': {error}"], cm.output)
+
+    def test_publish_failure(self):
+        directory = self.directory / 'file'
+        directory.write_text('')
+        with self.assertLogs(_logger, 'WARNING') as cm:
+            SharedSchemaStore(directory, publisher=True).publish(CLUSTER, SCHEMA)
+        self.assertEqual(1, len(cm.output))
+        self.assertTrue(cm.output[0].startswith('WARNING:pykusto:Failed writing shared schema file'))
+
+    def test_clients(self):
+        publisher_kusto_client = MockKustoClient(databases_response=mock_databases_response([(d, list(t.items())) for d, t in SCHEMA.items()]))
+        PyKustoClient(publisher_kusto_client, shared_schema_store=SharedSchemaStore(self.directory, publisher=True)).wait_for_items()
+        reader_kusto_client = MockKustoClient(record_metadata=True)
+        reader = PyKustoClient(reader_kusto_client, shared_schema_store=SharedSchemaStore(self.directory))
+        reader.wait_for_items()
+        # Databases without tables are not listed in the cluster schema
+        self.assertEqual(('test_db', 'other_db'), tuple(reader.get_databases_names()))
+        # Databases are decoded on first access, without querying the cluster
+        self.assertEqual(type(reader.test_db.mock_table.foo), _StringColumn)
+        self.assertEqual(type(reader.test_db.mock_table.bar), _NumberColumn)
+        self.assertEqual(type(reader.test_db.other_table.foo), _BooleanColumn)
+        self.assertEqual(type(reader.other_db.mock_table.foo), _NumberColumn)
+        self.assertEqual([], reader_kusto_client.recorded_queries)
+
+    def test_reader_without_published_schema(self):
+        kusto_client = MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING)])])]), record_metadata=True)
+        client = PyKustoClient(kusto_client, shared_schema_store=SharedSchemaStore(self.directory))
+        client.wait_for_items()
+        self.assertEqual(
+            [RecordedQuery('', '.show databases schema | project DatabaseName, TableName, ColumnName, ColumnType | limit 10000')],
+            kusto_client.recorded_queries,
+        )
+        self.assertEqual(type(client.test_db.mock_table.foo), _StringColumn)
+        # Readers do not publish
+        self.assertEqual([], list(self.directory.iterdir()))
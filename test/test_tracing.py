@@ -0,0 +1,108 @@
+import json
+
+from azure.kusto.data.response import KustoResponseDataSetV2
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+from pykusto import PyKustoClient, Query, column_generator as col, enable_tracing, disable_tracing
+# noinspection PyProtectedMember
+from pykusto._src.kql_converters import _kql_fingerprint
+# noinspection PyProtectedMember
+from pykusto._src.type_utils import _KustoType
+from test.test_base import TestBase, MockKustoClient, mock_response, mock_databases_response
+
+
+class TestTracing(TestBase):
+    exporter: InMemorySpanExporter
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(self.exporter))
+        enable_tracing(provider)
+        self.addCleanup(disable_tracing)
+
+    def spans_by_name(self):
+        return {span.name: span for span in self.exporter.get_finished_spans()}
+
+    def test_query_spans(self):
+        client = PyKustoClient(MockKustoClient(main_response=mock_response((['foo'], ['bar']), ('stringField',))), fetch_by_default=False)
+        Query(client['test_db']['mock_table']).where(col.stringField != 'baz').to_dataframe()
+        spans = self.spans_by_name()
+        self.assertEqual({'pykusto.query', 'pykusto.render', 'pykusto.network', 'pykusto.convert'}, set(spans))
+        query_span = spans['pykusto.query']
+        for name in ('pykusto.render', 'pykusto.network', 'pykusto.convert'):
+            self.assertEqual(query_span.context.span_id, spans[name].parent.span_id)
+        self.assertIsNone(query_span.parent)
+        self.assertEqual(
+            {
+                'db.system': 'kusto', 'db.name': 'test_db', 'pykusto.cluster': 'test_cluster.kusto.windows.net', 'pykusto.row_count': 2,
+                'pykusto.query.fingerprint': _kql_fingerprint('mock_table | where stringField != "baz"'),
+            },
+            dict(query_span.attributes),
+        )
+        self.assertEqual(
+            {'db.system': 'kusto', 'db.name': 'test_db', 'pykusto.cluster': 'test_cluster.kusto.windows.net', 'pykusto.query_bytes': 39, 'pykusto.row_count': 2},
+            dict(spans['pykusto.network'].attributes),
+        )
+        self.assertEqual({'pykusto.format': 'dataframe', 'pykusto.row_count': 2}, dict(spans['pykusto.convert'].attributes))
+        self.assertEqual(39, spans['pykusto.render'].attributes['pykusto.kql_length'])
+
+    def test_server_statistics(self):
+        response = KustoResponseDataSetV2([
+            {
+                'FrameType': 'DataTable', 'TableId': 1, 'TableKind': 'PrimaryResult', 'TableName': 'PrimaryResult',
+                'Columns': [{'ColumnName': 'foo', 'ColumnType': 'long'}], 'Rows': [[1]],
+            },
+            {
+                'FrameType': 'DataTable', 'TableId': 2, 'TableKind': 'QueryCompletionInformation', 'TableName': 'QueryCompletionInformation',
+                'Columns': [{'ColumnName': 'EventTypeName', 'ColumnType': 'string'}, {'ColumnName': 'Payload', 'ColumnType': 'string'}],
+                'Rows': [['QueryResourceConsumption', json.dumps({'ExecutionTime': 0.5, 'resource_usage': {'cpu': {'total cpu': '00:00:02'}}})]],
+            },
+        ])
+        Query(PyKustoClient(MockKustoClient(main_response=response), fetch_by_default=False)['test_db']['mock_table']).take(1).to_arrow()
+        spans = self.spans_by_name()
+        query_attributes = spans['pykusto.query'].attributes
+        self.assertEqual(0.5, query_attributes['pykusto.stats.execution_time'])
+        self.assertEqual(2, query_attributes['pykusto.stats.cpu_time'])
+        self.assertNotIn('pykusto.stats.rows_scanned', query_attributes)
+        self.assertEqual('arrow', spans['pykusto.convert'].attributes['pykusto.format'])
+
+    def test_failed_query(self):
+        self.assertRaises(RuntimeError("No table supplied"), Query().take(1).execute)
+        query_span = self.spans_by_name()['pykusto.query']
+        self.assertEqual(StatusCode.ERROR, query_span.status.status_code)
+        self.assertEqual('RuntimeError', query_span.events[0].attributes['exception.type'])
+
+    def test_subquery_render_not_fingerprinted(self):
+        client = PyKustoClient(MockKustoClient(), fetch_by_default=False)
+        table = client['test_db']['mock_table']
+        Query(table).join(Query(table).take(1)).on(col.foo).execute()
+        spans = self.exporter.get_finished_spans()
+        self.assertEqual(2, len([span for span in spans if span.name == 'pykusto.render']))
+        query_span = next(span for span in spans if span.name == 'pykusto.query')
+        self.assertEqual(
+            _kql_fingerprint('mock_table | join  (cluster("test_cluster.kusto.windows.net").database("test_db").table("mock_table") | take 1) on foo'),
+            query_span.attributes['pykusto.query.fingerprint'],
+        )
+
+    def test_refresh_span(self):
+        client = PyKustoClient(
+            MockKustoClient(databases_response=mock_databases_response([('test_db', [('mock_table', [('foo', _KustoType.STRING)])])])), fetch_by_default=False
+        )
+        client.blocking_refresh()
+        refresh_span = self.spans_by_name()['pykusto.refresh']
+        self.assertIsNone(refresh_span.parent)
+        self.assertEqual({'pykusto.fetcher': 'PyKustoClient(test_cluster.kusto.windows.net)', 'pykusto.item_count': 1}, dict(refresh_span.attributes))
+
+    def test_enable_twice_and_disable(self):
+        enable_tracing(TracerProvider())
+        Query().take(1).render()
+        self.assertEqual(0, len(self.exporter.get_finished_spans()))
+        disable_tracing()
+        disable_tracing()
+        Query().take(1).render()
+        self.assertEqual(0, len(self.exporter.get_finished_spans()))